@@ -0,0 +1,172 @@
+"""
+Offline benchmarks of the analysis pipeline.
+
+    python -m bench run [--shapes small deep wide vendored] [--iterations 5] [--output report.json]
+    python -m bench compare baseline.json report.json [--threshold 0.2]
+    python -m bench load [--concurrency 1 2 4 8 16] [--duration 15] [--target in-process|http://host:port]
+    python -m bench serve [--port 8765]
+
+`run` generates local git repositories of the requested shapes, answers
+LLM calls with a fake client and writes a JSON report of per-stage
+timings. `compare` exits with status 1 if a stage's median regressed.
+`load` drives the app with concurrent users at rising concurrency and
+reports throughput, per-endpoint latency percentiles and event loop
+blocking; `serve` starts the app with the fake client for `load --target`.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+from dataclasses import replace
+
+from bench.synthetic_repo import DEFAULT_SHAPES, parse_shape
+
+
+def _write_report(report: dict, output: str):
+    text = json.dumps(report, indent=2)
+    if output == "-":
+        print(text)
+    else:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Report written to {output}", file=sys.stderr)
+
+
+def _fake_client(args):
+    from bench.fake_llm import FakeAnthropic
+    return FakeAnthropic(latency=args.llm_latency, latency_sigma=args.llm_latency_sigma,
+                         tokens_per_second=args.tokens_per_second, seed=args.seed)
+
+
+def run(args) -> int:
+    from bench.runner import configure_environment
+    configure_environment(args.work_dir)
+    # Service modules read their configuration on import
+    from bench.runner import run_benchmarks
+
+    shapes = [parse_shape(spec) for spec in args.shapes]
+    report = asyncio.run(run_benchmarks(shapes, args.work_dir, _fake_client(args), args.iterations))
+    _write_report(report, args.output)
+    return 0
+
+
+def compare(args) -> int:
+    from bench.runner import compare_reports, load_report
+    baseline, current = load_report(args.baseline), load_report(args.current)
+    rows, regressions = compare_reports(baseline, current, args.threshold)
+    print(f"{'shape':<12} {'stage':<32} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for shape, stage, base, now, ratio in rows:
+        flag = "  <-- slower" if (shape, stage, base, now, ratio) in regressions else ""
+        print(f"{shape:<12} {stage:<32} {base:>10.4f} {now:>10.4f} {ratio:>7.2f}{flag}")
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def load(args) -> int:
+    import random
+    from bench.runner import configure_environment
+    from bench.synthetic_repo import ensure_repo
+    from bench.load import AsgiTarget, HttpTarget, describe_repo, parse_mix, run_load
+
+    # Stalls are counted by the app's loop monitor; a served app uses its own setting
+    os.environ.setdefault("LOOP_BLOCKED_SECONDS", str(args.blocked_seconds))
+    configure_environment(args.work_dir)
+    repo_root = os.path.join(args.work_dir, "repos")
+    os.makedirs(repo_root, exist_ok=True)
+    rng = random.Random(args.seed)
+    repos = []
+    for spec in args.shapes:
+        shape = parse_shape(spec)
+        for index in range(args.repos):
+            variant = replace(shape, name=f"{shape.name}-{index}", seed=shape.seed + index)
+            repos.append(describe_repo(ensure_repo(variant, repo_root), rng))
+
+    if args.target == "in-process":
+        import main
+        from service.llm_gateway import llm_gateway
+        llm_gateway.client = _fake_client(args)
+        target = AsgiTarget(main.app)
+    else:
+        target = HttpTarget(args.target)
+
+    settings = {"shapes": args.shapes, "repos": len(repos), "llm_latency": args.llm_latency,
+                "llm_latency_sigma": args.llm_latency_sigma, "tokens_per_second": args.tokens_per_second}
+    report = asyncio.run(run_load(target, repos, args.concurrency, args.duration, parse_mix(args.mix),
+                                  args.think_time, args.timeout, args.seed, args.blocked_seconds, settings))
+    _write_report(report, args.output)
+    return 1 if any(level["event_loop"]["blocked"] for level in report["levels"]) and args.fail_on_blocking else 0
+
+
+def serve(args) -> int:
+    import uvicorn
+    from bench.runner import configure_environment
+    configure_environment(args.work_dir)
+    import main
+    from service.llm_gateway import llm_gateway
+    llm_gateway.client = _fake_client(args)
+    uvicorn.run(main.app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+def _add_common_arguments(parser, llm_latency: float, llm_latency_sigma: float):
+    parser.add_argument("--llm-latency", type=float, default=llm_latency,
+                        help="Fake LLM time to first token (the median, with --llm-latency-sigma), in seconds")
+    parser.add_argument("--llm-latency-sigma", type=float, default=llm_latency_sigma,
+                        help="Spread of the log-normal fake LLM latency; 0 makes it constant")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Fake LLM output rate; 0 answers instantly")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "llm-code-arch-bench"),
+                        help="Generated repositories and caches; repositories are reused across runs")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    shapes_help = "Presets (small, deep, wide, vendored, huge) or name:files=N,depth=N,fanout=N,vendored=F"
+
+    run_parser = commands.add_parser("run", help="Benchmark the pipeline stages")
+    run_parser.add_argument("--shapes", nargs="+", default=DEFAULT_SHAPES, help=shapes_help)
+    run_parser.add_argument("--iterations", type=int, default=5, help="Runs per stage")
+    run_parser.add_argument("--output", default="bench-report.json", help="Report path, or - for stdout")
+    _add_common_arguments(run_parser, llm_latency=0.2, llm_latency_sigma=0.0)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown of a stage median, as a fraction")
+    compare_parser.set_defaults(handler=compare)
+
+    load_parser = commands.add_parser("load", help="Load-test the API at rising concurrency")
+    load_parser.add_argument("--target", default="in-process",
+                             help="in-process (ASGI, same event loop) or the URL of `python -m bench serve`")
+    load_parser.add_argument("--shapes", nargs="+", default=["small"], help=shapes_help)
+    load_parser.add_argument("--repos", type=int, default=3, help="Repositories generated per shape")
+    load_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrent users per level")
+    load_parser.add_argument("--duration", type=float, default=15.0, help="Seconds per concurrency level")
+    load_parser.add_argument("--mix", default="initial=0.25,drilldown=0.35,followup=0.25,file=0.15",
+                             help="Request weights of initial, drilldown, followup and file")
+    load_parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between a user's requests, in seconds")
+    load_parser.add_argument("--timeout", type=float, default=120.0, help="Seconds before a request counts as failed")
+    load_parser.add_argument("--blocked-seconds", type=float, default=0.1, help="Event loop lag reported as blocking")
+    load_parser.add_argument("--fail-on-blocking", action="store_true", help="Exit with status 1 if the event loop was blocked")
+    load_parser.add_argument("--output", default="load-report.json", help="Report path, or - for stdout")
+    _add_common_arguments(load_parser, llm_latency=1.0, llm_latency_sigma=0.5)
+    load_parser.set_defaults(handler=load)
+
+    serve_parser = commands.add_parser("serve", help="Serve the API with the fake LLM, for `load --target`")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    _add_common_arguments(serve_parser, llm_latency=1.0, llm_latency_sigma=0.5)
+    serve_parser.set_defaults(handler=serve)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import re
+import json
+import math
+import random
+import asyncio
+from types import SimpleNamespace
+from typing import List, Optional
+
+NARRATIVE_PARAGRAPH = (
+    "The repository is organized around a small number of packages. Requests enter "
+    "through the API layer, which validates input and delegates to services; services "
+    "coordinate the domain models and persist them through the storage package. Shared "
+    "helpers live in utils, and background work is handled by the worker package. "
+)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _structure_roots(text: str, limit: int = 6) -> List[str]:
+    """Top-level directories of the first code block of a prompt"""
+    block = re.search(r"```\n([\s\S]*?)```", text)
+    if not block:
+        return []
+    names = []
+    for line in block.group(1).splitlines():
+        match = re.match(r"^([^\s/][^/]*)/", line)
+        if match and match.group(1) not in names:
+            names.append(match.group(1))
+    return names[:limit]
+
+
+def _component_list(names: List[str]) -> List[dict]:
+    components = []
+    for index, name in enumerate(names):
+        following = names[index + 1:index + 2]
+        components.append({
+            "name": name,
+            "description": f"Handles the {name} concerns of the project",
+            "dependencies": following,
+            "dependency_details": {dependency: "calls into" for dependency in following},
+        })
+    return components
+
+
+def _components(names: List[str]) -> str:
+    return "```json\n" + json.dumps(_component_list(names), indent=2) + "\n```"
+
+
+def respond(request: dict, narrative_words: int = 400) -> str:
+    """Deterministic answer to a Messages API request of this backend"""
+    system = request.get("system", "") or ""
+    prompt = "\n".join(message["content"] for message in request.get("messages", [])
+                       if isinstance(message.get("content"), str))
+    module = re.search(r'analyzing a specific module "([^"]+)"', system)
+    if module:
+        name = module.group(1).split("/")[-1]
+        return _components([f"{name}{part}" for part in ("Router", "Service", "Store", "Helpers")])
+    if "valid JSON" in system:
+        return _components(_structure_roots(prompt) or ["Core"])
+    words = NARRATIVE_PARAGRAPH.split()
+    return " ".join(words[i % len(words)] for i in range(narrative_words))
+
+
+def respond_with_tool(request: dict, narrative_words: int = 400) -> dict:
+    """Input of the forced tool call of a combined overview request"""
+    system = request.get("system", "") or ""
+    return {"narrative": respond({"messages": []}, narrative_words),
+            "components": _component_list(_structure_roots(system) or ["Core"])}
+
+
+class _FakeStream:
+    def __init__(self, client: "FakeAnthropic", request: dict):
+        self.client = client
+        self.request = request
+        self.text = respond(request, client.narrative_words)
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.client.sample_latency())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        chunk_size = 80
+        chunk_delay = self.client.output_delay(chunk_size)
+        for start in range(0, len(self.text), chunk_size):
+            if chunk_delay:
+                await asyncio.sleep(chunk_delay)
+            yield self.text[start:start + chunk_size]
+
+    async def get_final_message(self):
+        return self.client.message(self.request, self.text)
+
+
+class _FakeMessages:
+    def __init__(self, client: "FakeAnthropic"):
+        self.client = client
+
+    async def create(self, **request):
+        if request.get("tools"):
+            tool_input = respond_with_tool(request, self.client.narrative_words)
+            await asyncio.sleep(self.client.sample_latency() + self.client.output_delay(len(json.dumps(tool_input))))
+            return self.client.message(request, tool_input=tool_input)
+        text = respond(request, self.client.narrative_words)
+        await asyncio.sleep(self.client.sample_latency() + self.client.output_delay(len(text)))
+        return self.client.message(request, text)
+
+    def stream(self, **request) -> _FakeStream:
+        return _FakeStream(self.client, request)
+
+
+class FakeAnthropic:
+    """
+    Stand-in for `AsyncAnthropic` with deterministic answers and configurable latency.
+
+    `latency` is the time to the first token, or its median when
+    `latency_sigma` is set: real API latencies are roughly log-normal, with
+    a long tail. `tokens_per_second`, if set, adds generation time
+    proportional to the answer's length. Component prompts are answered
+    with JSON components named after the top-level directories of the
+    structure, narrative prompts with a fixed text, and requests with tools
+    with a call of the first tool carrying both.
+    """
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 0.0, narrative_words: int = 400,
+                 latency_sigma: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self._random = random.Random(seed)
+        self.tokens_per_second = tokens_per_second
+        self.narrative_words = narrative_words
+        self.messages = _FakeMessages(self)
+        self.calls = 0
+
+    def sample_latency(self) -> float:
+        if not self.latency_sigma or self.latency <= 0:
+            return self.latency
+        return self._random.lognormvariate(math.log(self.latency), self.latency_sigma)
+
+    def output_delay(self, characters: int) -> float:
+        return max(1, characters // 4) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def message(self, request: dict, text: str = "", tool_input: Optional[dict] = None):
+        self.calls += 1
+        prompt = (request.get("system", "") or "") + json.dumps(request.get("messages", []))
+        if tool_input is not None:
+            tool = request["tools"][0]["name"]
+            content = [SimpleNamespace(type="tool_use", id=f"toolu_{self.calls}", name=tool, input=tool_input)]
+            prompt += json.dumps(request["tools"])
+            text = json.dumps(tool_input)
+        else:
+            content = [SimpleNamespace(type="text", text=text)]
+        return SimpleNamespace(
+            model=request.get("model"),
+            role="assistant",
+            stop_reason="tool_use" if tool_input is not None else "end_turn",
+            content=content,
+            usage=SimpleNamespace(input_tokens=_tokens(prompt), output_tokens=_tokens(text)),
+        )
@@ -0,0 +1,302 @@
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import platform
+import subprocess
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from bench.runner import percentile, git_commit
+from bench.synthetic_repo import VENDOR_ROOTS
+
+REQUEST_KINDS = ("initial", "drilldown", "followup", "file")
+DEFAULT_MIX = {"initial": 0.25, "drilldown": 0.35, "followup": 0.25, "file": 0.15}
+QUESTIONS = [
+    "How does {module} interact with the rest of the project?",
+    "What are the responsibilities of {module}?",
+    "Where would I add a new endpoint that uses {module}?",
+    "Which parts of the code depend on {module}?",
+]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """`initial=0.25,drilldown=0.35,followup=0.25,file=0.15`; weights need not sum to 1"""
+    mix = {}
+    for item in spec.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in REQUEST_KINDS:
+            raise ValueError(f"Unknown request kind: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+class AsgiTarget:
+    """Calls the ASGI app directly, on the harness's own event loop"""
+
+    name = "in-process"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode("utf-8"),
+            "query_string": b"", "root_path": "", "client": ("127.0.0.1", 0), "server": ("bench", 80),
+            "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                        (b"content-length", str(len(payload)).encode("ascii"))],
+        }
+        status, chunks = 0, []
+        finished = asyncio.Event()
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": payload, "more_body": False}
+            # The client stays connected until the response is complete
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    finished.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            finished.set()
+        return status, b"".join(chunks)
+
+
+class HttpTarget:
+    """Minimal HTTP/1.1 client, one connection per request, for a server started with `python -m bench serve`"""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.name = base_url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+
+    async def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write((f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                          f"Connection: close\r\n\r\n").encode("ascii") + payload)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        if b"transfer-encoding: chunked" in head.lower():
+            content = _dechunk(content)
+        return status, content
+
+
+def _dechunk(data: bytes) -> bytes:
+    chunks = []
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        chunks.append(data[:size])
+        data = data[size + 2:]
+    return b"".join(chunks)
+
+
+@dataclass
+class LoadRepo:
+    github_link: str
+    modules: List[str]
+    files: List[str]
+
+
+def describe_repo(path: str, rng: random.Random, sample: int = 200) -> LoadRepo:
+    """Top-level modules and a sample of files of a generated repository, for drill-downs and /file"""
+    listing = subprocess.run(["git", "ls-tree", "-r", "--name-only", "HEAD"], cwd=path,
+                             capture_output=True, text=True, check=True).stdout.split()
+    own = [name for name in listing if name.split("/")[0] not in VENDOR_ROOTS]
+    modules = sorted({name.split("/")[0] for name in own if "/" in name})
+    return LoadRepo("file://" + path, modules, rng.sample(own, min(sample, len(own))))
+
+
+@dataclass
+class VirtualUser:
+    """One simulated user: starts with an overview, then drills down, asks and opens files in its session"""
+    repos: List[LoadRepo]
+    mix: Dict[str, float]
+    rng: random.Random
+    repo: Optional[LoadRepo] = None
+    session_id: Optional[str] = None
+    history: List[dict] = field(default_factory=list)
+
+    def next_request(self) -> Tuple[str, str, dict]:
+        kinds = list(self.mix)
+        kind = self.rng.choices(kinds, weights=[self.mix[k] for k in kinds])[0]
+        if self.repo is None or (kind in ("drilldown", "followup") and self.session_id is None):
+            kind = "initial"
+        if kind == "initial":
+            self.repo = self.rng.choice(self.repos)
+            self.session_id, self.history = None, []
+            return kind, "/analyze", {"github_link": self.repo.github_link, "history": []}
+        if kind == "file":
+            return kind, "/file", {"github_link": self.repo.github_link, "file_path": self.rng.choice(self.repo.files)}
+        module = self.rng.choice(self.repo.modules or [""])
+        if kind == "drilldown":
+            return kind, "/analyze", {"github_link": self.repo.github_link, "history": [],
+                                      "drill_down_module": module, "session_id": self.session_id}
+        question = self.rng.choice(QUESTIONS).format(module=module)
+        history = self.history + [{"role": "user", "content": question}]
+        return kind, "/analyze", {"github_link": self.repo.github_link, "history": history, "session_id": self.session_id}
+
+    def answered(self, kind: str, request: dict, status: int, content: bytes):
+        if status != 200 or kind == "file":
+            return
+        answer = json.loads(content)
+        self.session_id = answer.get("session_id") or self.session_id
+        if kind == "followup":
+            self.history = request["history"] + [{"role": "assistant", "content": answer.get("text", "")}]
+
+
+_METRIC_LINE = re.compile(r'^(codearch_event_loop_\w+?)(?:\{le="([^"]+)"\})? (\S+)$')
+
+
+async def read_loop_lag(target) -> dict:
+    """Event loop lag counters from the target's /metrics"""
+    status, content = await target.request("GET", "/metrics")
+    values = {"buckets": {}}
+    if status != 200:
+        return values
+    for line in content.decode("utf-8").splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match:
+            continue
+        name, bound, value = match.groups()
+        if name == "codearch_event_loop_lag_seconds_bucket":
+            values["buckets"][bound] = float(value)
+        else:
+            values[name] = float(value)
+    return values
+
+
+def lag_between(before: dict, after: dict, blocked_seconds: float) -> dict:
+    """Lag probes taken between two /metrics reads: count, approximate p99 and stalls"""
+    count = after.get("codearch_event_loop_lag_seconds_count", 0) - before.get("codearch_event_loop_lag_seconds_count", 0)
+    p99_bound = None
+    for bound, cumulative in sorted(after["buckets"].items(), key=lambda item: float(item[0])):
+        if count and cumulative - before["buckets"].get(bound, 0) >= 0.99 * count:
+            p99_bound = bound
+            break
+    stalls = after.get("codearch_event_loop_stalls_total", 0) - before.get("codearch_event_loop_stalls_total", 0)
+    return {
+        "probes": int(count),
+        "p99_at_most": p99_bound,
+        "stalls": int(stalls),
+        "max_lag_seconds": round(after.get("codearch_event_loop_max_lag_seconds", 0.0), 4),
+        "blocked": stalls > 0 or (p99_bound not in (None, "+Inf") and float(p99_bound) > blocked_seconds),
+    }
+
+
+def endpoint_summary(samples: List[Tuple[float, bool]]) -> dict:
+    latencies = sorted(latency for latency, _ in samples)
+    return {
+        "count": len(samples),
+        "errors": sum(1 for _, ok in samples if not ok),
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "max": round(latencies[-1], 4),
+    }
+
+
+async def run_level(target, repos: List[LoadRepo], concurrency: int, duration: float, mix: Dict[str, float],
+                    think_time: float, timeout: float, seed: int, blocked_seconds: float) -> dict:
+    """`concurrency` users issuing requests back to back for `duration` seconds"""
+    samples: Dict[str, List[Tuple[float, bool]]] = {kind: [] for kind in REQUEST_KINDS}
+    users = [VirtualUser(repos, mix, random.Random(seed * 1000 + index)) for index in range(concurrency)]
+    stop_at = time.monotonic() + duration
+
+    async def drive(user: VirtualUser):
+        while time.monotonic() < stop_at:
+            kind, path, body = user.next_request()
+            started = time.perf_counter()
+            try:
+                status, content = await asyncio.wait_for(target.request("POST", path, body), timeout)
+            except (asyncio.TimeoutError, OSError):
+                status, content = 0, b""
+            samples[kind].append((time.perf_counter() - started, status == 200))
+            user.answered(kind, body, status, content)
+            if think_time:
+                await asyncio.sleep(user.rng.expovariate(1 / think_time))
+
+    before = await read_loop_lag(target)
+    started = time.perf_counter()
+    await asyncio.gather(*(drive(user) for user in users))
+    elapsed = time.perf_counter() - started
+    after = await read_loop_lag(target)
+
+    requests = sum(len(values) for values in samples.values())
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests": requests,
+        "errors": sum(1 for values in samples.values() for _, ok in values if not ok),
+        "throughput": round(requests / elapsed, 3) if elapsed else 0.0,
+        "endpoints": {kind: endpoint_summary(values) for kind, values in samples.items() if values},
+        "event_loop": lag_between(before, after, blocked_seconds),
+    }
+
+
+def print_level(level: dict):
+    print(f"concurrency {level['concurrency']:>3}: {level['requests']} requests in {level['seconds']:.1f}s, "
+          f"{level['throughput']:.2f} req/s, {level['errors']} errors", file=sys.stderr)
+    for kind, summary in level["endpoints"].items():
+        print(f"    {kind:<10} n={summary['count']:<5} p50={summary['p50']:.3f}s p95={summary['p95']:.3f}s "
+              f"p99={summary['p99']:.3f}s errors={summary['errors']}", file=sys.stderr)
+    loop = level["event_loop"]
+    if loop["blocked"]:
+        print(f"    EVENT LOOP BLOCKED: {loop['stalls']} stalls, p99 lag <= {loop['p99_at_most']}s, "
+              f"max {loop['max_lag_seconds']}s", file=sys.stderr)
+
+
+async def run_load(target, repos: List[LoadRepo], concurrency_levels: List[int], duration: float,
+                   mix: Dict[str, float], think_time: float = 0.0, timeout: float = 120.0, seed: int = 0,
+                   blocked_seconds: float = 0.1, settings: Optional[dict] = None) -> dict:
+    """Warm every repository up, then run each concurrency level in turn; returns the report"""
+    started = time.perf_counter()
+    for repo in repos:
+        # First clone and analysis of each repository, outside the measured levels
+        await target.request("POST", "/analyze", {"github_link": repo.github_link, "history": []})
+    warmup_seconds = time.perf_counter() - started
+
+    levels = []
+    for concurrency in concurrency_levels:
+        level = await run_level(target, repos, concurrency, duration, mix, think_time, timeout, seed, blocked_seconds)
+        print_level(level)
+        levels.append(level)
+    return {
+        "schema": 1,
+        "kind": "load",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "target": target.name,
+        "settings": dict(settings or {}, duration=duration, mix=mix, think_time=think_time, seed=seed),
+        "warmup_seconds": round(warmup_seconds, 3),
+        "levels": levels,
+    }
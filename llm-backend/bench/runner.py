@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import json
+import inspect
+import shutil
+import platform
+import statistics
+import subprocess
+from typing import Callable, Dict, List, Optional
+
+from bench.synthetic_repo import RepoShape, ensure_repo
+from bench.fake_llm import FakeAnthropic
+
+REPORT_SCHEMA = 1
+
+
+def configure_environment(work_dir: str):
+    """
+    Point every cache of the service at `work_dir` and lift the LLM rate limits.
+
+    Must run before any `service` module is imported, since they read their
+    configuration at import time.
+    """
+    # A fresh clone store per run, so the first clone of each shape is a cold one
+    os.environ.setdefault("CLONE_CACHE_DIR", os.path.join(work_dir, f"clones-{os.getpid()}"))
+    os.environ.setdefault("ANALYSIS_CACHE_DIR", os.path.join(work_dir, "analyses"))
+    os.environ.setdefault("DIAGRAM_STORE_DIR", os.path.join(work_dir, "diagrams"))
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000000")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "offline-benchmark")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("ALLOW_LOCAL_REPOSITORIES", "true")
+
+
+def percentile(ordered: List[float], percent: int) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    return ordered[min(len(ordered) - 1, max(0, -(-percent * len(ordered) // 100) - 1))]
+
+
+def summarize(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min": round(ordered[0], 6),
+        "median": round(statistics.median(ordered), 6),
+        "p95": round(percentile(ordered, 95), 6),
+        "p99": round(percentile(ordered, 99), 6),
+        "mean": round(statistics.fmean(ordered), 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+async def measure(run: Callable, iterations: int, setup: Optional[Callable] = None):
+    """Time `run()` (awaited if it returns an awaitable) `iterations` times; returns (samples, last result)"""
+    samples, result = [], None
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = run()
+        if inspect.isawaitable(result):
+            result = await result
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench_shape(shape: RepoShape, repo_root: str, iterations: int, fake: FakeAnthropic) -> dict:
+    """Time each stage of the pipeline on one generated repository"""
+    import graphviz
+    from service.analysis_cache import analysis_cache
+    from service.github_analyzer import get_repository_tree, get_project_structure, get_import_graph, \
+        get_symbol_index, clear_tree_cache
+    from service.graph_builder import parse_project_structure, extract_module_files, analyze_project_with_llm, \
+        analyze_module_with_llm, analyze_overview_with_llm, generate_architecture_svg, add_import_graph
+    from service.structure_renderer import render_structure
+    from service.llm_client import analyze_with_claude, stream_with_claude
+    from service.svg_renderer import SvgRenderer, RenderError
+
+    started = time.perf_counter()
+    repo_path = ensure_repo(shape, repo_root)
+    generate_seconds = time.perf_counter() - started
+    github_link = "file://" + repo_path
+
+    def cold():
+        clear_tree_cache()
+        analysis_cache.clear()
+
+    stages: Dict[str, dict] = {}
+
+    async def stage(name: str, run: Callable, setup: Optional[Callable] = None, runs: int = iterations):
+        samples, result = await measure(run, runs, setup)
+        stages[name] = summarize(samples)
+        return result
+
+    # The first call clones; later ones reuse the clone and rebuild the tree
+    tree = await stage("clone_and_walk", lambda: get_repository_tree(github_link), runs=1)
+    if tree.error:
+        raise RuntimeError(f"Could not read the {shape.name} repository: {tree.error}")
+    await stage("get_project_structure", lambda: get_project_structure(github_link), setup=clear_tree_cache)
+    tree = get_repository_tree(github_link)
+    await stage("parse_project_structure", lambda: parse_project_structure(tree))
+
+    module_index = max(tree.children(0), key=lambda index: tree.file_count(index) if tree.is_dir[index] else -1)
+    module_name = tree.names[module_index]
+    await stage("extract_module_files", lambda: extract_module_files(tree, module_name))
+    # Prompt rendering is memoized on the tree
+    await stage("render_structure", lambda: render_structure(tree), setup=tree.render_cache.clear)
+    await stage("render_structure_focus", lambda: render_structure(tree, focus=module_name), setup=tree.render_cache.clear)
+
+    import_graph = await stage("get_import_graph", lambda: get_import_graph(tree), setup=cold)
+    symbol_index = await stage("get_symbol_index", lambda: get_symbol_index(tree), setup=cold)
+    symbols_text = symbol_index.describe(tree.paths[module_index]) if symbol_index else ""
+
+    # LLM paths, each starting from an empty analysis cache
+    await stage("analyze_project_with_llm", lambda: analyze_project_with_llm(github_link, tree, import_graph),
+                setup=analysis_cache.clear)
+    await stage("analyze_module_with_llm", lambda: analyze_module_with_llm(github_link, tree, module_name, symbols_text),
+                setup=analysis_cache.clear)
+    await stage("analyze_with_claude", lambda: analyze_with_claude([], github_link, tree))
+    # The two calls above as one, with COMBINED_ANALYSIS
+    await stage("analyze_overview_with_llm", lambda: analyze_overview_with_llm(github_link, tree), setup=analysis_cache.clear)
+
+    # Total time of the streamed narrative, and time until its first chunk
+    first_text = []
+
+    async def stream_once():
+        started = time.perf_counter()
+        first = None
+        async for _ in stream_with_claude([], github_link, tree):
+            if first is None:
+                first = time.perf_counter() - started
+        first_text.append(first or 0.0)
+
+    await stage("stream_with_claude", stream_once)
+    stages["stream_with_claude_first_text"] = summarize(first_text)
+
+    # Layout of the import-graph diagram, without the render cache
+    dot = graphviz.Digraph()
+    dot.attr(rankdir="LR")
+    if import_graph is not None:
+        add_import_graph(dot, import_graph)
+    renderer = SvgRenderer(cache_entries=0)
+    try:
+        await stage("render_svg", lambda: renderer.render(dot.source, len(import_graph.components) if import_graph else 0))
+    except RenderError as e:
+        stages["render_svg"] = {"skipped": str(e)}
+
+    await stage("generate_architecture_svg", lambda: generate_architecture_svg(github_link, tree), setup=cold)
+
+    return {
+        "shape": {"files": shape.files, "depth": shape.depth, "fanout": shape.fanout,
+                  "vendored": shape.vendored, "seed": shape.seed},
+        "generate_seconds": round(generate_seconds, 3),
+        "tree_entries": len(tree),
+        "truncated": tree.truncated,
+        "module": module_name,
+        "stages": stages,
+    }
+
+
+async def run_benchmarks(shapes: List[RepoShape], work_dir: str, fake: FakeAnthropic, iterations: int = 5) -> dict:
+    """Run every stage on every shape, with `fake` answering LLM calls; returns the report"""
+    from service.llm_gateway import llm_gateway
+
+    llm_gateway.client = fake
+    repo_root = os.path.join(work_dir, "repos")
+    os.makedirs(repo_root, exist_ok=True)
+
+    results = {}
+    try:
+        for shape in shapes:
+            print(f"Benchmarking {shape.name} ({shape.files} files)...", file=sys.stderr)
+            results[shape.name] = await bench_shape(shape, repo_root, iterations, fake)
+    finally:
+        shutil.rmtree(os.environ["CLONE_CACHE_DIR"], ignore_errors=True)
+    return {
+        "schema": REPORT_SCHEMA,
+        "kind": "stages",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "iterations": iterations,
+            "llm_latency": fake.latency,
+            "llm_latency_sigma": fake.latency_sigma,
+            "tokens_per_second": fake.tokens_per_second,
+            "llm_calls": fake.calls,
+        },
+        "results": results,
+    }
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float = 0.2, floor_seconds: float = 0.001):
+    """
+    Median of each stage in `current` relative to `baseline`.
+
+    Returns (rows, regressions): rows of (shape, stage, baseline, current,
+    ratio), and the rows slower by more than `threshold` (a fraction) and
+    by more than `floor_seconds`, below which timings are noise.
+    """
+    rows, regressions = [], []
+    for shape, result in current["results"].items():
+        base_stages = baseline["results"].get(shape, {}).get("stages", {})
+        for stage, timing in result["stages"].items():
+            base = base_stages.get(stage)
+            if not base or "median" not in base or "median" not in timing:
+                continue
+            ratio = timing["median"] / base["median"] if base["median"] else float("inf")
+            row = (shape, stage, base["median"], timing["median"], ratio)
+            rows.append(row)
+            if ratio > 1 + threshold and timing["median"] - base["median"] > floor_seconds:
+                regressions.append(row)
+    return rows, regressions
+
+
+def load_report(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("schema") != REPORT_SCHEMA or report.get("kind") != "stages":
+        raise ValueError(f"{path} is not a stage benchmark report of schema {REPORT_SCHEMA}")
+    return report
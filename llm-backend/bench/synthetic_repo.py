@@ -0,0 +1,192 @@
+import os
+import json
+import random
+import shutil
+import hashlib
+import posixpath
+import subprocess
+from dataclasses import dataclass, asdict, replace
+from typing import Dict, List
+
+# Bump when generated content changes, so cached repositories are rebuilt
+GENERATOR_VERSION = "1"
+
+PACKAGE_NAMES = [
+    "api", "core", "models", "services", "utils", "web", "worker", "storage",
+    "auth", "billing", "search", "events", "config", "cli", "jobs", "metrics",
+]
+VENDOR_ROOTS = ["node_modules", "vendor", "third_party"]
+
+
+@dataclass(frozen=True)
+class RepoShape:
+    """
+    Layout of a generated repository.
+
+    Files are spread over `fanout` directories per level, `depth` levels
+    deep; `vendored` is the fraction of files placed under vendored
+    directories (node_modules, vendor, third_party).
+    """
+    name: str
+    files: int
+    depth: int = 3
+    fanout: int = 8
+    vendored: float = 0.0
+    seed: int = 0
+
+    def digest(self) -> str:
+        payload = json.dumps([GENERATOR_VERSION, asdict(self)], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+SHAPES: Dict[str, RepoShape] = {
+    "small": RepoShape("small", 1_000, depth=3, fanout=6),
+    "deep": RepoShape("deep", 20_000, depth=10, fanout=3),
+    "wide": RepoShape("wide", 20_000, depth=2, fanout=150),
+    "vendored": RepoShape("vendored", 50_000, depth=4, fanout=8, vendored=0.7),
+    "huge": RepoShape("huge", 500_000, depth=6, fanout=12, vendored=0.3),
+}
+DEFAULT_SHAPES = ["small", "deep", "wide", "vendored"]
+
+
+def parse_shape(spec: str) -> RepoShape:
+    """
+    A preset name, optionally with overrides: `small`, `wide:files=5000`,
+    `custom:files=2000,depth=4,fanout=5,vendored=0.2`
+    """
+    name, _, overrides = spec.partition(":")
+    shape = SHAPES.get(name, RepoShape(name, 1_000))
+    if not overrides:
+        if name not in SHAPES:
+            raise ValueError(f"Unknown repository shape: {name}")
+        return shape
+    fields = {}
+    for item in overrides.split(","):
+        key, _, value = item.partition("=")
+        if key not in ("files", "depth", "fanout", "vendored", "seed"):
+            raise ValueError(f"Unknown shape field: {key}")
+        fields[key] = float(value) if key == "vendored" else int(value)
+    return replace(shape, **fields)
+
+
+def _package_name(index: int) -> str:
+    base = PACKAGE_NAMES[index % len(PACKAGE_NAMES)]
+    return base if index < len(PACKAGE_NAMES) else f"{base}{index // len(PACKAGE_NAMES)}"
+
+
+def _python_source(index: int, imported: List[str]) -> str:
+    imports = "".join(f"from {target} import helper\n" for target in imported)
+    return f'''"""Generated module {index}"""
+import os
+{imports}
+
+class Widget{index}:
+    def run(self, value):
+        return helper(value) if value else os.getcwd()
+
+
+def helper_{index}(value):
+    return Widget{index}().run(value)
+'''
+
+
+def _js_source(index: int, path: str, imported: List[str]) -> str:
+    imports = "".join(
+        f"import {{ render as render{n} }} from './{posixpath.relpath(target, posixpath.dirname(path))}';\n"
+        for n, target in enumerate(imported)
+    )
+    return f"""{imports}
+export class View{index} {{
+  render(props) {{
+    return props.items.map((item) => item.id + {index});
+  }}
+}}
+
+export function render(props) {{
+  return new View{index}().render(props);
+}}
+"""
+
+
+def generate_files(shape: RepoShape):
+    """Yield (path, content) of every file of the shape, deterministically"""
+    rng = random.Random(shape.seed)
+    python_modules: List[str] = []
+    js_modules: List[str] = []
+    for index in range(shape.files):
+        parts = []
+        if rng.random() < shape.vendored:
+            root = VENDOR_ROOTS[index % len(VENDOR_ROOTS)]
+            parts = [root, f"lib{rng.randrange(max(shape.fanout, 2) * 4)}"]
+        parts.append(_package_name(rng.randrange(shape.fanout)))
+        for _ in range(1, shape.depth):
+            parts.append(f"{parts[-1].rstrip('0123456789')}{rng.randrange(shape.fanout)}")
+        directory = "/".join(parts)
+
+        kind = rng.random()
+        if kind < 0.6:
+            path = f"{directory}/mod_{index}.py"
+            imported = rng.sample(python_modules, min(2, len(python_modules)))
+            yield path, _python_source(index, imported)
+            python_modules.append(path[:-3].replace("/", "."))
+        elif kind < 0.85:
+            path = f"{directory}/view_{index}.js"
+            imported = rng.sample(js_modules, min(1, len(js_modules)))
+            yield path, _js_source(index, path, [target[:-3] for target in imported])
+            js_modules.append(path)
+        else:
+            path = f"{directory}/notes_{index}.md"
+            yield path, f"# Notes {index}\n\nGenerated documentation for {directory}.\n"
+        # Bound the candidate lists so huge shapes stay linear
+        if len(python_modules) > 2_000:
+            python_modules = python_modules[-1_000:]
+        if len(js_modules) > 2_000:
+            js_modules = js_modules[-1_000:]
+
+
+def _write_stream(stream, shape: RepoShape):
+    """Write the fast-import commands of one commit holding every file"""
+    files = []
+    for mark, (path, content) in enumerate(generate_files(shape), start=1):
+        data = content.encode("utf-8")
+        stream.write(b"blob\nmark :%d\ndata %d\n%s\n" % (mark, len(data), data))
+        files.append((mark, path))
+    readme = f"# Synthetic repository {shape.name}\n".encode("utf-8")
+    message = f"Synthetic repository {shape.name} ({shape.files} files)".encode("utf-8")
+    # Fixed identity and dates, so a shape always produces the same commit
+    stream.write(b"commit refs/heads/main\n"
+                 b"author Bench <bench@example.com> 0 +0000\n"
+                 b"committer Bench <bench@example.com> 0 +0000\n")
+    stream.write(b"data %d\n%s\n" % (len(message), message))
+    stream.write(b"M 100644 inline README.md\ndata %d\n%s\n" % (len(readme), readme))
+    for mark, path in files:
+        stream.write(b"M 100644 :%d %s\n" % (mark, path.encode("utf-8")))
+    stream.write(b"\n")
+
+
+def ensure_repo(shape: RepoShape, root: str) -> str:
+    """
+    Path of a bare git repository of `shape` under `root`, generated once.
+
+    The repository is written with `git fast-import`, so even the largest
+    shapes never touch a working tree.
+    """
+    path = os.path.join(root, f"{shape.name}-{shape.digest()}.git")
+    marker = os.path.join(path, "bench-complete")
+    if os.path.isfile(marker):
+        return path
+
+    # Left over from an interrupted run
+    shutil.rmtree(path, ignore_errors=True)
+    subprocess.run(["git", "init", "--quiet", "--bare", path], check=True)
+    subprocess.run(["git", "symbolic-ref", "HEAD", "refs/heads/main"], cwd=path, check=True)
+    importer = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=path, stdin=subprocess.PIPE)
+    try:
+        _write_stream(importer.stdin, shape)
+    finally:
+        importer.stdin.close()
+    if importer.wait() != 0:
+        raise RuntimeError(f"git fast-import failed for shape {shape.name}")
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(json.dumps(asdict(shape)))
+    return path
@@ -1,11 +1,41 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
-from schema import AnalyzeRequest, AnalyzeResponse, FileRequest, FileResponse
-from service.llm_client import analyze_with_claude
-from service.graph_builder import generate_architecture_svg, create_error_svg, generate_module_architecture_svg
-from service.github_analyzer import get_project_structure, get_file_content
+from fastapi.responses import HTMLResponse, StreamingResponse, Response, JSONResponse
+from schema import AnalyzeRequest, AnalyzeResponse, FileRequest, FileResponse, JobStatus
+from service.llm_client import analyze_with_claude, stream_with_claude
+from service.graph_builder import generate_architecture_svg, create_error_svg, generate_module_architecture_svg, summarize_components, \
+    analyze_overview_with_llm, COMBINED_ANALYSIS
+from service.github_analyzer import get_repository_tree, get_file_content, tree_cache_stats
+from service.repo_tree import RepoTree
+from service.concurrency import run_in_stage
+from service.singleflight import SingleFlight
+from service.session_store import session_store, AnalysisSession
+from service.prefetch import prefetcher, prefetch_candidates
+from service.diagram_store import diagram_store, is_valid_handle
+from service.job_queue import job_queue, QueueFull
+from service.analysis_cache import analysis_cache
+from service.clone_cache import clone_cache
+from service.svg_renderer import svg_renderer
+from service.import_graph import import_cache
+from service.symbol_index import symbol_cache
+from service.llm_gateway import llm_gateway
+from service.loop_monitor import loop_monitor
+from service.profiler import profiler, profile_store, to_collapsed, is_valid_profile_id
+from service.metrics import registry, timed, cache_sample, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
+import os
 import re
+import json
+import asyncio
+import hashlib
+import time
+from service.log import get_logger, sample_request, reset_sampling
+
+logger = get_logger(__name__)
+
+# Accept file:// repository URLs, for load tests against local bare repositories;
+# never enable on a public deployment
+ALLOW_LOCAL_REPOSITORIES = os.getenv("ALLOW_LOCAL_REPOSITORIES", "false").lower() in ("1", "true", "yes")
 
 app = FastAPI(
     title="LLM Code Architecture Analyzer API",
@@ -21,11 +51,116 @@ app.add_middleware(
     allow_credentials=True,
 )
 
+# Coalesces concurrent identical clones and analyses
+flights = SingleFlight()
+
+@app.middleware("http")
+async def hold_back_prefetch(request: Request, call_next):
+    """Background prefetches wait while interactive requests are being served"""
+    if request.url.path in ("/analyze", "/file"):
+        async with prefetcher.interactive():
+            return await call_next(request)
+    return await call_next(request)
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Time every request by route and decide whether its routine log messages are kept"""
+    loop_monitor.ensure_started()
+    session_store.ensure_sweeping()
+    token = sample_request()
+    started = time.perf_counter()
+    status = 500
+    try:
+        with HTTP_IN_FLIGHT.track_in_progress():
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template, not the raw path, keeps handles and job ids out of the labels
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     route=getattr(route, "path", "unmatched"), status=str(status))
+        reset_sampling(token)
+
+# Routes an admin can profile with `X-Profile: 1` or `?profile=1`
+PROFILED_PATHS = ("/analyze",)
+
+def profile_requested(request: Request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile") or ""
+    return flag.lower() in ("1", "true", "yes")
+
+async def profile_request(request: Request, call_next):
+    """Run a request under the sampling profiler and name the stored profile in `X-Profile-Id`"""
+    if request.url.path not in PROFILED_PATHS or not profile_requested(request):
+        return await call_next(request)
+    if not profiler.authorized(request.headers.get("x-admin-token")):
+        return JSONResponse(status_code=403, content={"detail": "Invalid admin token"})
+    profile = profiler.start(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop(profile)
+    response.headers["X-Profile-Id"] = profile.profile_id
+    return response
+
+# Registered only when enabled, so unprofiled deployments pay nothing for it
+if profiler.enabled:
+    app.middleware("http")(profile_request)
+
+BREAKER_STATES = {"closed": 0, "half-open": 1, "open": 2}
+
+def collect_service_metrics():
+    """Statistics the caches, queues and gateway keep anyway, read at scrape time"""
+    analysis = analysis_cache.stats()
+    diagrams = diagram_store.stats()
+    renders = svg_renderer.stats()
+    clones = clone_cache.stats()
+    trees = tree_cache_stats()
+    yield from cache_sample({
+        "analysis": (analysis["memory_hits"] + analysis["disk_hits"], analysis["misses"]),
+        "diagram": (diagrams["memory_hits"] + diagrams["disk_hits"], diagrams["misses"]),
+        "render": (renders["hits"], renders["misses"]),
+        "clone": (clones["hits"], clones["misses"]),
+        "tree": (trees["hits"], trees["misses"]),
+        "imports": (import_cache.hits, import_cache.misses),
+        "symbols": (symbol_cache.hits, symbol_cache.misses),
+    })
+    jobs = job_queue.stats()
+    yield ("codearch_jobs", "gauge", "Background jobs by state", [
+        ({"state": "queued"}, jobs["queued"]),
+        ({"state": "running"}, jobs["running"]),
+    ])
+    yield ("codearch_jobs_finished_total", "counter", "Finished background jobs by outcome", [
+        ({"outcome": "completed"}, jobs["completed"]),
+        ({"outcome": "failed"}, jobs["failed"]),
+        ({"outcome": "rejected"}, jobs["rejected"]),
+    ])
+    yield ("codearch_sessions", "gauge", "Live analysis sessions", [({}, len(session_store))])
+    yield ("codearch_prefetch_pending", "gauge", "Scheduled background prefetches", [({}, prefetcher.pending())])
+    yield ("codearch_singleflight_in_flight", "gauge", "Distinct analyses currently running", [({}, flights.in_flight())])
+    yield ("codearch_clone_cache_bytes", "gauge", "Disk used by cached clones", [({}, clones["total_bytes"])])
+    gateway = llm_gateway.stats()
+    yield ("codearch_llm_events_total", "counter", "LLM gateway retries, rate limits and breaker rejections", [
+        ({"event": "retry"}, gateway["retries"]),
+        ({"event": "rate_limited"}, gateway["rate_limited"]),
+        ({"event": "rejected"}, gateway["rejected"]),
+    ])
+    loop = loop_monitor.stats()
+    yield ("codearch_event_loop_stalls_total", "counter", "Event loop wake-ups late by more than LOOP_BLOCKED_SECONDS",
+           [({}, loop["stalls"])])
+    yield ("codearch_event_loop_max_lag_seconds", "gauge", "Largest event loop lag seen", [({}, loop["max_lag"])])
+    yield ("codearch_llm_breaker_state", "gauge", "LLM circuit breaker: 0 closed, 1 half-open, 2 open",
+           [({}, BREAKER_STATES[gateway["breaker"]])])
+
+registry.collector(collect_service_metrics)
+
 # Function to validate GitHub links
 def is_valid_github_link(link):
     """Validate if the GitHub link format is correct"""
     if not link:
         return False
+    if ALLOW_LOCAL_REPOSITORIES and link.startswith("file://"):
+        return True
     return link.startswith("https://github.com/") or link.startswith("http://github.com/")
 
 @app.get("/", response_class=HTMLResponse)
@@ -65,9 +200,53 @@ async def root():
                 <pre>
 {
   "text": "LLM analysis of the codebase...",
-  "svg": "&lt;svg&gt;...&lt;/svg&gt;"
+  "svg": "&lt;svg&gt;...&lt;/svg&gt;",
+  "svg_handle": "9f86d08..."
 }
                 </pre>
+                <p>History messages should reference earlier diagrams by <code>svg_handle</code> rather than inline <code>svg</code>.</p>
+            </div>
+            
+            <div class="endpoint">
+                <h2>POST /analyze/stream</h2>
+                <p>Same request as <code>/analyze</code>, answered as a stream of Server-Sent Events.</p>
+                <h3>Events:</h3>
+                <pre>
+event: stage   data: {"stage": "cloned", "commit": "..."}
+event: stage   data: {"stage": "structure_ready", "entries": 1234}
+event: text    data: {"delta": "partial analysis text"}
+event: stage   data: {"stage": "components_ready", "count": 6}
+event: svg     data: {"svg": "&lt;svg&gt;...&lt;/svg&gt;", "handle": "9f86d08..."}
+event: done    data: {"text": "full analysis text", "level": "overview"}
+                </pre>
+            </div>
+            
+            <div class="endpoint">
+                <h2>POST /jobs</h2>
+                <p>Same request as <code>/analyze</code>, run in the background. Answers <code>202</code> with a job id, or <code>429</code> with <code>Retry-After</code> when the queue is full.</p>
+                <h3>Response:</h3>
+                <pre>
+{
+  "job_id": "3f2a...",
+  "status": "queued"
+}
+                </pre>
+                <p>Poll <code>GET /jobs/{job_id}</code> until <code>status</code> is <code>succeeded</code>, <code>failed</code> or <code>cancelled</code>; the analysis is in <code>result</code>. <code>GET /jobs/{job_id}/events</code> streams the same events as <code>/analyze/stream</code> plus <code>status</code> events. <code>DELETE /jobs/{job_id}</code> cancels a job.</p>
+            </div>
+            
+            <div class="endpoint">
+                <h2>GET /diagrams/{handle}</h2>
+                <p>Serve a previously generated diagram by its handle, as <code>image/svg+xml</code>. Handles are content addresses, so responses are cacheable forever.</p>
+            </div>
+            
+            <div class="endpoint">
+                <h2>GET /metrics</h2>
+                <p>Per-stage latency histograms, LLM token counts, cache hit ratios and in-flight gauges in the Prometheus text format.</p>
+            </div>
+            
+            <div class="endpoint">
+                <h2>GET /profiles, GET /profiles/{profile_id}</h2>
+                <p>Admin only (<code>X-Admin-Token</code>), when profiling is enabled. <code>POST /analyze</code> with <code>X-Profile: 1</code> runs under a sampling profiler and returns the profile's id in <code>X-Profile-Id</code>; fetch it as a speedscope file or, with <code>?format=collapsed</code>, as folded stacks.</p>
             </div>
             
             <div class="endpoint">
@@ -91,125 +270,597 @@ async def root():
     </html>
     """
 
+async def load_project_tree(github_link: str, on_cloned=None):
+    """
+    Fetch the repository tree without blocking the event loop.
+    
+    Returns:
+        Tuple of (RepoTree, repository error message or None)
+    """
+    try:
+        project_tree = await run_in_stage("clone", get_repository_tree, github_link, on_cloned)
+        
+        # Check if there's an error message
+        if project_tree.error:
+            logger.warning("Project structure contains error: %s", project_tree.error)
+            return project_tree, project_tree.error
+        logger.info("Project tree of %s at %s: %d entries", github_link, project_tree.commit_sha, len(project_tree))
+        return project_tree, None
+    
+    except Exception as e:
+        error_msg = f"Failed to analyze repository: {str(e)}"
+        logger.error("Error getting project structure: %s", error_msg)
+        # Create an empty project structure instead of failing
+        return RepoTree.coerce(""), error_msg
+
+async def build_architecture_diagram(github_link: str, project_tree: RepoTree, drill_down_module: str = None, repository_error: str = None,
+                                     on_components=None, precomputed_components: list = None) -> str:
+    """
+    Generate the overview or module diagram; failures become an error diagram.
+    
+    `precomputed_components`, if given, are already analyzed overview components.
+    """
+    try:
+        # Try to generate a minimal architecture diagram even if repo is inaccessible
+        if repository_error:
+            # Create a simple error architecture diagram
+            logger.debug("Generating error architecture diagram: %s", repository_error)
+            svg_content = create_error_svg(github_link, repository_error)
+        else:
+            # Generate different diagrams based on request type
+            if drill_down_module:
+                logger.debug("Generating module diagram for %s", drill_down_module)
+                svg_content = await generate_module_architecture_svg(github_link, project_tree, drill_down_module, on_components=on_components)
+            else:
+                logger.debug("Generating overview diagram")
+                svg_content = await generate_architecture_svg(github_link, project_tree, make_clickable=True, on_components=on_components,
+                                                              precomputed_components=precomputed_components)
+            logger.debug("Architecture diagram complete, %d bytes", len(svg_content))
+        
+        if not svg_content:
+            logger.warning("Generated SVG content is empty")
+        return svg_content
+    except Exception as e:
+        logger.error("Error generating architecture diagram: %s", e)
+        svg_content = create_error_svg(github_link, str(e))
+        return svg_content
+
+def history_digest(history) -> str:
+    payload = json.dumps([[msg.role, msg.content] for msg in history], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def run_analysis(github_link: str, history, project_tree: RepoTree, drill_down_module: str = None,
+                       repository_error: str = None, needs_diagram: bool = True, history_state=None):
+    """
+    Produce the narrative and, when needed, the diagram for one request.
+    
+    The narrative and the diagram only share the project structure, so both
+    LLM calls run concurrently and the user waits for the slower one.
+    `history_state` is the session's rolling summary of older turns.
+    
+    Returns:
+        Tuple of (response text, SVG content, diagram components)
+    """
+    if COMBINED_ANALYSIS and needs_diagram and not drill_down_module and not history and not repository_error:
+        return await run_combined_analysis(github_link, project_tree)
+    
+    components = []
+    text_job = analyze_with_claude(history, github_link, project_tree, drill_down_module, history_state=history_state)
+    if needs_diagram:
+        diagram_job = build_architecture_diagram(github_link, project_tree, drill_down_module, repository_error,
+                                                 on_components=components.extend)
+    else:
+        logger.debug("Follow-up conversation, not generating architecture diagram")
+        diagram_job = asyncio.sleep(0, result="")
+    text_result, svg_result = await asyncio.gather(text_job, diagram_job, return_exceptions=True)
+    
+    # A failure on one side must not discard the other side's result
+    if isinstance(svg_result, Exception):
+        logger.error("Error generating architecture diagram: %s", svg_result)
+        svg_result = create_error_svg(github_link, str(svg_result))
+    svg_content = svg_result
+    
+    if isinstance(text_result, Exception):
+        logger.error("Claude analysis failed: %s", text_result)
+        if not svg_content:
+            raise text_result
+        response_text = f"The architecture diagram is ready, but the written analysis could not be generated: {str(text_result)}"
+    else:
+        response_text = text_result
+        logger.debug("Claude analysis complete, %d characters", len(response_text))
+    
+    return response_text, svg_content, components
+
+async def run_combined_analysis(github_link: str, project_tree: RepoTree):
+    """
+    Initial overview with COMBINED_ANALYSIS: one LLM call for the narrative and the components, then the render.
+    
+    Returns:
+        Tuple of (response text, SVG content, diagram components)
+    """
+    components = []
+    try:
+        response_text, overview_components = await analyze_overview_with_llm(github_link, project_tree)
+    except Exception as e:
+        logger.error("Combined analysis failed: %s", e)
+        response_text = f"The architecture diagram is ready, but the written analysis could not be generated: {str(e)}"
+        # Without components the diagram falls back to the import graph
+        overview_components = []
+    svg_content = await build_architecture_diagram(github_link, project_tree, on_components=components.extend,
+                                                   precomputed_components=overview_components)
+    return response_text, svg_content, components
+
+def remember_analysis(session: AnalysisSession, module: str, text: str, svg_content: str, components: list):
+    """Store a finished overview (module None) or module analysis in the session"""
+    session.diagrams[module] = svg_content
+    if module is None:
+        session.overview_text = text
+        session.overview_components = list(components)
+        prefetch_module_diagrams(session)
+    else:
+        session.module_components[module] = list(components)
+    session_store.update(session)
+
+def start_session(github_link: str, project_tree: RepoTree, module: str, text: str, svg_content: str, components: list) -> AnalysisSession:
+    """Create a session holding a fresh analysis"""
+    session = session_store.create(github_link, project_tree)
+    remember_analysis(session, module, text, svg_content, components)
+    logger.info("Created analysis session %s", session.session_id)
+    return session
+
+def module_snapshot(github_link: str, project_tree: RepoTree, module: str) -> tuple:
+    """Identity of a module diagram: repository, commit and module, shared by every session"""
+    # Without a commit sha only the tree object itself pins the snapshot
+    return (github_link, project_tree.commit_sha or id(project_tree), module)
+
+def module_diagram_key(github_link: str, commit_sha: str, module: str) -> str:
+    payload = json.dumps(["module-diagram", github_link, commit_sha, module], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def module_diagram(github_link: str, project_tree: RepoTree, module: str):
+    """
+    The diagram and components of one module, computed once per repository and commit.
+    
+    Concurrent requests from any session share one flight, and finished
+    diagrams of a known commit are kept in the analysis cache for later sessions.
+    
+    Returns:
+        Tuple of (SVG content, components)
+    """
+    cache_key = module_diagram_key(github_link, project_tree.commit_sha, module) if project_tree.commit_sha else None
+    cached = await analysis_cache.aget(cache_key) if cache_key else None
+    if cached is not None:
+        return cached["svg"], cached["components"]
+    
+    async def build():
+        components = []
+        svg_content = await build_architecture_diagram(github_link, project_tree, module, on_components=components.extend)
+        # Fallback and error diagrams carry no components; only real analyses are kept
+        if cache_key and components:
+            await analysis_cache.aput(cache_key, {"svg": svg_content, "components": components})
+        return svg_content, components
+    
+    return await flights.do(("module",) + module_snapshot(github_link, project_tree, module), build)
+
+def prefetch_module_diagrams(session: AnalysisSession):
+    """
+    Start computing the drill-downs of the overview's components in the background.
+    
+    Prefetches share the module's flight with clicks and with other sessions
+    of the same commit, so a module being prefetched is never computed twice.
+    """
+    async def prefetch(module: str):
+        svg_content, components = await module_diagram(session.github_link, session.tree, module)
+        if session.session_id in session_store:
+            remember_analysis(session, module, "", svg_content, components)
+    
+    for module in prefetch_candidates(session.overview_components):
+        prefetcher.schedule(
+            session.session_id,
+            f"{module} diagram for {session.github_link}",
+            lambda module=module: prefetch(module),
+            should_run=lambda module=module: module not in session.diagrams and session.session_id in session_store
+        )
+
+def cancel_session_work(session: AnalysisSession):
+    """
+    Stop background work for an expired session.
+    
+    Only prefetches are cancelled. A request may still be waiting on the
+    session's flights, and module flights are shared with other sessions.
+    """
+    prefetcher.cancel(session.session_id)
+
+session_store.on_expire(cancel_session_work)
+
+async def session_analysis(session: AnalysisSession, history, module: str = None):
+    """
+    Serve an overview or drill-down from a session.
+    
+    Stored diagrams are returned as is. A module seen for the first time costs
+    exactly one LLM call (its component analysis); the text is derived from
+    those components instead of a second narrative call.
+    """
+    if module in session.diagrams:
+        logger.info("Serving %s from session %s", module or "overview", session.session_id)
+        if module is None:
+            return session.overview_text, session.diagrams[None]
+        return summarize_components(module, session.module_components.get(module, [])), session.diagrams[module]
+    
+    if module is None:
+        text, svg_content, components = await run_analysis(session.github_link, history, session.tree, None, None, True)
+        remember_analysis(session, None, text, svg_content, components)
+        return text, svg_content
+    
+    svg_content, components = await module_diagram(session.github_link, session.tree, module)
+    remember_analysis(session, module, "", svg_content, components)
+    return summarize_components(module, components), svg_content
+
 @app.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(request: AnalyzeRequest):
     try:
-        print(f"\n======== Start Processing Request ========")
-        print(f"Received request for GitHub link: {request.github_link}")
-        print(f"Has history: {len(request.history) > 0}")
-        print(f"Force initial: {request.force_initial}")
-        
         # If force_initial is True or history is empty, treat as initial request
         is_initial_request = request.force_initial or len(request.history) == 0
-        print(f"Is initial request: {is_initial_request}")
+        logger.info("Analyze %s: initial=%s module=%s history=%d session=%s", request.github_link, is_initial_request, request.drill_down_module, len(request.history), request.session_id)
         
         repository_error = None
         
         # For non-initial requests, don't strictly validate GitHub link
         if not is_initial_request:
             # No need to strictly validate GitHub link for follow-up conversations
-            print(f"Follow-up conversation, skipping GitHub link validation")
             pass
         else:
             # Validate GitHub link
             if not is_valid_github_link(request.github_link):
-                print(f"Invalid GitHub link: {request.github_link}")
+                logger.warning("Invalid GitHub link: %s", request.github_link)
                 raise HTTPException(status_code=400, detail="Invalid GitHub link")
-            
-            print(f"Valid GitHub link: {request.github_link}")
 
-        # Get project structure
-        project_structure = ""
-        if is_initial_request or request.drill_down_module:
-            try:
-                # For initial requests or drill-down requests, get project structure
-                print(f"Getting project structure...")
-                project_structure = get_project_structure(request.github_link)
-                print(f"Project structure length: {len(project_structure)}")
-                
-                # Check if there's an error message
-                if project_structure.startswith("[Error"):
-                    repository_error = project_structure
-                    print(f"Project structure contains error: {repository_error}")
-                else:
-                    print(f"Project structure retrieved successfully, preview: {project_structure[:100]}...")
-                
-            except Exception as e:
-                error_msg = f"Failed to analyze repository: {str(e)}"
-                print(f"Error getting project structure: {error_msg}")
-                repository_error = error_msg
-                # Create an empty project structure instead of failing
-                project_structure = ""
-        else:
-            # For follow-up requests, no need to get project structure
-            print(f"Follow-up conversation, not retrieving project structure")
-            project_structure = ""
-        
-        # Use Claude for analysis - pass drill-down info
-        print(f"Calling Claude for analysis...")
-        response_text = analyze_with_claude(request.history, request.github_link, project_structure, request.drill_down_module)
-        print(f"Claude analysis complete, response length: {len(response_text)}")
+        # Reuse the analysis session from a previous response, if it is still alive
+        session = session_store.get(request.session_id)
+        if session and is_initial_request and not request.drill_down_module and session.github_link != request.github_link:
+            # A new repository starts a new session
+            session = None
         
         # Determine current level and module
         current_level = "module" if request.drill_down_module else "overview"
         current_module = request.drill_down_module
         navigation_path = request.current_path or []
+        needs_diagram = bool(is_initial_request or request.drill_down_module)
         
-        # For initial requests or drill-down requests, generate architecture diagram
-        svg_content = ""
-        if is_initial_request or request.drill_down_module:
-            try:
-                print(f"Starting architecture diagram generation...")
-                # Try to generate a minimal architecture diagram even if repo is inaccessible
-                if repository_error:
-                    # Create a simple error architecture diagram
-                    print(f"Generating error architecture diagram with error info: {repository_error}")
-                    svg_content = create_error_svg(request.github_link, repository_error)
-                    print(f"Error architecture diagram generation complete, length: {len(svg_content)}")
-                else:
-                    # Generate different diagrams based on request type
-                    if request.drill_down_module:
-                        print(f"Generating module-specific diagram for: {request.drill_down_module}")
-                        svg_content = generate_module_architecture_svg(request.github_link, project_structure, request.drill_down_module)
-                    else:
-                        print(f"Generating overview architecture diagram...")
-                        svg_content = generate_architecture_svg(request.github_link, project_structure, make_clickable=True)
-                    print(f"Architecture diagram generation complete, length: {len(svg_content)}")
-                
-                if svg_content:
-                    print(f"SVG preview: {svg_content[:100]}...")
-                else:
-                    print(f"Warning: Generated SVG content is empty")
-            except Exception as e:
-                print(f"Error generating architecture diagram: {str(e)}")
-                print(f"Attempting to generate error architecture diagram...")
-                svg_content = create_error_svg(request.github_link, str(e))
-                print(f"Error architecture diagram generation complete, length: {len(svg_content)}")
+        if session and needs_diagram:
+            # Overview and drill-downs are served from the session without re-cloning
+            response_text, svg_content = await flights.do(
+                ("session", session.session_id, request.drill_down_module),
+                lambda: session_analysis(session, request.history, request.drill_down_module)
+            )
         else:
-            print(f"Follow-up conversation, not generating architecture diagram")
+            # Follow-ups in a session know their repository and structure already
+            github_link = session.github_link if session else request.github_link
+            project_tree = session.tree if session else RepoTree.coerce("")
+            if needs_diagram:
+                # For initial requests or drill-down requests, get project structure
+                project_tree, repository_error = await flights.do(
+                    ("tree", request.github_link),
+                    lambda: load_project_tree(request.github_link)
+                )
+            elif not session:
+                # For follow-up requests, no need to get project structure
+                logger.debug("Follow-up conversation, not retrieving project structure")
+            
+            # Identical concurrent requests (same repo, commit, module, kind and
+            # history) share one run of the LLM calls and render
+            flight_key = (
+                "analysis",
+                github_link,
+                project_tree.commit_sha,
+                request.drill_down_module,
+                "diagram" if needs_diagram else "chat",
+                history_digest(request.history),
+            )
+            async def analyze_once():
+                # Runs once per flight, so coalesced requests share the session it creates
+                text, svg, components = await run_analysis(
+                    github_link, request.history, project_tree, request.drill_down_module,
+                    repository_error, needs_diagram, session.history if session else None
+                )
+                if needs_diagram and not repository_error:
+                    return text, svg, start_session(request.github_link, project_tree, request.drill_down_module, text, svg, components)
+                if session:
+                    # A follow-up may have compacted the session's history
+                    session_store.update(session)
+                return text, svg, None
+            
+            response_text, svg_content, created = await flights.do(flight_key, analyze_once)
+            session = created or session
         
         # Construct and return response
-        response = AnalyzeResponse(
-            text=response_text, 
-            svg=svg_content,
-            level=current_level,
-            current_module=current_module,
-            navigation_path=navigation_path
-        )
-        print(f"Returning response, SVG length: {len(svg_content)}")
-        print(f"======== Request Processing Complete ========\n")
-        return response
+        svg_handle = await diagram_store.aput(svg_content) if svg_content else None
+        with timed("serialize"):
+            response = AnalyzeResponse(
+                text=response_text, 
+                svg=svg_content,
+                svg_handle=svg_handle,
+                level=current_level,
+                current_module=current_module,
+                navigation_path=navigation_path,
+                session_id=session.session_id if session else None
+            )
+            body = response.model_dump_json()
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
-        print(f"Unexpected error in request processing: {str(e)}")
+        logger.exception("Unexpected error in request processing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def analysis_pipeline(request: AnalyzeRequest, is_initial_request: bool, emit) -> dict:
+    """
+    Run the analyze pipeline, reporting each stage through `emit(event, data)` as it finishes.
+    
+    Shared by the streaming endpoint and background jobs.
+    
+    Events:
+        stage  -- {"stage": "cloned" | "structure_ready" | "components_ready", ...}
+        text   -- {"delta": "..."} for each chunk of the streamed narrative
+        svg    -- {"svg": "..."} once the diagram is rendered
+        error  -- {"stage": ..., "detail": ...} for a failed stage; other stages continue
+    
+    Returns:
+        The final text and navigation fields, mirroring AnalyzeResponse
+    """
+    loop = asyncio.get_running_loop()
+    
+    async def produce_text(project_tree: RepoTree, session: AnalysisSession = None) -> str:
+        chunks = []
+        try:
+            async for chunk in stream_with_claude(request.history, request.github_link, project_tree, request.drill_down_module,
+                                                  history_state=session.history if session else None):
+                chunks.append(chunk)
+                emit("text", {"delta": chunk})
+        except Exception as e:
+            logger.error("Claude streaming failed: %s", e)
+            emit("error", {"stage": "text", "detail": str(e)})
+        return "".join(chunks)
+    
+    components = []
+    
+    def components_ready(found: list):
+        components.extend(found)
+        emit("stage", {"stage": "components_ready", "count": len(found)})
+    
+    async def produce_diagram(project_tree: RepoTree, repository_error: str, session: AnalysisSession = None) -> str:
+        if session and request.drill_down_module in session.diagrams:
+            svg_content = session.diagrams[request.drill_down_module]
+        elif session and request.drill_down_module:
+            # Shared with /analyze, prefetches and other sessions of the same commit
+            svg_content, found = await module_diagram(session.github_link, session.tree, request.drill_down_module)
+            components_ready(found)
+            remember_analysis(session, request.drill_down_module, "", svg_content, components)
+        else:
+            svg_content = await build_architecture_diagram(
+                request.github_link, project_tree, request.drill_down_module, repository_error,
+                on_components=components_ready
+            )
+            if session:
+                remember_analysis(session, request.drill_down_module, "", svg_content, components)
+        emit("svg", {"svg": svg_content, "handle": await diagram_store.aput(svg_content) if svg_content else None})
+        return svg_content
+    
+    needs_diagram = bool(is_initial_request or request.drill_down_module)
+    session = session_store.get(request.session_id)
+    if session and is_initial_request and not request.drill_down_module and session.github_link != request.github_link:
+        session = None
+    project_tree, repository_error = RepoTree.coerce(""), None
+    if session:
+        project_tree = session.tree
+    elif needs_diagram:
+        project_tree, repository_error = await load_project_tree(
+            request.github_link,
+            on_cloned=lambda sha: loop.call_soon_threadsafe(emit, "stage", {"stage": "cloned", "commit": sha})
+        )
+        emit("stage", {
+            "stage": "structure_ready",
+            "entries": len(project_tree),
+            "truncated": project_tree.truncated,
+            "error": repository_error,
+        })
+    
+    jobs = [produce_text(project_tree, session)]
+    if needs_diagram:
+        jobs.append(produce_diagram(project_tree, repository_error, session))
+    results = await asyncio.gather(*jobs)
+    if needs_diagram and not session and not repository_error:
+        session = start_session(request.github_link, project_tree, request.drill_down_module, results[0], results[1], components)
+    elif session:
+        session_store.update(session)
+    return {
+        "text": results[0],
+        "level": "module" if request.drill_down_module else "overview",
+        "current_module": request.drill_down_module,
+        "navigation_path": request.current_path or [],
+        "session_id": session.session_id if session else None,
+        "svg_handle": await diagram_store.aput(results[1]) if needs_diagram and results[1] else None,
+    }
+
+async def stream_analysis(request: AnalyzeRequest, is_initial_request: bool):
+    """
+    Run the analyze pipeline, yielding its events as SSE.
+    
+    The last event is `done`, with the final text and navigation fields, or
+    `error` with stage "pipeline" if the pipeline failed.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    
+    def emit(event: str, data: dict):
+        events.put_nowait((event, data))
+    
+    async def pipeline():
+        try:
+            emit("done", await analysis_pipeline(request, is_initial_request, emit))
+        except Exception as e:
+            logger.exception("Unexpected error in streaming request: %s", e)
+            emit("error", {"stage": "pipeline", "detail": str(e)})
+        finally:
+            emit(finished, None)
+    
+    async def interactive_pipeline():
+        # A stream is interactive until its pipeline finishes, not just until headers are sent
+        async with prefetcher.interactive():
+            await pipeline()
+    
+    task = asyncio.create_task(interactive_pipeline())
+    try:
+        while True:
+            event, data = await events.get()
+            if event is finished:
+                break
+            yield sse_event(event, data)
+    finally:
+        # The client went away; stop the LLM calls and render
+        if not task.done():
+            task.cancel()
+
+@app.post("/analyze/stream")
+async def analyze_stream(request: AnalyzeRequest):
+    """Streaming variant of /analyze that sends Server-Sent Events as stages complete"""
+    is_initial_request = request.force_initial or len(request.history) == 0
+    if is_initial_request and not is_valid_github_link(request.github_link):
+        raise HTTPException(status_code=400, detail="Invalid GitHub link")
+    
+    return StreamingResponse(
+        stream_analysis(request, is_initial_request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(request: AnalyzeRequest, deadline_seconds: Optional[float] = None):
+    """
+    Queue an analysis and return its job id right away.
+    
+    Identical requests submitted while a job is queued or running get that
+    job back. A full queue answers 429 with a Retry-After header.
+    """
+    is_initial_request = request.force_initial or len(request.history) == 0
+    if is_initial_request and not is_valid_github_link(request.github_link):
+        raise HTTPException(status_code=400, detail="Invalid GitHub link")
+    
+    async def run(emit):
+        async with prefetcher.interactive():
+            return await analysis_pipeline(request, is_initial_request, emit)
+    
+    key = ("job", request.github_link, request.session_id, request.drill_down_module,
+           is_initial_request, history_digest(request.history))
+    try:
+        job = job_queue.submit(run, key, deadline_seconds)
+    except QueueFull as e:
+        logger.warning("Rejecting job for %s: %s", request.github_link, e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    logger.info("Job %s %s for %s", job.job_id, job.status, request.github_link)
+    return JobStatus(**job.to_dict())
+
+def find_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Poll a job; `result` is set once it succeeded"""
+    return JobStatus(**find_job(job_id).to_dict())
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Follow a job as Server-Sent Events.
+    
+    Replays the job's events so far, then streams new ones: the analyze
+    stream's events plus `status` events, the last of which carries the
+    final status and, on success, the result.
+    """
+    job = find_job(job_id)
+    
+    async def follow():
+        seen = 0
+        while True:
+            while seen < len(job.events):
+                event, data = job.events[seen]
+                seen += 1
+                yield sse_event(event, data)
+            if job.finished:
+                break
+            await job.wait_for_event(seen)
+    
+    return StreamingResponse(
+        follow(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    find_job(job_id)
+    return JobStatus(**job_queue.cancel(job_id).to_dict())
+
+@app.get("/diagrams/{handle}")
+async def get_diagram(handle: str, request: Request):
+    """Serve a stored diagram; a handle always names the same content"""
+    if not is_valid_handle(handle):
+        raise HTTPException(status_code=400, detail="Invalid diagram handle")
+    
+    etag = f'"{handle}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    svg_content = await diagram_store.aget(handle)
+    if svg_content is None:
+        raise HTTPException(status_code=404, detail="Diagram not found")
+    return Response(content=svg_content, media_type="image/svg+xml", headers=headers)
+
+@app.get("/metrics")
+async def metrics():
+    """Stage latencies, LLM usage, cache hit ratios and in-flight gauges in the Prometheus text format"""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_profiling_admin(request: Request):
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiler.authorized(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/profiles")
+async def list_profiles(request: Request):
+    """Stored request profiles, newest first"""
+    require_profiling_admin(request)
+    return {"profiles": profile_store.list()}
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "speedscope"):
+    """A stored profile, as a speedscope file or as folded stacks for flamegraph tools"""
+    require_profiling_admin(request)
+    if not is_valid_profile_id(profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be speedscope or collapsed")
+    speedscope = profile_store.get(profile_id)
+    if speedscope is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return Response(content=to_collapsed(speedscope), media_type="text/plain; charset=utf-8")
+    headers = {"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'}
+    return Response(content=json.dumps(speedscope), media_type="application/json", headers=headers)
+
 @app.post("/file", response_model=FileResponse)
 async def get_file(request: FileRequest):
     try:
         # Validate GitHub link
-        if not request.github_link or not (request.github_link.startswith("https://github.com/") or 
-                                         request.github_link.startswith("http://github.com/")):
+        if not is_valid_github_link(request.github_link):
             raise HTTPException(status_code=400, detail="Invalid GitHub repository link")
             
         # Validate file path
@@ -217,7 +868,7 @@ async def get_file(request: FileRequest):
             raise HTTPException(status_code=400, detail="File path cannot be empty")
             
         # Get file content from GitHub repository
-        content = get_file_content(request.github_link, request.file_path)
+        content = await run_in_stage("clone", get_file_content, request.github_link, request.file_path)
         
         # Check if there was an error getting the file content
         if content.startswith("[Error"):
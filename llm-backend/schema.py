@@ -4,7 +4,8 @@ from typing import List, Optional, Dict, Any
 class Message(BaseModel):
     role: str  # 'user' or 'assistant'
     content: str
-    svg: Optional[str] = None
+    svg: Optional[str] = None  # Deprecated: inline markup is ignored, send svg_handle instead
+    svg_handle: Optional[str] = None  # Diagram shown with this message, see GET /diagrams/{handle}
 
 class AnalyzeRequest(BaseModel):
     github_link: str
@@ -12,13 +13,37 @@ class AnalyzeRequest(BaseModel):
     force_initial: Optional[bool] = False
     drill_down_module: Optional[str] = None  # For drilling into specific module
     current_path: Optional[List[str]] = None  # Navigation breadcrumb
+    session_id: Optional[str] = None  # Analysis session returned by a previous response
 
 class AnalyzeResponse(BaseModel):
     text: str
     svg: str
+    svg_handle: Optional[str] = None  # Content address of `svg`, for use in later history messages
     level: Optional[str] = "overview"  # "overview" or "module"
     current_module: Optional[str] = None
     navigation_path: Optional[List[str]] = None
+    session_id: Optional[str] = None  # Pass back to reuse this analysis for drill-downs and follow-ups
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # "queued", "running", "succeeded", "failed" or "cancelled"
+    stage: Optional[str] = None  # Latest pipeline stage reached
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None  # Text, svg_handle and navigation fields, once succeeded
+    error: Optional[str] = None
+
+class Component(BaseModel):
+    name: str
+    description: str  # Purpose of the component, in 1-2 lines
+    dependencies: List[str] = []  # Names of other components this one depends on
+    dependency_details: Dict[str, str] = {}  # Dependency name -> nature of the relationship
+
+# Tool input of the combined overview call: the narrative and the diagram's components
+class OverviewAnalysis(BaseModel):
+    narrative: str
+    components: List[Component]
 
 class FileRequest(BaseModel):
     github_link: str
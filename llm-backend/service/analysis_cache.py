@@ -0,0 +1,216 @@
+import os
+import json
+import asyncio
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "llm-code-arch-analyses"))
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "256"))
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+# A trim frees space down to this fraction of the budget, so a full cache is not trimmed on every write
+ANALYSIS_CACHE_TRIM_FRACTION = 0.9
+
+_MISSING = object()
+
+
+def analysis_key(model: str, prompt_version: str, structure: str, module_name: Optional[str] = None) -> str:
+    """
+    Content address of an analysis.
+
+    The repository URL is deliberately not part of the key, so forks and
+    mirrors with an identical structure share one analysis.
+    """
+    payload = json.dumps([model, prompt_version, structure, module_name], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-level cache of parsed LLM component analyses.
+
+    An in-memory LRU sits in front of a directory of JSON files. Entries expire
+    after `ttl_seconds`; the disk level is trimmed least-recently-used once it
+    grows beyond `max_bytes`, down to `ANALYSIS_CACHE_TRIM_FRACTION` of it.
+
+    `get` and `put` block on disk I/O and suit worker threads; coroutines use
+    `aget` and `aput`, which answer memory hits inline and move the disk part
+    to the default executor.
+    """
+
+    def __init__(self, root: str = ANALYSIS_CACHE_DIR, ttl_seconds: float = ANALYSIS_CACHE_TTL_SECONDS,
+                 memory_entries: int = ANALYSIS_CACHE_MEMORY_ENTRIES, max_bytes: int = ANALYSIS_CACHE_MAX_BYTES):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+        self._trimming = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        """Yield (path, size, mtime) for every entry on disk"""
+        for shard in os.listdir(self.root):
+            shard_path = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                path = os.path.join(shard_path, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _memory_get(self, key: str) -> Any:
+        """The value from the memory level, or `_MISSING`"""
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                expires_at, value = cached
+                if expires_at > time.time():
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+        return _MISSING
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._memory_get(key)
+        return self._disk_get(key) if value is _MISSING else value
+
+    async def aget(self, key: str) -> Optional[Any]:
+        value = self._memory_get(key)
+        if value is not _MISSING:
+            return value
+        return await asyncio.get_running_loop().run_in_executor(None, self._disk_get, key)
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if record.get("expires_at", 0) <= now:
+            self._remove_file(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            # Reads refresh the file's position in the disk LRU
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.disk_hits += 1
+            self._remember_locked(key, record["expires_at"], record["value"])
+        return record["value"]
+
+    def _memory_put(self, key: str, value: Any) -> float:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember_locked(key, expires_at, value)
+        return expires_at
+
+    def put(self, key: str, value: Any):
+        self._disk_put(key, self._memory_put(key, value), value)
+
+    async def aput(self, key: str, value: Any):
+        expires_at = self._memory_put(key, value)
+        await asyncio.get_running_loop().run_in_executor(None, self._disk_put, key, expires_at, value)
+
+    def _disk_put(self, key: str, expires_at: float, value: Any):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({"expires_at": expires_at, "value": value}, ensure_ascii=False).encode("utf-8")
+        # Write then rename, so concurrent readers never see a partial file
+        staging = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(staging, "wb") as f:
+                f.write(data)
+            os.replace(staging, path)
+        except OSError as e:
+            logger.warning("Failed to persist analysis cache entry: %s", e)
+            return
+        with self._lock:
+            self._disk_bytes += len(data) - old_size
+            # One writer trims; the others carry on while it frees space
+            trim = self._disk_bytes > self.max_bytes and not self._trimming
+            self._trimming = self._trimming or trim
+        if trim:
+            try:
+                self._trim_disk()
+            finally:
+                with self._lock:
+                    self._trimming = False
+
+    def _remember_locked(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _remove_file(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _trim_disk(self):
+        """Delete expired entries, then least-recently-used ones, until under the low-water mark"""
+        now = time.time()
+        low_water = self.max_bytes * ANALYSIS_CACHE_TRIM_FRACTION
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        for path, _, mtime in entries:
+            if self._disk_bytes <= low_water and mtime + self.ttl_seconds > now:
+                continue
+            self._remove_file(path)
+
+    def clear(self):
+        """Drop every entry, in memory and on disk"""
+        with self._lock:
+            self._memory.clear()
+        for path, _, _ in list(self._disk_entries()):
+            self._remove_file(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+analysis_cache = AnalysisCache()
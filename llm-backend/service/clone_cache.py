@@ -0,0 +1,340 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable
+
+import git
+
+from service.log import get_logger
+from service.metrics import timed
+
+logger = get_logger(__name__)
+
+CLONE_CACHE_DIR = os.getenv("CLONE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "llm-code-arch-clones"))
+CLONE_CACHE_MAX_BYTES = int(os.getenv("CLONE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# How long a resolved HEAD SHA is trusted before asking the remote again
+CLONE_CACHE_FRESHNESS_SECONDS = float(os.getenv("CLONE_CACHE_FRESHNESS_SECONDS", "60"))
+# "blobless" clones only commits and trees and fetches file contents on demand;
+# "full" checks out the whole working tree
+CLONE_MODE = os.getenv("CLONE_MODE", "blobless")
+
+
+@dataclass
+class CachedClone:
+    """A clone of one repository at one commit"""
+    github_link: str
+    commit_sha: str
+    path: str
+    mode: str = "full"
+    size_bytes: int = 0
+    pack_bytes: int = 0  # part of size_bytes in .git/objects/pack, where blobless clones grow
+    pins: int = 0
+    last_used: float = field(default_factory=time.time)
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _pack_size(path: str) -> int:
+    """Size of a clone's pack files, without walking the rest of the clone"""
+    total = 0
+    try:
+        with os.scandir(os.path.join(path, ".git", "objects", "pack")) as entries:
+            for entry in entries:
+                try:
+                    total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return total
+
+
+def _repo_key(github_link: str) -> str:
+    return hashlib.sha256(github_link.rstrip("/").encode("utf-8")).hexdigest()[:16]
+
+
+class CloneCache:
+    """
+    On-disk store of repository clones keyed by (repo URL, HEAD commit SHA).
+
+    Clones are reused as long as the remote HEAD still points at the cached
+    commit, evicted least-recently-used once the store exceeds its disk budget,
+    and deleted on a background thread so eviction never blocks a request.
+    Clones adopted from a previous process are measured on that thread too.
+    """
+
+    def __init__(self, root: str = CLONE_CACHE_DIR, max_bytes: int = CLONE_CACHE_MAX_BYTES,
+                 freshness_seconds: float = CLONE_CACHE_FRESHNESS_SECONDS, mode: str = CLONE_MODE):
+        if mode not in ("blobless", "full"):
+            raise ValueError(f"Unknown clone mode: {mode}")
+        self.root = root
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.freshness_seconds = freshness_seconds
+        self._trash = os.path.join(root, ".trash")
+        os.makedirs(self._trash, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, CachedClone]" = OrderedDict()
+        self._heads: dict = {}  # github_link -> (commit_sha, resolved_at)
+        self._key_locks: dict = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._cleanup_queue: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self._cleanup_thread = threading.Thread(target=self._cleanup_worker, name="clone-cache-cleanup", daemon=True)
+        self._cleanup_thread.start()
+
+        self._load_existing()
+
+    def _load_existing(self):
+        """Adopt clones left on disk by a previous process, oldest first"""
+        found = []
+        for repo_dir in os.listdir(self.root):
+            repo_path = os.path.join(self.root, repo_dir)
+            if repo_dir.startswith(".") or not os.path.isdir(repo_path):
+                continue
+            for commit_sha in os.listdir(repo_path):
+                clone_path = os.path.join(repo_path, commit_sha)
+                link_file = os.path.join(clone_path, ".git", "llm-code-arch-url")
+                mode_file = os.path.join(clone_path, ".git", "llm-code-arch-mode")
+                if commit_sha.startswith(".") or not os.path.isfile(link_file):
+                    # Incomplete clone from a crashed process
+                    self._discard(clone_path)
+                    continue
+                with open(link_file, "r", encoding="utf-8") as f:
+                    github_link = f.read().strip()
+                mode = "full"
+                if os.path.isfile(mode_file):
+                    with open(mode_file, "r", encoding="utf-8") as f:
+                        mode = f.read().strip()
+                if mode != self.mode:
+                    # Cached under a different clone mode; not usable by this process
+                    self._discard(clone_path)
+                    continue
+                found.append(CachedClone(
+                    github_link=github_link,
+                    commit_sha=commit_sha,
+                    path=clone_path,
+                    mode=mode,
+                    last_used=os.path.getmtime(clone_path),
+                ))
+        with self._lock:
+            for entry in sorted(found, key=lambda e: e.last_used):
+                self._entries[(entry.github_link, entry.commit_sha)] = entry
+                # Walking every clone would hold up startup; sizes arrive from the cleanup thread
+                self._cleanup_queue.put(lambda entry=entry: self._measure(entry))
+
+    def _measure(self, entry: CachedClone):
+        """Size an adopted clone and evict if it puts the store over budget"""
+        size = _directory_size(entry.path)
+        pack_bytes = _pack_size(entry.path)
+        with self._lock:
+            if self._entries.get((entry.github_link, entry.commit_sha)) is entry:
+                self._total_bytes += size - entry.size_bytes
+            entry.size_bytes = size
+            entry.pack_bytes = pack_bytes
+            self._evict_locked()
+
+    def resolve_head(self, github_link: str) -> str:
+        """
+        Resolve the commit the remote HEAD points at using `git ls-remote`.
+
+        The answer is remembered for `freshness_seconds`, so bursts of requests
+        for the same repository do not even pay for the ls-remote round trip.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._heads.get(github_link)
+        if cached and now - cached[1] < self.freshness_seconds:
+            return cached[0]
+
+        with timed("resolve_head"):
+            output = git.cmd.Git().ls_remote(github_link, "HEAD")
+        if not output.strip():
+            raise git.exc.GitCommandError(["git", "ls-remote", github_link, "HEAD"], 128,
+                                          stderr=f"Remote HEAD not found for {github_link}")
+        commit_sha = output.split()[0]
+        with self._lock:
+            self._heads[github_link] = (commit_sha, now)
+        return commit_sha
+
+    @contextmanager
+    def acquire(self, github_link: str):
+        """
+        Yield a `CachedClone` of the repository's current HEAD.
+
+        The clone is pinned for the duration of the `with` block so that it
+        cannot be evicted while the caller is reading from it.
+        """
+        entry = self._get_or_clone(github_link)
+        try:
+            yield entry
+        finally:
+            # Blobless clones grow by the packs of file contents fetched on demand
+            pack_bytes = _pack_size(entry.path) if entry.mode == "blobless" else entry.pack_bytes
+            with self._lock:
+                entry.pins -= 1
+                growth = pack_bytes - entry.pack_bytes
+                if (entry.github_link, entry.commit_sha) in self._entries:
+                    self._total_bytes += growth
+                entry.size_bytes += growth
+                entry.pack_bytes = pack_bytes
+                self._evict_locked()
+
+    def _get_or_clone(self, github_link: str) -> CachedClone:
+        commit_sha = self.resolve_head(github_link)
+        key = (github_link, commit_sha)
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread clones a given commit; the others wait and reuse it
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._touch_locked(key, entry)
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            try:
+                with timed("clone"):
+                    entry = self._clone(github_link, commit_sha)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+
+            actual_key = (github_link, entry.commit_sha)
+            with self._lock:
+                existing = self._entries.get(actual_key)
+                if existing is not None:
+                    # Another request published the same commit while we cloned
+                    entry = existing
+                else:
+                    self._entries[actual_key] = entry
+                    self._total_bytes += entry.size_bytes
+                self._touch_locked(actual_key, entry)
+                self._evict_locked()
+            return entry
+
+    def _clone(self, github_link: str, commit_sha: str) -> CachedClone:
+        repo_dir = os.path.join(self.root, _repo_key(github_link))
+        os.makedirs(repo_dir, exist_ok=True)
+        staging = os.path.join(repo_dir, f".tmp-{uuid.uuid4().hex}")
+
+        logger.info("Cloning %s at %s into clone cache (%s)", github_link, commit_sha[:12], self.mode)
+        try:
+            if self.mode == "blobless":
+                # Commits and trees only; blobs are fetched lazily from the promisor remote
+                repo = git.Repo.clone_from(github_link, staging, depth=1, filter="blob:none", no_checkout=True)
+            else:
+                repo = git.Repo.clone_from(github_link, staging, depth=1)
+            # The remote may have moved between ls-remote and clone
+            actual_sha = repo.head.commit.hexsha
+            repo.close()
+            with open(os.path.join(staging, ".git", "llm-code-arch-url"), "w", encoding="utf-8") as f:
+                f.write(github_link)
+            with open(os.path.join(staging, ".git", "llm-code-arch-mode"), "w", encoding="utf-8") as f:
+                f.write(self.mode)
+        except Exception:
+            self._discard(staging)
+            raise
+
+        final_path = os.path.join(repo_dir, actual_sha)
+        if os.path.exists(final_path):
+            # Already published under the commit we actually got
+            self._discard(staging)
+        else:
+            os.rename(staging, final_path)
+
+        if actual_sha != commit_sha:
+            with self._lock:
+                self._heads[github_link] = (actual_sha, time.time())
+
+        return CachedClone(
+            github_link=github_link,
+            commit_sha=actual_sha,
+            path=final_path,
+            mode=self.mode,
+            size_bytes=_directory_size(final_path),
+            pack_bytes=_pack_size(final_path),
+        )
+
+    def _touch_locked(self, key: tuple, entry: CachedClone):
+        entry.pins += 1
+        entry.last_used = time.time()
+        self._entries.move_to_end(key)
+        try:
+            os.utime(entry.path, None)
+        except OSError:
+            pass
+
+    def _evict_locked(self):
+        """Drop least-recently-used, unpinned clones until under the disk budget"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key in list(self._entries.keys()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.pins > 0:
+                continue
+            del self._entries[key]
+            self._total_bytes -= entry.size_bytes
+            logger.info("Evicting clone %s@%s (%d bytes)", entry.github_link, entry.commit_sha[:12], entry.size_bytes)
+            self._discard(entry.path)
+
+    def _discard(self, path: str):
+        """Move a directory out of the way and delete it in the background"""
+        trash_path = os.path.join(self._trash, uuid.uuid4().hex)
+        try:
+            os.rename(path, trash_path)
+        except OSError:
+            trash_path = path
+        self._cleanup_queue.put(lambda: shutil.rmtree(trash_path, ignore_errors=True))
+
+    def _cleanup_worker(self):
+        # Leftovers from a previous process
+        for name in os.listdir(self._trash):
+            shutil.rmtree(os.path.join(self._trash, name), ignore_errors=True)
+        while True:
+            job = self._cleanup_queue.get()
+            try:
+                job()
+            except Exception as e:
+                logger.warning("Clone cache background job failed: %s", e)
+            self._cleanup_queue.task_done()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "clones": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+clone_cache = CloneCache()
@@ -0,0 +1,106 @@
+import os
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+
+INCREMENTAL_ANALYSIS_ENABLED = os.getenv("INCREMENTAL_ANALYSIS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bump when the manifest format changes, so cached manifests are rebuilt
+MANIFEST_VERSION = "1"
+
+
+def _under(path: str, module_path: str) -> bool:
+    return not module_path or path == module_path or path.startswith(module_path + '/')
+
+
+class CommitManifest:
+    """
+    Blob hash of every analyzed file of one commit.
+
+    A module's fingerprint hashes the (path, blob) pairs under it, so two
+    commits give a module the same fingerprint exactly when none of its
+    files were added, removed or changed.
+    """
+
+    def __init__(self, files: Dict[str, str]):
+        self.files = files
+        self._paths = sorted(files)
+        self._fingerprints: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, module_path: str) -> str:
+        module_path = module_path.strip('/')
+        with self._lock:
+            cached = self._fingerprints.get(module_path)
+        if cached is not None:
+            return cached
+        digest = hashlib.sha256()
+        for path in self._paths:
+            if _under(path, module_path):
+                digest.update(f"{path}\0{self.files[path]}\n".encode("utf-8"))
+        fingerprint = digest.hexdigest()
+        with self._lock:
+            self._fingerprints[module_path] = fingerprint
+        return fingerprint
+
+    def directories(self) -> Set[str]:
+        """Every directory that contains at least one analyzed file"""
+        directories = set()
+        for path in self._paths:
+            parts = path.split('/')[:-1]
+            for depth in range(1, len(parts) + 1):
+                directories.add('/'.join(parts[:depth]))
+        return directories
+
+    def to_dict(self) -> dict:
+        return {"files": self.files}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CommitManifest":
+        return cls(data["files"])
+
+
+@dataclass
+class CommitDiff:
+    """Files and directories that differ between two commits' manifests"""
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    directories_added: List[str] = field(default_factory=list)
+    directories_removed: List[str] = field(default_factory=list)
+
+    @property
+    def paths(self) -> List[str]:
+        return sorted(self.added + self.removed + self.changed)
+
+    @property
+    def layout_changed(self) -> bool:
+        """Whether directories appeared or disappeared, which can change the component layout"""
+        return bool(self.directories_added or self.directories_removed)
+
+    def touches(self, module_path: str) -> bool:
+        module_path = module_path.strip('/')
+        return any(_under(path, module_path) for path in self.paths)
+
+    def touched_modules(self, module_paths: List[str]) -> List[str]:
+        return [module_path for module_path in module_paths if self.touches(module_path)]
+
+    def describe(self) -> str:
+        return (f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed files; "
+                f"{len(self.directories_added)} new and {len(self.directories_removed)} removed directories")
+
+
+def diff_manifests(old: CommitManifest, new: CommitManifest) -> CommitDiff:
+    old_directories, new_directories = old.directories(), new.directories()
+    return CommitDiff(
+        added=sorted(path for path in new.files if path not in old.files),
+        removed=sorted(path for path in old.files if path not in new.files),
+        changed=sorted(path for path, sha in new.files.items() if path in old.files and old.files[path] != sha),
+        directories_added=sorted(new_directories - old_directories),
+        directories_removed=sorted(old_directories - new_directories),
+    )
+
+
+def build_manifest(files, read_blobs) -> CommitManifest:
+    """Manifest from the (path, blob sha) listing; no blob needs to be read"""
+    return CommitManifest(dict(files))
@@ -0,0 +1,47 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from service.metrics import STAGE_IN_FLIGHT
+from service.profiler import profiled
+
+# Maximum number of in-flight operations per pipeline stage
+STAGE_LIMITS = {
+    "clone": int(os.getenv("CLONE_CONCURRENCY", "4")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "16")),
+    "render": int(os.getenv("RENDER_CONCURRENCY", "4")),
+}
+
+# Blocking stages get their own thread pools, so a burst of clones cannot
+# starve graphviz renders (or the default executor) of threads
+_executors = {
+    "clone": ThreadPoolExecutor(max_workers=STAGE_LIMITS["clone"], thread_name_prefix="clone"),
+    "render": ThreadPoolExecutor(max_workers=STAGE_LIMITS["render"], thread_name_prefix="render"),
+}
+
+_semaphores = {}
+
+
+def stage_limit(stage: str) -> asyncio.Semaphore:
+    """Semaphore bounding concurrent work in one stage of the current event loop"""
+    loop = asyncio.get_running_loop()
+    key = (id(loop), stage)
+    semaphore = _semaphores.get(key)
+    if semaphore is None:
+        semaphore = _semaphores[key] = asyncio.Semaphore(STAGE_LIMITS[stage])
+    return semaphore
+
+
+async def run_in_stage(stage: str, func, *args, **kwargs):
+    """
+    Run a blocking function in the stage's executor without blocking the event loop.
+
+    Callers beyond the stage's concurrency limit wait on the semaphore rather
+    than piling up in the executor queue.
+    """
+    loop = asyncio.get_running_loop()
+    async with stage_limit(stage):
+        with STAGE_IN_FLIGHT.track_in_progress(stage=stage):
+            call = profiled(functools.partial(func, *args, **kwargs), f"thread {stage}")
+            return await loop.run_in_executor(_executors[stage], call)
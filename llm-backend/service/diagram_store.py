@@ -0,0 +1,67 @@
+import os
+import re
+import hashlib
+import tempfile
+from typing import Optional
+
+from service.analysis_cache import AnalysisCache
+
+DIAGRAM_STORE_DIR = os.getenv("DIAGRAM_STORE_DIR", os.path.join(tempfile.gettempdir(), "llm-code-arch-diagrams"))
+DIAGRAM_STORE_TTL_SECONDS = float(os.getenv("DIAGRAM_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+DIAGRAM_STORE_MEMORY_ENTRIES = int(os.getenv("DIAGRAM_STORE_MEMORY_ENTRIES", "128"))
+DIAGRAM_STORE_MAX_BYTES = int(os.getenv("DIAGRAM_STORE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def diagram_handle(svg: str) -> str:
+    """Content address of a rendered diagram"""
+    return hashlib.sha256(svg.encode("utf-8")).hexdigest()
+
+
+def is_valid_handle(handle: str) -> bool:
+    return bool(_HANDLE_PATTERN.match(handle or ""))
+
+
+class DiagramStore:
+    """
+    Rendered SVGs stored by content hash.
+
+    A handle always names the same bytes, so clients can reference diagrams
+    by handle and cache them forever. Storage reuses the analysis cache's
+    memory LRU over a disk directory.
+    """
+
+    def __init__(self, root: str = DIAGRAM_STORE_DIR, ttl_seconds: float = DIAGRAM_STORE_TTL_SECONDS,
+                 memory_entries: int = DIAGRAM_STORE_MEMORY_ENTRIES, max_bytes: int = DIAGRAM_STORE_MAX_BYTES):
+        self._cache = AnalysisCache(root=root, ttl_seconds=ttl_seconds, memory_entries=memory_entries, max_bytes=max_bytes)
+
+    def put(self, svg: str) -> str:
+        handle = diagram_handle(svg)
+        # Identical content is already stored under the same handle
+        if self._cache.get(handle) is None:
+            self._cache.put(handle, svg)
+        return handle
+
+    async def aput(self, svg: str) -> str:
+        """`put` for coroutines, without blocking the event loop on disk I/O"""
+        handle = diagram_handle(svg)
+        if await self._cache.aget(handle) is None:
+            await self._cache.aput(handle, svg)
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        if not is_valid_handle(handle):
+            return None
+        return self._cache.get(handle)
+
+    async def aget(self, handle: str) -> Optional[str]:
+        if not is_valid_handle(handle):
+            return None
+        return await self._cache.aget(handle)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+diagram_store = DiagramStore()
@@ -1,84 +1,130 @@
 import os
-import tempfile
 import git
 from pathlib import Path
+from service.clone_cache import clone_cache
+from service.tree_walker import TreeWalker, FileSystemSource, GitTreeSource
+from service.repo_tree import RepoTree
+from service.import_graph import ImportGraph, build_import_graph, IMPORT_GRAPH_ENABLED, PARSER_VERSION
+from service.symbol_index import SymbolIndex, build_symbol_index, SYMBOL_INDEX_ENABLED, EXTRACTOR_VERSION
+from service.commit_diff import CommitManifest, build_manifest, INCREMENTAL_ANALYSIS_ENABLED, MANIFEST_VERSION
+from service.analysis_cache import analysis_cache, analysis_key
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import subprocess
+import threading
+from service.log import get_logger
+from service.metrics import timed
 
-def get_project_structure(github_link: str) -> str:
+logger = get_logger(__name__)
+
+# Trees of recently analyzed commits; a commit's tree never changes
+TREE_CACHE_SIZE = int(os.getenv("TREE_CACHE_SIZE", "32"))
+_tree_cache: "OrderedDict[tuple, RepoTree]" = OrderedDict()
+_tree_cache_lock = threading.Lock()
+_tree_cache_lookups = {"hits": 0, "misses": 0}
+# Import graphs, symbol indexes and manifests by (kind, commit)
+_artifact_cache: "OrderedDict[tuple, object]" = OrderedDict()
+
+def tree_cache_stats() -> dict:
+    with _tree_cache_lock:
+        return {"trees": len(_tree_cache), **_tree_cache_lookups}
+
+def clear_tree_cache():
+    """Forget built trees and per-commit artifacts; the clones stay cached"""
+    with _tree_cache_lock:
+        _tree_cache.clear()
+        _artifact_cache.clear()
+
+def _describe_clone_error(github_link: str, e: git.exc.GitCommandError) -> str:
+    """Turn a git failure into the error string returned to callers"""
+    error_message = str(e)
+    if "not found" in error_message.lower() or "404" in error_message:
+        logger.warning("Repository does not exist or is not accessible: %s", github_link)
+        return f"[Error: Repository not found or not accessible: {github_link}]"
+    elif "authentication" in error_message.lower():
+        logger.warning("Unable to access private repository: %s", github_link)
+        return f"[Error: Repository is private and requires authentication: {github_link}]"
+    else:
+        logger.error("Error cloning repository: %s", error_message)
+        return f"[Error cloning repository]: {error_message}"
+
+def get_repository_tree(github_link: str, on_cloned: Optional[Callable[[str], None]] = None) -> RepoTree:
     """
-    Clone a GitHub repository and return its directory structure as a string.
+    Build the directory tree of a GitHub repository's current HEAD.
+    
+    The repository is served from the clone cache, so only the first request
+    for a given commit pays for a network clone, and the tree of a commit is
+    built only once.
     
     Args:
         github_link: URL of the GitHub repository
+        on_cloned: Optional callback receiving the commit SHA once the clone is available
         
     Returns:
-        String representation of the project structure
+        RepoTree of the project; on failure its `error` holds the error message
     """
     try:
-        print(f"Attempting to clone repository: {github_link}")
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Clone the repository
-            try:
-                git.Repo.clone_from(github_link, tmpdir, depth=1)
-            except git.exc.GitCommandError as e:
-                error_message = str(e)
-                if "not found" in error_message.lower() or "404" in error_message:
-                    print(f"Repository does not exist or is not accessible: {github_link}")
-                    return f"[Error: Repository not found or not accessible: {github_link}]"
-                elif "authentication" in error_message.lower():
-                    print(f"Unable to access private repository: {github_link}")
-                    return f"[Error: Repository is private and requires authentication: {github_link}]"
-                else:
-                    print(f"Error cloning repository: {error_message}")
-                    return f"[Error cloning repository]: {error_message}"
+        logger.debug("Resolving repository %s", github_link)
+        with clone_cache.acquire(github_link) as clone:
+            if on_cloned:
+                on_cloned(clone.commit_sha)
+            cache_key = (github_link, clone.commit_sha)
+            with _tree_cache_lock:
+                tree = _tree_cache.get(cache_key)
+                if tree is not None:
+                    _tree_cache.move_to_end(cache_key)
+                    _tree_cache_lookups["hits"] += 1
+                    return tree
+                _tree_cache_lookups["misses"] += 1
             
-            # Generate directory structure
-            structure = []
-            root_path = Path(tmpdir)
+            repo = None
+            if clone.mode == "blobless":
+                repo = git.Repo(clone.path)
+                source = GitTreeSource(repo.commit(clone.commit_sha).tree)
+            else:
+                source = FileSystemSource(clone.path)
+            walker = TreeWalker(source)
             
-            # Directories/files to ignore
-            ignore_patterns = [
-                '.git', '__pycache__', 'node_modules', '.vscode', '.idea',
-                '.DS_Store', '.env', 'venv', 'env', '.pytest_cache'
-            ]
+            # Build the tree; ignored directories are never descended into
+            try:
+                with timed("tree_walk"):
+                    tree = RepoTree.from_walk(walker.walk(), github_link, clone.commit_sha)
+            finally:
+                if repo is not None:
+                    repo.close()
             
-            def should_ignore(path):
-                for pattern in ignore_patterns:
-                    if pattern in path.parts:
-                        return True
-                return False
+            if walker.truncated:
+                logger.info("Project structure truncated after %d entries: %s", walker.emitted, github_link)
+                tree.truncated = True
             
-            # Generate tree structure
-            for path in sorted(root_path.glob('**/*')):
-                if should_ignore(path):
-                    continue
-                
-                # Get relative path from the root
-                rel_path = path.relative_to(root_path)
-                depth = len(rel_path.parts) - 1
-                
-                # Format the entry
-                prefix = '    ' * depth
-                name = rel_path.parts[-1]
-                
-                if path.is_dir():
-                    structure.append(f"{prefix}{name}/")
-                else:
-                    structure.append(f"{prefix}{name}")
+            if tree.is_empty:
+                logger.info("Repository is empty or has no valid files: %s", github_link)
+                tree.notice = f"[Warning: Repository appears to be empty: {github_link}]"
             
-            if not structure:
-                print(f"Repository is empty or has no valid files: {github_link}")
-                return f"[Warning: Repository appears to be empty: {github_link}]"
-                
-            return '\n'.join(structure)
+            with _tree_cache_lock:
+                _tree_cache[cache_key] = tree
+                while len(_tree_cache) > TREE_CACHE_SIZE:
+                    _tree_cache.popitem(last=False)
+            return tree
             
     except git.exc.GitCommandError as e:
-        error_msg = f"[Error cloning repository]: {str(e)}"
-        print(error_msg)
-        return error_msg
+        return RepoTree.from_error(_describe_clone_error(github_link, e), github_link)
     except Exception as e:
         error_msg = f"[Error analyzing repository]: {str(e)}"
-        print(error_msg)
-        return error_msg
+        logger.error(error_msg)
+        return RepoTree.from_error(error_msg, github_link)
+
+def get_project_structure(github_link: str) -> str:
+    """
+    Clone a GitHub repository and return its directory structure as a string.
+    
+    Args:
+        github_link: URL of the GitHub repository
+        
+    Returns:
+        String representation of the project structure
+    """
+    return get_repository_tree(github_link).render()
 
 def get_file_content(github_link: str, file_path: str) -> str:
     """
@@ -92,12 +138,15 @@ def get_file_content(github_link: str, file_path: str) -> str:
         Content of the file as a string
     """
     try:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Clone the repository
-            git.Repo.clone_from(github_link, tmpdir, depth=1)
+        with clone_cache.acquire(github_link) as clone:
+            if clone.mode == "blobless":
+                return _read_blob(clone, file_path)
             
-            # Read the file
-            full_path = os.path.join(tmpdir, file_path)
+            # Read the file, refusing paths that escape the clone
+            root_path = os.path.realpath(clone.path)
+            full_path = os.path.realpath(os.path.join(root_path, file_path))
+            if not full_path.startswith(root_path + os.sep):
+                return f"[Error]: File {file_path} not found in repository"
             if os.path.exists(full_path) and os.path.isfile(full_path):
                 with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
                     return f.read()
@@ -106,3 +155,194 @@ def get_file_content(github_link: str, file_path: str) -> str:
             
     except Exception as e:
         return f"[Error reading file]: {str(e)}"
+
+def _read_blob(clone, file_path: str) -> str:
+    """
+    Read a file from a blobless clone.
+    
+    Only this one blob is fetched from the remote, the first time it is asked for.
+    """
+    rel_path = file_path.strip().lstrip('/')
+    if not rel_path or '..' in Path(rel_path).parts:
+        return f"[Error]: File {file_path} not found in repository"
+    
+    repo = git.Repo(clone.path)
+    try:
+        try:
+            item = repo.commit(clone.commit_sha).tree / rel_path
+        except KeyError:
+            return f"[Error]: File {file_path} not found in repository"
+        if item.type != 'blob':
+            return f"[Error]: File {file_path} not found in repository"
+        data = repo.git.cat_file('blob', item.hexsha, stdout_as_string=False, strip_newline_in_stdout=False)
+        return data.decode('utf-8', errors='replace')
+    finally:
+        repo.close()
+
+def get_import_graph(project_tree: RepoTree) -> Optional[ImportGraph]:
+    """
+    Static import graph of the commit a tree was built from.
+    
+    Only source files listed in the tree are analyzed, so the walker's ignore
+    rules apply. Graphs are cached per commit in memory and in the analysis
+    cache; parsed imports are cached per blob, so a new commit only parses
+    the files that changed.
+    
+    Args:
+        project_tree: Tree returned by `get_repository_tree`
+        
+    Returns:
+        ImportGraph, or None if the tree has no commit or the analysis is disabled
+    """
+    if not IMPORT_GRAPH_ENABLED:
+        return None
+    return _commit_artifact(project_tree, "import-graph", PARSER_VERSION, _import_graph_of, ImportGraph)
+
+def get_symbol_index(project_tree: RepoTree) -> Optional[SymbolIndex]:
+    """
+    Symbol index (classes, functions and their usages) of the commit a tree was built from.
+    
+    Cached and persisted per commit like the import graph, with symbols
+    extracted per blob so unchanged files are never parsed twice.
+    
+    Args:
+        project_tree: Tree returned by `get_repository_tree`
+        
+    Returns:
+        SymbolIndex, or None if the tree has no commit or indexing is disabled
+    """
+    if not SYMBOL_INDEX_ENABLED:
+        return None
+    return _commit_artifact(project_tree, "symbol-index", EXTRACTOR_VERSION, build_symbol_index, SymbolIndex)
+
+def get_commit_manifest(project_tree: RepoTree) -> Optional[CommitManifest]:
+    """
+    Blob hash of every file listed in a tree, for diffing it against other commits.
+    
+    Args:
+        project_tree: Tree returned by `get_repository_tree`
+        
+    Returns:
+        CommitManifest, or None if the tree has no commit or incremental analysis is disabled
+    """
+    if not INCREMENTAL_ANALYSIS_ENABLED:
+        return None
+    return _commit_artifact(project_tree, "manifest", MANIFEST_VERSION, build_manifest, CommitManifest)
+
+def load_commit_manifest(commit_sha: str) -> Optional[CommitManifest]:
+    """Manifest of a previously analyzed commit, if still cached; never clones"""
+    with _tree_cache_lock:
+        manifest = _artifact_cache.get(("manifest", commit_sha))
+    if manifest is not None:
+        return manifest
+    cached_manifest = analysis_cache.get(analysis_key("manifest", MANIFEST_VERSION, commit_sha))
+    return CommitManifest.from_dict(cached_manifest) if cached_manifest is not None else None
+
+def _commit_artifact(project_tree: RepoTree, kind: str, version: str, build, artifact_type):
+    """Memory- and disk-cached result of `build(files, read_blobs)` for the tree's commit"""
+    commit_sha = project_tree.commit_sha
+    if not commit_sha or project_tree.error:
+        return None
+    
+    memory_key = (kind, commit_sha)
+    with _tree_cache_lock:
+        artifact = _artifact_cache.get(memory_key)
+        if artifact is not None:
+            _artifact_cache.move_to_end(memory_key)
+            return artifact
+    cache_key = analysis_key(kind, version, commit_sha)
+    cached_artifact = analysis_cache.get(cache_key)
+    if cached_artifact is not None:
+        artifact = artifact_type.from_dict(cached_artifact)
+    else:
+        try:
+            with timed(kind):
+                artifact = _analyze_sources(project_tree, build)
+        except Exception as e:
+            logger.warning("Building the %s failed for %s: %s", kind, project_tree.github_link, e)
+            return None
+        analysis_cache.put(cache_key, artifact.to_dict())
+    
+    with _tree_cache_lock:
+        _artifact_cache[memory_key] = artifact
+        while len(_artifact_cache) > 2 * TREE_CACHE_SIZE:
+            _artifact_cache.popitem(last=False)
+    return artifact
+
+def _analyze_sources(project_tree: RepoTree, analyze):
+    """
+    Call `analyze(files, read_blobs)` with the (path, blob sha) of every file
+    listed in the tree, while the clone is pinned.
+    """
+    with clone_cache.acquire(project_tree.github_link) as clone:
+        repo = git.Repo(clone.path)
+        try:
+            # -z keeps unusual file names unquoted
+            listing = repo.git.ls_tree('-r', '-z', '--full-tree', project_tree.commit_sha)
+            files = []
+            for record in listing.split('\0'):
+                if not record:
+                    continue
+                meta, path = record.split('\t', 1)
+                _, object_type, blob_sha = meta.split()
+                if object_type == 'blob' and path in project_tree.path_index:
+                    files.append((path, blob_sha))
+            
+            def read_blobs(shas: List[str]) -> Dict[str, bytes]:
+                if clone.mode == "blobless":
+                    _prefetch_blobs(repo, shas)
+                return _read_blobs(repo, shas)
+            
+            return analyze(files, read_blobs)
+        finally:
+            repo.close()
+
+def _import_graph_of(files, read_blobs) -> ImportGraph:
+    go_module = ""
+    go_mod_sha = dict(files).get('go.mod')
+    if go_mod_sha:
+        go_mod = read_blobs([go_mod_sha]).get(go_mod_sha, b"").decode('utf-8', errors='replace')
+        for line in go_mod.splitlines():
+            if line.startswith('module '):
+                go_module = line.split()[1]
+                break
+    graph = build_import_graph(files, read_blobs, go_module)
+    logger.info("Import graph: %d files, %d edges in %.2fs", graph.files_parsed, len(graph.edges), graph.elapsed)
+    return graph
+
+def _prefetch_blobs(repo: git.Repo, shas: List[str]):
+    """
+    Fetch many missing blobs of a blobless clone in one round trip.
+    
+    Without this, each blob would be fetched lazily by its own request.
+    """
+    if not shas:
+        return
+    subprocess.run(
+        ['git', '-c', 'fetch.negotiationAlgorithm=noop', 'fetch', 'origin',
+         '--no-tags', '--no-write-fetch-head', '--recurse-submodules=no', '--filter=blob:none', '--stdin'],
+        cwd=repo.working_dir, input="\n".join(shas).encode('ascii'),
+        capture_output=True, check=True,
+    )
+
+def _read_blobs(repo: git.Repo, shas: List[str]) -> Dict[str, bytes]:
+    """Read many blobs through a single `git cat-file --batch` process"""
+    if not shas:
+        return {}
+    completed = subprocess.run(
+        ['git', 'cat-file', '--batch'], cwd=repo.working_dir,
+        input="\n".join(shas).encode('ascii') + b"\n", capture_output=True, check=True,
+    )
+    output = completed.stdout
+    blobs = {}
+    offset = 0
+    while offset < len(output):
+        header_end = output.index(b"\n", offset)
+        header = output[offset:header_end].split()
+        offset = header_end + 1
+        if len(header) < 3 or header[1] == b"missing":
+            continue
+        size = int(header[2])
+        blobs[header[0].decode('ascii')] = output[offset:offset + size]
+        offset += size + 1  # content is followed by a newline
+    return blobs
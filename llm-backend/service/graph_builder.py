@@ -1,24 +1,76 @@
 import graphviz
 import os
+import asyncio
 import re
 import json
-from anthropic import Anthropic
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from dotenv import load_dotenv
+from pydantic import ValidationError
+from schema import OverviewAnalysis
+from service.repo_tree import RepoTree
+from service.structure_renderer import render_structure
+from service.analysis_cache import analysis_cache, analysis_key
+from service.concurrency import run_in_stage
+from service.llm_gateway import llm_gateway
+from service.llm_client import build_claude_request
+from service.github_analyzer import get_import_graph, get_symbol_index, get_commit_manifest, load_commit_manifest
+from service.commit_diff import CommitManifest, diff_manifests
+from service.symbol_index import MODULE_DIAGRAM_MODE
+from service.import_graph import ImportGraph
+from service.svg_renderer import svg_renderer
+from service.log import get_logger
+from service.metrics import timed
+
+logger = get_logger(__name__)
 
 load_dotenv()
-anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-def generate_architecture_svg(github_link: str, project_structure: str, make_clickable: bool = False) -> str:
+COMPONENT_MODEL = "claude-3-haiku-20240307"
+# Bump when a prompt changes, so cached analyses from the old prompt are not reused
+PROJECT_PROMPT_VERSION = "1"
+MODULE_PROMPT_VERSION = "1"
+OVERVIEW_PROMPT_VERSION = "1"
+# Files listed per changed component when its description is refreshed
+REFRESH_MAX_FILES = 150
+# Initial overviews get their narrative and components from one LLM call instead of two
+COMBINED_ANALYSIS = os.getenv("COMBINED_ANALYSIS", "false").lower() in ("1", "true", "yes")
+OVERVIEW_TOOL = "record_architecture"
+
+COMPONENT_RULES = """Important rules:
+1. Focus on major architectural components, not individual files
+2. Group related files and directories into logical components
+3. Keep component names concise but descriptive
+4. Identify clear dependencies between components
+5. Limit to 5-8 core components for better diagram readability
+6. Ensure all dependency names match exactly with component names
+7. If you're not confident about a relationship, don't include it
+"""
+
+async def generate_architecture_svg(github_link: str, project_structure: Union[RepoTree, str], make_clickable: bool = False,
+                                    on_components: Optional[Callable[[List[Dict]], None]] = None,
+                                    precomputed_components: Optional[List[Dict]] = None) -> str:
     """
     Generate architecture SVG based on project structure
+    
+    `on_components`, if given, is called with the component list as soon as
+    the analysis is done, before the (slower) render. `precomputed_components`,
+    if given, were already analyzed (see `analyze_overview_with_llm`) and replace the
+    component LLM call.
     """
     try:
-        print(f"Generating SVG for {github_link}")
-        print(f"Project structure size: {len(project_structure)} characters")
+        project_tree = RepoTree.coerce(project_structure, github_link)
+        logger.debug("Generating overview SVG for %s (%d tree entries)", github_link, len(project_tree))
+        
+        # Real dependencies from static imports; feeds the LLM and the fallback diagram
+        import_graph = await run_in_stage("clone", get_import_graph, project_tree)
         
         # Use LLM to filter and analyze important components
-        filtered_components = analyze_project_with_llm(github_link, project_structure)
+        if precomputed_components is not None:
+            filtered_components = precomputed_components
+        else:
+            filtered_components = await analyze_project_with_llm(github_link, project_tree, import_graph)
+        if on_components:
+            on_components(filtered_components)
         
         dot = graphviz.Digraph()
         # Use LR (left to right) for better wide diagram handling
@@ -28,9 +80,12 @@ def generate_architecture_svg(github_link: str, project_structure: str, make_cli
         repo_name = github_link.split("/")[-1].replace(".git", "")
         dot.attr(label=f"Architecture of {repo_name}", fontsize="20")
         
+        # Directory components of the structure fallback, also listed by the default SVG
+        structure_components = {}
         if filtered_components:
             # Use the LLM-filtered components
-            print(f"Using {len(filtered_components)} components identified by LLM")
+            logger.debug("Using %d components identified by LLM", len(filtered_components))
+            node_count = len(filtered_components)
             
             # Add nodes for each major component
             for component in filtered_components:
@@ -56,14 +111,20 @@ def generate_architecture_svg(github_link: str, project_structure: str, make_cli
                 for dependency in component.get('dependencies', []):
                     dot.edge(component['name'], dependency, 
                              label=component.get('dependency_details', {}).get(dependency, ''))
+        elif import_graph and not import_graph.is_empty():
+            # Fallback to the static import graph if LLM analysis fails
+            logger.info("Falling back to the import graph (%d components)", len(import_graph.components))
+            add_import_graph(dot, import_graph)
+            node_count = len(import_graph.components)
         else:
             # Fallback to traditional parsing if LLM analysis fails
-            print("Falling back to traditional project structure parsing")
-            components = parse_project_structure(project_structure)
-            print(f"Parsed {len(components)} components from project structure")
+            logger.info("Falling back to traditional project structure parsing")
+            structure_components = parse_project_structure(project_tree)
+            node_count = len(structure_components)
+            logger.debug("Parsed %d components from project structure", node_count)
             
             # Add nodes for each major component
-            for component, details in components.items():
+            for component, details in structure_components.items():
                 if component == "root":
                     continue
                 
@@ -73,37 +134,56 @@ def generate_architecture_svg(github_link: str, project_structure: str, make_cli
                 
                 # Add edges for dependencies
                 for dependency in details.get('dependencies', []):
-                    if dependency in components and dependency != component:
+                    if dependency in structure_components and dependency != component:
                         dot.edge(component, dependency)
             
             # Add relationships based on imports and references
-            add_relationships(dot, components)
+            add_relationships(dot, structure_components)
         
-        # Ensure the result is a valid SVG
-        svg_result = dot.pipe(format='svg').decode("utf-8")
-        print(f"Generated SVG of length: {len(svg_result)}")
+        svg_result = await svg_renderer.render(dot.source, node_count)
         
         # Validate basic SVG format
         if not svg_result.startswith('<svg') and not '<!DOCTYPE svg' in svg_result:
-            print("Warning: Generated SVG doesn't have expected format")
+            logger.warning("Generated SVG doesn't have expected format")
             # If graphviz output is not a valid SVG, return a simple default SVG
-            return create_default_svg(github_link, components if 'components' in locals() else {})
+            return create_default_svg(github_link, structure_components)
             
         return svg_result
     except Exception as e:
-        print(f"Error in generate_architecture_svg: {str(e)}")
+        logger.error("Error in generate_architecture_svg: %s", e)
         # Return a simple error SVG instead of throwing an exception
         return create_error_svg(github_link, str(e))
 
-def generate_module_architecture_svg(github_link: str, project_structure: str, module_name: str) -> str:
+async def generate_module_architecture_svg(github_link: str, project_structure: Union[RepoTree, str], module_name: str,
+                                           on_components: Optional[Callable[[List[Dict]], None]] = None) -> str:
     """
     Generate architecture SVG for a specific module
     """
     try:
-        print(f"Generating module SVG for {module_name} in {github_link}")
+        project_tree = RepoTree.coerce(project_structure, github_link)
+        logger.debug("Generating module SVG for %s in %s", module_name, github_link)
         
-        # Use LLM to analyze the specific module
-        module_components = analyze_module_with_llm(github_link, project_structure, module_name)
+        # The module's real classes and functions, from the symbol index
+        symbol_index = await run_in_stage("clone", get_symbol_index, project_tree)
+        module_index = project_tree.find_module(module_name)
+        symbol_components, symbols_text = [], ""
+        if symbol_index and module_index is not None:
+            module_path = project_tree.paths[module_index]
+            symbol_components = symbol_index.module_components(module_path)
+            symbols_text = symbol_index.describe(module_path)
+        
+        if MODULE_DIAGRAM_MODE == "symbols" and symbol_components:
+            # Deterministic diagram, no LLM call
+            logger.debug("Using %d indexed symbols for module %s", len(symbol_components), module_name)
+            module_components = symbol_components
+        else:
+            # Use LLM to analyze the specific module
+            module_components = await analyze_module_with_llm(github_link, project_tree, module_name, symbols_text)
+            if not module_components and symbol_components:
+                logger.info("No LLM analysis available, using indexed symbols for %s", module_name)
+                module_components = symbol_components
+        if on_components:
+            on_components(module_components)
         
         dot = graphviz.Digraph()
         dot.attr(rankdir="TB")  # Top to bottom for module details
@@ -113,7 +193,7 @@ def generate_module_architecture_svg(github_link: str, project_structure: str, m
         dot.attr(label=f"Module: {module_name} - {repo_name}", fontsize="20")
         
         if module_components:
-            print(f"Using {len(module_components)} components for module {module_name}")
+            logger.debug("Using %d components for module %s", len(module_components), module_name)
             
             # Add nodes for each component in the module
             for component in module_components:
@@ -130,8 +210,8 @@ def generate_module_architecture_svg(github_link: str, project_structure: str, m
                              label=component.get('dependency_details', {}).get(dependency, ''))
         else:
             # Fallback: show files in the module
-            print(f"No LLM analysis available, showing file structure for {module_name}")
-            files_in_module = extract_module_files(project_structure, module_name)
+            logger.info("No LLM analysis available, showing file structure for %s", module_name)
+            files_in_module = extract_module_files(project_tree, module_name)
             
             if files_in_module:
                 for i, file_name in enumerate(files_in_module[:10]):  # Limit to 10 files
@@ -141,25 +221,43 @@ def generate_module_architecture_svg(github_link: str, project_structure: str, m
                 dot.node("no_files", f"No files found in {module_name}", shape="box", style="filled", fillcolor="lightcoral")
         
         # Generate SVG
-        svg_result = dot.pipe(format='svg').decode("utf-8")
-        print(f"Generated module SVG of length: {len(svg_result)}")
+        svg_result = await svg_renderer.render(dot.source, len(module_components) or 10)
         
         return svg_result
         
     except Exception as e:
-        print(f"Error in generate_module_architecture_svg: {str(e)}")
+        logger.error("Error in generate_module_architecture_svg: %s", e)
         return create_error_svg(github_link, f"Failed to generate module diagram for {module_name}: {str(e)}")
 
-def analyze_module_with_llm(github_link: str, project_structure: str, module_name: str) -> List[Dict]:
+async def analyze_module_with_llm(github_link: str, project_structure: Union[RepoTree, str], module_name: str,
+                                  symbols_text: str = "") -> List[Dict]:
     """
     Use LLM to analyze a specific module and identify its internal components
+    
+    `symbols_text`, from the symbol index, lists the module's actual classes
+    and functions so the analysis is not guessed from file names.
     """
     try:
-        if not project_structure or project_structure.startswith("[Error"):
-            print(f"Project structure unavailable for module analysis of {module_name}")
+        project_tree = RepoTree.coerce(project_structure, github_link)
+        if project_tree.error or not project_tree.render():
+            logger.info("Project structure unavailable for module analysis of %s", module_name)
             return []
             
-        print(f"Analyzing module {module_name} with LLM...")
+        structure_text = render_structure(project_tree, focus=module_name).text
+        manifest = await run_in_stage("clone", get_commit_manifest, project_tree)
+        module_index = project_tree.find_module(module_name)
+        if manifest is not None and module_index is not None:
+            # Keyed by the module's files, so a module no commit touched keeps its analysis
+            module_fingerprint = manifest.fingerprint(project_tree.paths[module_index])
+            cache_key = analysis_key(COMPONENT_MODEL, MODULE_PROMPT_VERSION, f"module-files:{module_fingerprint}", module_name)
+        else:
+            cache_key = analysis_key(COMPONENT_MODEL, MODULE_PROMPT_VERSION, f"{structure_text}\n{symbols_text}", module_name)
+        cached_components = await analysis_cache.aget(cache_key)
+        if cached_components is not None:
+            logger.debug("Using cached analysis for module %s", module_name)
+            return cached_components
+        
+        logger.debug("Analyzing module %s with LLM", module_name)
         
         system_prompt = f"""You are analyzing a specific module "{module_name}" within a GitHub repository.
 Your task is to identify the internal components and their relationships within this module only.
@@ -187,18 +285,26 @@ Important rules:
 6. Ensure all dependency names match exactly with component names
 """
         
+        symbols_section = ""
+        if symbols_text:
+            symbols_section = f"""
+Classes and functions defined in the module (file:line kind name):
+```
+{symbols_text}
+```
+"""
         user_message = f"""Analyze the "{module_name}" module in this GitHub repository: {github_link}
 
 Project structure:
 ```
-{project_structure}
+{structure_text}
 ```
-
+{symbols_section}
 Focus specifically on the {module_name} module and identify its internal architecture, subcomponents, and relationships.
 Return ONLY JSON without any additional text."""
 
-        response = anthropic.messages.create(
-            model="claude-3-haiku-20240307",
+        response = await llm_gateway.create(
+            model=COMPONENT_MODEL,
             system=system_prompt,
             messages=[{"role": "user", "content": user_message}],
             max_tokens=2000,
@@ -217,54 +323,39 @@ Return ONLY JSON without any additional text."""
             
         # Parse the JSON response
         try:
-            components = json.loads(json_str)
-            print(f"Successfully parsed {len(components)} components for module {module_name}")
+            with timed("json_parse"):
+                components = json.loads(json_str)
+            logger.debug("Parsed %d components for module %s", len(components), module_name)
+            if components:
+                await analysis_cache.aput(cache_key, components)
             return components
         except json.JSONDecodeError as e:
-            print(f"Failed to parse module LLM response as JSON: {e}")
+            logger.warning("Failed to parse module LLM response as JSON: %s", e)
             return []
             
     except Exception as e:
-        print(f"Error in analyze_module_with_llm: {str(e)}")
+        logger.error("Error in analyze_module_with_llm: %s", e)
         return []
 
-def extract_module_files(project_structure: str, module_name: str) -> List[str]:
+def extract_module_files(project_structure: Union[RepoTree, str], module_name: str) -> List[str]:
     """
     Extract files that belong to a specific module from project structure
     """
-    files = []
-    lines = project_structure.split("\n")
-    in_module = False
-    current_indent = 0
-    
-    for line in lines:
-        if not line.strip():
-            continue
-            
-        line_indent = len(line) - len(line.lstrip())
-        line_content = line.strip()
-        
-        # Check if we're entering the module directory
-        if module_name.lower() in line_content.lower() and line_content.endswith('/'):
-            in_module = True
-            current_indent = line_indent
-            continue
-            
-        # Check if we're leaving the module directory
-        if in_module and line_indent <= current_indent and not line_content.endswith('/'):
-            in_module = False
-            continue
-            
-        # If we're in the module, collect files
-        if in_module and not line_content.endswith('/'):
-            files.append(line_content)
+    project_tree = RepoTree.coerce(project_structure)
+    module_index = project_tree.find_module(module_name)
+    if module_index is None:
+        return []
     
-    return files
+    return [project_tree.relative_path(i, module_index) for i in project_tree.files_under(module_index)]
 
-def analyze_project_with_llm(github_link: str, project_structure: str) -> List[Dict]:
+async def analyze_project_with_llm(github_link: str, project_structure: Union[RepoTree, str],
+                                   import_graph: Optional[ImportGraph] = None) -> List[Dict]:
     """
     Use LLM to analyze project structure and identify important components.
     
+    When an import graph is given, its directory-level edges are included in
+    the prompt so dependencies come from the code rather than from file names.
+    
     Returns a list of component dictionaries with:
     - name: Component name
     - description: Brief description of the component's purpose
@@ -273,11 +364,29 @@ def analyze_project_with_llm(github_link: str, project_structure: str) -> List[D
     """
     try:
         # Skip for empty project structures or error messages
-        if not project_structure or project_structure.startswith("[Error"):
-            print("Project structure is empty or contains errors - skipping LLM analysis")
+        project_tree = RepoTree.coerce(project_structure, github_link)
+        if project_tree.error or not project_tree.render():
+            logger.info("Project structure is empty or contains errors - skipping LLM analysis")
             return []
             
-        print("Analyzing project structure with LLM...")
+        structure_text = render_structure(project_tree).text
+        dependency_text = import_graph.describe() if import_graph and not import_graph.is_empty() else ""
+        cache_key = analysis_key(COMPONENT_MODEL, PROJECT_PROMPT_VERSION, f"{structure_text}\n{dependency_text}")
+        manifest = await run_in_stage("clone", get_commit_manifest, project_tree)
+        cached_components = await analysis_cache.aget(cache_key)
+        if cached_components is not None:
+            logger.debug("Using cached project analysis")
+            await remember_overview(github_link, project_tree, import_graph, cached_components)
+            return cached_components
+        
+        # A new commit that kept the component layout keeps the previous overview
+        previous_components = await reusable_overview(github_link, project_tree, manifest, import_graph)
+        if previous_components is not None:
+            await analysis_cache.aput(cache_key, previous_components)
+            await remember_overview(github_link, project_tree, import_graph, previous_components)
+            return previous_components
+        
+        logger.debug("Analyzing project structure with LLM")
         
         system_prompt = """You are an expert software architect analyzing a GitHub repository.
 Your task is to identify the main architectural components and their relationships.
@@ -297,29 +406,22 @@ The output must be valid JSON in this format:
   }
 ]
 
-Important rules:
-1. Focus on major architectural components, not individual files
-2. Group related files and directories into logical components
-3. Keep component names concise but descriptive
-4. Identify clear dependencies between components
-5. Limit to 5-8 core components for better diagram readability
-6. Ensure all dependency names match exactly with component names
-7. If you're not confident about a relationship, don't include it
-"""
+""" + COMPONENT_RULES
         
         repo_name = github_link.split("/")[-1].replace(".git", "")
+        dependency_section = _dependency_section(dependency_text)
         user_message = f"""Analyze this GitHub repository: {github_link}
 
 Project structure:
 ```
-{project_structure}
+{structure_text}
 ```
-
+{dependency_section}
 Identify the 5-8 most important architectural components and their relationships.
 Return ONLY JSON without any additional text."""
 
-        response = anthropic.messages.create(
-            model="claude-3-haiku-20240307",
+        response = await llm_gateway.create(
+            model=COMPONENT_MODEL,
             system=system_prompt,
             messages=[{"role": "user", "content": user_message}],
             max_tokens=2000,
@@ -338,18 +440,242 @@ Return ONLY JSON without any additional text."""
             
         # Parse the JSON response
         try:
-            components = json.loads(json_str)
-            print(f"Successfully parsed {len(components)} components from LLM")
+            with timed("json_parse"):
+                components = json.loads(json_str)
+            logger.debug("Parsed %d components from LLM", len(components))
+            if components:
+                await analysis_cache.aput(cache_key, components)
+                await remember_overview(github_link, project_tree, import_graph, components)
             return components
         except json.JSONDecodeError as e:
-            print(f"Failed to parse LLM response as JSON: {e}")
-            print(f"Raw response: {response_text}")
+            logger.warning("Failed to parse LLM response as JSON: %s", e)
+            logger.debug("Raw response: %s", response_text)
             return []
             
     except Exception as e:
-        print(f"Error in analyze_project_with_llm: {str(e)}")
+        logger.error("Error in analyze_project_with_llm: %s", e)
         return []
 
+def _dependency_section(dependency_text: str) -> str:
+    if not dependency_text:
+        return ""
+    return f"""
+Directory dependencies found by static import analysis (importer -> imported):
+```
+{dependency_text}
+```
+Base component dependencies on these edges.
+"""
+
+def _inline_refs(schema: dict) -> dict:
+    """A pydantic JSON schema with its `$defs` references inlined, for tool input schemas"""
+    definitions = schema.pop("$defs", {})
+    
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(definitions[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(item) for item in node]
+        return node
+    
+    return resolve(schema)
+
+OVERVIEW_TOOL_SCHEMA = _inline_refs(OverviewAnalysis.model_json_schema())
+
+def _consistent_components(analysis: OverviewAnalysis) -> List[Dict]:
+    """Components as dictionaries, keeping only dependencies on components of the same analysis"""
+    components = []
+    for component in analysis.components:
+        if component.name in (c["name"] for c in components):
+            continue
+        components.append(component.model_dump())
+    names = {component["name"] for component in components}
+    for component in components:
+        component["dependencies"] = [d for d in component["dependencies"] if d in names and d != component["name"]]
+        component["dependency_details"] = {d: detail for d, detail in component["dependency_details"].items()
+                                           if d in component["dependencies"]}
+    return components
+
+async def analyze_overview_with_llm(github_link: str, project_structure: Union[RepoTree, str]) -> Tuple[str, Optional[List[Dict]]]:
+    """
+    Narrative overview and diagram components of a repository from a single LLM call.
+    
+    The narrative prompt of `analyze_with_claude` is extended with the
+    component rules of `analyze_project_with_llm`, and the model answers
+    through a forced tool call whose input is validated as
+    `OverviewAnalysis`. The structure is sent once instead of twice, and the
+    diagram and the narrative come from the same answer.
+    
+    Args:
+        github_link: Repository URL
+        project_structure: Repository tree, or a structure listing
+        
+    Returns:
+        Tuple of (narrative, components). Components are None if the tool
+        input did not validate; the caller then analyzes them separately.
+    """
+    project_tree = RepoTree.coerce(project_structure, github_link)
+    import_graph = await run_in_stage("clone", get_import_graph, project_tree)
+    dependency_text = import_graph.describe() if import_graph and not import_graph.is_empty() else ""
+    
+    request = build_claude_request([], github_link, project_tree)
+    request["system"] += f"""
+
+Also identify the main architectural components shown in the architecture diagram next to your analysis.
+For complex repositories with many files, focus only on the most important 5-8 core components.
+{_dependency_section(dependency_text)}
+{COMPONENT_RULES}
+Record your analysis (as `narrative`) and the components with the {OVERVIEW_TOOL} tool. The analysis must describe the same components."""
+    cache_key = analysis_key(request["model"], OVERVIEW_PROMPT_VERSION, request["system"])
+    cached = await analysis_cache.aget(cache_key)
+    if cached is not None:
+        logger.debug("Using cached combined overview")
+        await remember_overview(github_link, project_tree, import_graph, cached["components"])
+        return cached["text"], cached["components"]
+    
+    response = await llm_gateway.create(**dict(
+        request,
+        max_tokens=request["max_tokens"] + 2000,
+        tools=[{
+            "name": OVERVIEW_TOOL,
+            "description": "Record the written architecture analysis of the repository and the components of its diagram",
+            "input_schema": OVERVIEW_TOOL_SCHEMA,
+        }],
+        tool_choice={"type": "tool", "name": OVERVIEW_TOOL},
+    ))
+    
+    tool_input = next((block.input for block in response.content
+                       if getattr(block, "type", "") == "tool_use" and block.name == OVERVIEW_TOOL), None)
+    text = "".join(block.text for block in response.content if getattr(block, "type", "") == "text")
+    try:
+        with timed("json_parse"):
+            analysis = OverviewAnalysis.model_validate(tool_input)
+    except ValidationError as e:
+        logger.warning("Combined overview did not match the schema, analyzing components separately: %s", e)
+        narrative = tool_input.get("narrative") if isinstance(tool_input, dict) else None
+        return (narrative if isinstance(narrative, str) and narrative else text), None
+    
+    components = _consistent_components(analysis)
+    logger.debug("Combined overview: %d characters, %d components", len(analysis.narrative), len(components))
+    if components:
+        await analysis_cache.aput(cache_key, {"text": analysis.narrative, "components": components})
+        await remember_overview(github_link, project_tree, import_graph, components)
+    return analysis.narrative, components
+
+def _overview_record_key(github_link: str) -> str:
+    return analysis_key(COMPONENT_MODEL, PROJECT_PROMPT_VERSION, f"overview-commit:{github_link}")
+
+def _edge_list(import_graph: Optional[ImportGraph]) -> List[List[str]]:
+    return sorted([source, target] for source, target in import_graph.edges) if import_graph else []
+
+async def remember_overview(github_link: str, project_tree: RepoTree, import_graph: Optional[ImportGraph], components: List[Dict]):
+    """Record the repository's latest analyzed commit, to diff the next commit against"""
+    if project_tree.commit_sha and components:
+        await analysis_cache.aput(_overview_record_key(github_link), {
+            "commit_sha": project_tree.commit_sha,
+            "components": components,
+            "edges": _edge_list(import_graph),
+        })
+
+async def reusable_overview(github_link: str, project_tree: RepoTree, manifest: Optional[CommitManifest],
+                      import_graph: Optional[ImportGraph]) -> Optional[List[Dict]]:
+    """
+    The previous commit's overview components, if they still describe this commit.
+    
+    The commit is diffed against the repository's last analyzed commit. When
+    no directory appeared or disappeared and the directory-level import edges
+    are the same, the component layout and dependencies are kept, and only
+    the descriptions of components with changed files are refreshed, in one
+    small LLM call. Drill-downs of those modules are recomputed on their own,
+    since module analyses are keyed by their files' content.
+    """
+    record = await analysis_cache.aget(_overview_record_key(github_link))
+    if manifest is None or not record or record["commit_sha"] == project_tree.commit_sha:
+        return None
+    previous_manifest = await asyncio.get_running_loop().run_in_executor(None, load_commit_manifest, record["commit_sha"])
+    if previous_manifest is None:
+        return None
+    
+    diff = diff_manifests(previous_manifest, manifest)
+    if diff.layout_changed or record["edges"] != _edge_list(import_graph):
+        logger.info("Component layout changed since %s (%s), analyzing again", record["commit_sha"][:8], diff.describe())
+        return None
+    
+    modules = {}
+    for component in record["components"]:
+        index = project_tree.find_module(component["name"])
+        if index is not None:
+            modules[project_tree.paths[index]] = component["name"]
+    touched = [modules[path] for path in diff.touched_modules(list(modules))]
+    logger.info("Reusing the overview of %s (%s); components with changes: %s",
+                record["commit_sha"][:8], diff.describe(), ", ".join(touched) or "none")
+    if not touched:
+        return record["components"]
+    return await refresh_components(github_link, project_tree, record["components"], touched)
+
+async def refresh_components(github_link: str, project_tree: RepoTree, components: List[Dict],
+                             touched: List[str]) -> Optional[List[Dict]]:
+    """
+    Re-describe the `touched` components from their current files, keeping the rest as is.
+    
+    Names and dependencies are kept, since the layout is unchanged.
+    
+    Returns:
+        The updated components, or None if the refresh failed and the overview should be analyzed again
+    """
+    current = {component["name"]: component.get("description", "") for component in components if component["name"] in touched}
+    sections = []
+    for name in touched:
+        files = extract_module_files(project_tree, name)
+        listing = "\n".join(files[:REFRESH_MAX_FILES])
+        if len(files) > REFRESH_MAX_FILES:
+            listing += f"\n... and {len(files) - REFRESH_MAX_FILES} more files"
+        sections.append(f"Component: {name}\nCurrent description: {current.get(name, '')}\nFiles:\n```\n{listing}\n```")
+    
+    user_message = f"""Files changed in these architectural components of {github_link}:
+
+{chr(10).join(sections)}
+
+Update each component's description (1-2 lines) so it matches its current files.
+Keep descriptions that are still accurate. Return ONLY a JSON object mapping each component name to its description."""
+    try:
+        response = await llm_gateway.create(
+            model=COMPONENT_MODEL,
+            system="You are an expert software architect keeping the component descriptions of an architecture diagram up to date.",
+            messages=[{"role": "user", "content": user_message}],
+            max_tokens=200 + 100 * len(touched),
+            temperature=0.2
+        )
+        response_text = response.content[0].text
+        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
+        with timed("json_parse"):
+            descriptions = json.loads(json_match.group(1) if json_match else response_text)
+        if not isinstance(descriptions, dict):
+            raise ValueError("expected a JSON object")
+    except Exception as e:
+        logger.warning("Refreshing changed components failed (%s), analyzing again", e)
+        return None
+    
+    refreshed = []
+    for component in components:
+        description = descriptions.get(component["name"]) if component["name"] in current else None
+        refreshed.append(dict(component, description=description) if isinstance(description, str) and description else component)
+    return refreshed
+
+def summarize_components(module_name: str, components: List[Dict]) -> str:
+    """Describe a module's components in plain text, without another LLM call"""
+    if not components:
+        return f"Showing the file structure of the {module_name} module."
+    lines = [f"Key components of the {module_name} module:"]
+    for component in components:
+        line = f"- {component['name']}: {component.get('description', '')}"
+        if component.get('dependencies'):
+            line += f" (uses {', '.join(component['dependencies'])})"
+        lines.append(line)
+    return "\n".join(lines)
+
 def create_default_svg(github_link: str, components: dict) -> str:
     """Create a simple default SVG as a fallback option"""
     repo_name = github_link.split("/")[-1].replace(".git", "")
@@ -391,10 +717,11 @@ def create_error_svg(github_link: str, error_message: str) -> str:
 </svg>'''
     return svg
 
-def parse_project_structure(structure: str) -> dict:
+def parse_project_structure(structure: Union[RepoTree, str]) -> dict:
     """
-    Parse project structure string into components dictionary
+    Parse project structure into components dictionary
     """
+    project_tree = RepoTree.coerce(structure)
     components = {
         "root": {"files": [], "dependencies": []}
     }
@@ -410,35 +737,22 @@ def parse_project_structure(structure: str) -> dict:
         "docs": ["doc", "documentation", "readme", "wiki"]
     }
     
-    lines = structure.split("\n")
-    current_dir = "root"
-    dir_stack = []
-    indent_level = 0
+    # Component each directory's files belong to, by node index
+    component_of = {0: "root"}
     
-    for line in lines:
-        if not line.strip():
-            continue
-            
-        # Calculate current indent level
-        current_indent = len(line) - len(line.lstrip())
+    for index in project_tree.iter_subtree(0):
+        parent_component = component_of[project_tree.parents[index]]
+        name = project_tree.names[index]
         
-        # Handle directory changes based on indentation
-        if current_indent < indent_level:
-            # Going back up in the directory tree
-            levels_up = (indent_level - current_indent) // 4
-            for _ in range(levels_up):
-                if dir_stack:
-                    dir_stack.pop()
-            current_dir = dir_stack[-1] if dir_stack else "root"
-            indent_level = current_indent
-        
-        # Extract file or directory name
-        name = line.strip().rstrip('/')
-        
-        if line.strip().endswith('/'):
+        if project_tree.is_dir[index]:
             # This is a directory
             dir_name = name.lower()
             
+            # Skip node_modules, .git and other common non-essential directories
+            if dir_name in ["node_modules", ".git", "__pycache__", "venv", "env", ".vscode", ".idea"]:
+                component_of[index] = parent_component
+                continue
+            
             # Identify component type based on directory name
             component_type = None
             for ctype, keywords in patterns.items():
@@ -450,31 +764,37 @@ def parse_project_structure(structure: str) -> dict:
             if not component_type:
                 component_type = dir_name
                 
-            # Skip node_modules, .git and other common non-essential directories
-            if dir_name in ["node_modules", ".git", "__pycache__", "venv", "env", ".vscode", ".idea"]:
-                continue
-                
             # Add component if it doesn't exist
             if component_type not in components:
                 components[component_type] = {"files": [], "dependencies": []}
             
-            # Update directory tracking
-            current_dir = component_type
-            dir_stack.append(current_dir)
-            indent_level = current_indent
+            component_of[index] = component_type
         else:
             # This is a file
-            components[current_dir]["files"].append(name)
+            components[parent_component]["files"].append(name)
             
             # Add dependencies based on file type
             file_ext = os.path.splitext(name)[1].lower()
             if file_ext in ['.py', '.js', '.ts', '.java', '.go', '.rb']:
-                if "database" not in components[current_dir]["dependencies"] and any(db_term in name.lower() for db_term in ["db", "dao", "repository", "model"]):
-                    components[current_dir]["dependencies"].append("database")
+                if "database" not in components[parent_component]["dependencies"] and any(db_term in name.lower() for db_term in ["db", "dao", "repository", "model"]):
+                    components[parent_component]["dependencies"].append("database")
     
     # Clean up components with no files
     return {k: v for k, v in components.items() if v["files"] or k == "root"}
 
+def add_import_graph(dot, import_graph: ImportGraph, max_components: int = 12):
+    """
+    Add the largest components of an import graph and the edges between them
+    """
+    shown = sorted(import_graph.components, key=lambda name: -import_graph.components[name])[:max_components]
+    for name in shown:
+        dot.node(name, f"{name}\n({import_graph.components[name]} source files)",
+                 shape="box", style="rounded,filled", fillcolor="lightskyblue")
+    strongest = max(import_graph.edges.values(), default=1)
+    for (source, target), count in import_graph.edges.items():
+        if source in shown and target in shown:
+            dot.edge(source, target, label=str(count), penwidth=f"{1 + 3 * count / strongest:.1f}")
+
 def add_relationships(dot, components):
     """
     Add relationships between components based on common patterns
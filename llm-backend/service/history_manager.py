@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from schema import Message
+from service.structure_renderer import estimate_tokens
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+# Approximate input tokens spent on verbatim conversation turns
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+# When the budget is exceeded, older turns are folded until the verbatim
+# tail is at most this fraction of the budget. The slack means the summary
+# is refreshed every few turns rather than on every one.
+HISTORY_REFOLD_FRACTION = float(os.getenv("HISTORY_REFOLD_FRACTION", "0.5"))
+
+
+@dataclass
+class HistoryState:
+    """Rolling summary of the turns already folded out of a conversation"""
+    covered: int = 0  # number of leading messages the summary covers
+    prefix_digest: str = ""  # digest of those messages, to notice a rewritten history
+    summary: str = ""
+
+
+def messages_digest(messages: List[Message]) -> str:
+    payload = json.dumps([[msg.role, msg.content] for msg in messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def message_tokens(message: Message) -> int:
+    return estimate_tokens(message.content) + 4
+
+
+def choose_cut(history: List[Message], start: int, budget: int) -> int:
+    """
+    Index from which the messages after `start` are kept verbatim.
+
+    The tail fits in `budget` where possible, always keeps the last message,
+    and starts with a user turn as the Messages API requires.
+    """
+    cut = len(history)
+    used = 0
+    while cut > start and used + message_tokens(history[cut - 1]) <= budget:
+        cut -= 1
+        used += message_tokens(history[cut])
+    cut = min(cut, len(history) - 1)
+    # Start the tail on a user turn, preferably by dropping rather than adding messages
+    while cut < len(history) - 1 and history[cut].role != "user":
+        cut += 1
+    while cut > start and history[cut].role != "user":
+        cut -= 1
+    return max(cut, start)
+
+
+async def compact_history(history: List[Message], state: Optional[HistoryState],
+                          summarize: Callable[[str, List[Message]], Awaitable[str]],
+                          budget: int = HISTORY_TOKEN_BUDGET) -> Tuple[List[Message], str]:
+    """
+    Fit a conversation into the input-token budget.
+
+    Recent turns are kept verbatim; older turns are folded into a rolling
+    summary. The summary is extended incrementally: only turns that fell out
+    of the verbatim window since the last fold are sent to `summarize`,
+    together with the previous summary, and the result is kept in `state`
+    (one per analysis session).
+
+    Args:
+        history: The full conversation, oldest first
+        state: Rolling summary for this conversation, updated in place; None to fold statelessly
+        summarize: Coroutine taking (previous summary, messages to fold) and returning a new summary
+        budget: Approximate token budget for the verbatim turns
+
+    Returns:
+        Tuple of (messages to send verbatim, summary of everything before them)
+    """
+    state = state if state is not None else HistoryState()
+    if state.covered > len(history) or messages_digest(history[:state.covered]) != state.prefix_digest:
+        # The client sent a different conversation; start over
+        state.covered, state.prefix_digest, state.summary = 0, messages_digest([]), ""
+
+    pending = history[state.covered:]
+    if sum(message_tokens(msg) for msg in pending) <= budget:
+        return pending, state.summary
+
+    cut = choose_cut(history, state.covered, int(budget * HISTORY_REFOLD_FRACTION))
+    if cut > state.covered:
+        logger.info("Folding %d earlier messages into the conversation summary", cut - state.covered)
+        state.summary = await summarize(state.summary, history[state.covered:cut])
+        state.covered = cut
+        state.prefix_digest = messages_digest(history[:cut])
+    return history[state.covered:], state.summary
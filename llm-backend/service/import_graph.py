@@ -0,0 +1,444 @@
+import os
+import re
+import ast
+import time
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+IMPORT_GRAPH_ENABLED = os.getenv("IMPORT_GRAPH_ENABLED", "true").lower() in ("1", "true", "yes")
+IMPORT_GRAPH_MAX_FILES = int(os.getenv("IMPORT_GRAPH_MAX_FILES", "5000"))
+IMPORT_GRAPH_MAX_FILE_BYTES = int(os.getenv("IMPORT_GRAPH_MAX_FILE_BYTES", str(512 * 1024)))
+IMPORT_GRAPH_WORKERS = int(os.getenv("IMPORT_GRAPH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Below this many files, parsing inline is cheaper than shipping work to the pool
+IMPORT_GRAPH_POOL_THRESHOLD = int(os.getenv("IMPORT_GRAPH_POOL_THRESHOLD", "200"))
+IMPORT_CACHE_ENTRIES = int(os.getenv("IMPORT_CACHE_ENTRIES", "100000"))
+# Roughly how many directory components the graph is grouped into
+IMPORT_GRAPH_TARGET_COMPONENTS = int(os.getenv("IMPORT_GRAPH_TARGET_COMPONENTS", "10"))
+# Bump when a parser changes, so cached imports from the old parser are not reused
+PARSER_VERSION = "1"
+
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python',
+    '.js': 'js', '.jsx': 'js', '.mjs': 'js', '.cjs': 'js', '.ts': 'js', '.tsx': 'js',
+    '.go': 'go',
+    '.java': 'java',
+}
+
+_JS_IMPORT = re.compile(
+    r"""(?:\bimport\s+(?:[\w*{}\s,$]+\s+from\s+)?|\bexport\s+[\w*{}\s,$]*\s*from\s+|\brequire\s*\(\s*|\bimport\s*\(\s*)['"]([^'"\n]+)['"]"""
+)
+# Import statements, including parenthesized and backslash-continued ones
+_PY_IMPORT = re.compile(
+    r'^[ \t]*((?:from[ \t]+[\w.]+[ \t]+import[ \t]*\([^)]*\))|(?:(?:from[ \t]+[\w.]+[ \t]+)?import[ \t]+[^\n]*(?:\\\n[^\n]*)*))',
+    re.MULTILINE
+)
+_GO_IMPORT_BLOCK = re.compile(r'^\s*import\s*\(([^)]*)\)', re.MULTILINE)
+_GO_IMPORT_LINE = re.compile(r'^\s*import\s+(?:[\w.]+\s+)?"([^"]+)"', re.MULTILINE)
+_GO_QUOTED = re.compile(r'"([^"]+)"')
+_JAVA_PACKAGE = re.compile(r'^\s*package\s+([\w.]+)\s*;', re.MULTILINE)
+_JAVA_IMPORT = re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+(?:\.\*)?)\s*;', re.MULTILINE)
+
+
+def language_of(path: str) -> Optional[str]:
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+
+
+def _python_specifiers(nodes) -> List[str]:
+    specifiers = []
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            specifiers.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = "." * node.level + (node.module or "")
+            # `from pkg import mod` may name a submodule; resolution falls back to `pkg`
+            specifiers.extend(f"{base}.{alias.name}" if base and not base.endswith(".") else f"{base}{alias.name}"
+                              for alias in node.names if alias.name != "*")
+            if any(alias.name == "*" for alias in node.names):
+                specifiers.append(base)
+    return specifiers
+
+
+def parse_imports(language: str, text: str) -> List[str]:
+    """
+    Import specifiers of one source file, exactly as written.
+
+    Python relative imports keep their leading dots; a Java file's own
+    package is reported as `package:<name>` so classes can be located.
+    """
+    if language == 'python':
+        # Parsing only the import statements is several times faster than the
+        # whole module; imports nested in functions are found all the same
+        specifiers = []
+        for statement in _PY_IMPORT.findall(text):
+            try:
+                nodes = ast.parse(statement).body
+            except (SyntaxError, ValueError):
+                continue
+            specifiers.extend(_python_specifiers(nodes))
+        return specifiers
+    if language == 'js':
+        return _JS_IMPORT.findall(text)
+    if language == 'go':
+        specifiers = _GO_IMPORT_LINE.findall(text)
+        for block in _GO_IMPORT_BLOCK.findall(text):
+            specifiers.extend(_GO_QUOTED.findall(block))
+        return specifiers
+    if language == 'java':
+        package = _JAVA_PACKAGE.search(text)
+        specifiers = [f"package:{package.group(1)}"] if package else []
+        return specifiers + _JAVA_IMPORT.findall(text)
+    return []
+
+
+def _parse_batch(batch: List[Tuple[str, bytes]]) -> List[List[str]]:
+    """Process-pool entry point: parse (language, raw bytes) pairs"""
+    return [parse_imports(language, data.decode('utf-8', errors='replace')) for language, data in batch]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMPORT_GRAPH_WORKERS)
+        return _pool
+
+
+def map_in_pool(batch_func, items: list) -> list:
+    """
+    Apply `batch_func` (a picklable function from a list of items to a list
+    of results) to many items, fanning out over the process pool when it pays off.
+    """
+    if len(items) < IMPORT_GRAPH_POOL_THRESHOLD or IMPORT_GRAPH_WORKERS <= 1:
+        return batch_func(items)
+    chunk = max(16, len(items) // (IMPORT_GRAPH_WORKERS * 4))
+    batches = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+    results = []
+    for parsed in _process_pool().map(batch_func, batches):
+        results.extend(parsed)
+    return results
+
+
+def parse_many(items: List[Tuple[str, bytes]]) -> List[List[str]]:
+    """Parse the imports of many (language, raw bytes) files"""
+    return map_in_pool(_parse_batch, items)
+
+
+class BlobCache:
+    """
+    Values derived from file contents, by blob hash; a blob's value never changes.
+
+    `version` is part of every key, so bumping it retires values computed by
+    an older parser or extractor.
+    """
+
+    def __init__(self, version: str, max_entries: int = IMPORT_CACHE_ENTRIES):
+        self.version = version
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, blob_sha: str, language: str) -> str:
+        return f"{self.version}:{language}:{blob_sha}"
+
+    def get(self, blob_sha: str, language: str) -> Optional[list]:
+        key = self.key(blob_sha, language)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, blob_sha: str, language: str, value: list):
+        with self._lock:
+            self._entries[self.key(blob_sha, language)] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Parsed imports by blob hash
+import_cache = BlobCache(PARSER_VERSION)
+
+
+@dataclass
+class ImportGraph:
+    """Directory-level dependency graph derived from static imports"""
+    components: Dict[str, int] = field(default_factory=dict)  # component -> source files
+    edges: Dict[Tuple[str, str], int] = field(default_factory=dict)  # (from, to) -> import count
+    files_parsed: int = 0
+    imports_resolved: int = 0
+    imports_unresolved: int = 0
+    elapsed: float = 0.0
+
+    def dependencies_of(self, component: str) -> List[str]:
+        return [target for (source, target) in self.edges if source == component]
+
+    def is_empty(self) -> bool:
+        return not self.edges
+
+    def describe(self, limit: int = 40) -> str:
+        """Edges as prompt text, strongest first"""
+        strongest = sorted(self.edges.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return "\n".join(f"{source} -> {target} ({count} imports)" for (source, target), count in strongest)
+
+    def to_dict(self) -> dict:
+        return {
+            "components": self.components,
+            "edges": [[source, target, count] for (source, target), count in self.edges.items()],
+            "files_parsed": self.files_parsed,
+            "imports_resolved": self.imports_resolved,
+            "imports_unresolved": self.imports_unresolved,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ImportGraph":
+        return cls(
+            components=dict(data["components"]),
+            edges={(source, target): count for source, target, count in data["edges"]},
+            files_parsed=data.get("files_parsed", 0),
+            imports_resolved=data.get("imports_resolved", 0),
+            imports_unresolved=data.get("imports_unresolved", 0),
+        )
+
+
+class ImportResolver:
+    """Map import specifiers to files of the repository"""
+
+    JS_SUFFIXES = ('', '.ts', '.tsx', '.js', '.jsx', '.mjs', '.cjs',
+                   '/index.ts', '/index.tsx', '/index.js', '/index.jsx')
+
+    def __init__(self, paths: Iterable[str], go_module: str = ""):
+        self.paths = set(paths)
+        self.go_module = go_module.rstrip('/')
+        self.dirs = {os.path.dirname(path) for path in self.paths}
+        # Every dotted suffix of every Python module, e.g. a/b/c.py -> "a.b.c", "b.c", "c"
+        self.python_modules = defaultdict(list)
+        for path in self.paths:
+            if not path.endswith('.py'):
+                continue
+            module = path[:-3]
+            if module.endswith('/__init__'):
+                module = module[:-len('/__init__')]
+            parts = module.split('/')
+            for start in range(len(parts)):
+                self.python_modules['.'.join(parts[start:])].append(path)
+        self.java_packages = defaultdict(list)  # package name -> directories declaring it
+
+    def add_java_package(self, path: str, package: str):
+        directory = os.path.dirname(path)
+        if directory not in self.java_packages[package]:
+            self.java_packages[package].append(directory)
+
+    @staticmethod
+    def _closest(importer: str, candidates: List[str]) -> Optional[str]:
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        return max(candidates, key=lambda candidate: (len(os.path.commonpath([importer, candidate])), -len(candidate)))
+
+    def resolve(self, importer: str, language: str, specifier: str) -> Optional[str]:
+        """Repository path (file or directory) the specifier refers to, or None if external"""
+        if language == 'python':
+            return self._resolve_python(importer, specifier)
+        if language == 'js':
+            return self._resolve_js(importer, specifier)
+        if language == 'go':
+            return self._resolve_go(specifier)
+        if language == 'java':
+            return self._resolve_java(importer, specifier)
+        return None
+
+    def _resolve_python(self, importer: str, specifier: str) -> Optional[str]:
+        if specifier.startswith('.'):
+            level = len(specifier) - len(specifier.lstrip('.'))
+            base = os.path.dirname(importer)
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+            parts = [part for part in specifier[level:].split('.') if part]
+            while True:
+                candidate = '/'.join([base] + parts if base else parts)
+                for path in (f"{candidate}.py", f"{candidate}/__init__.py"):
+                    if path in self.paths:
+                        return path
+                if not parts:
+                    return None
+                parts.pop()
+        parts = specifier.split('.')
+        while parts:
+            found = self._closest(importer, self.python_modules.get('.'.join(parts), []))
+            if found:
+                return found
+            parts.pop()
+        return None
+
+    def _resolve_js(self, importer: str, specifier: str) -> Optional[str]:
+        if specifier.startswith('.'):
+            base = os.path.normpath(os.path.join(os.path.dirname(importer), specifier))
+            candidates = [base]
+        elif specifier.startswith(('@/', '~/')):
+            # The common bundler alias for the source root
+            candidates = [f"src/{specifier[2:]}", specifier[2:]]
+        else:
+            return None  # a package from node_modules
+        for base in candidates:
+            for suffix in self.JS_SUFFIXES:
+                if f"{base}{suffix}" in self.paths:
+                    return f"{base}{suffix}"
+        return None
+
+    def _resolve_go(self, specifier: str) -> Optional[str]:
+        if self.go_module and (specifier == self.go_module or specifier.startswith(self.go_module + '/')):
+            directory = specifier[len(self.go_module):].lstrip('/')
+            return directory if directory and directory in self.dirs else None
+        # Without go.mod, match the longest directory suffix
+        parts = specifier.split('/')
+        for start in range(1, len(parts)):
+            directory = '/'.join(parts[start:])
+            if directory in self.dirs:
+                return directory
+        return None
+
+    def _resolve_java(self, importer: str, specifier: str) -> Optional[str]:
+        package, _, name = specifier.rpartition('.')
+        if name == '*':
+            return self._closest(importer, self.java_packages.get(package, []))
+        for directory in self.java_packages.get(package, []):
+            path = f"{directory}/{name}.java" if directory else f"{name}.java"
+            if path in self.paths:
+                return path
+        # A static import names a member of a class
+        outer, _, cls = package.rpartition('.')
+        for directory in self.java_packages.get(outer, []):
+            path = f"{directory}/{cls}.java" if directory else f"{cls}.java"
+            if path in self.paths:
+                return path
+        return None
+
+
+class ComponentMap:
+    """
+    Groups files into directory components of a useful granularity.
+
+    Starting from the repository root, the largest group is repeatedly split
+    into its subdirectories while the number of components stays within
+    `target`. Wrapper directories with a single subdirectory (e.g. `src/`)
+    are always descended into. Components are named by their path.
+    """
+
+    def __init__(self, paths: List[str], target: int = IMPORT_GRAPH_TARGET_COMPONENTS):
+        groups: Dict[Tuple[str, ...], list] = {(): [tuple(path.split('/')) for path in paths]}
+        settled = set()
+        while True:
+            candidates = [prefix for prefix in groups if prefix not in settled]
+            if not candidates:
+                break
+            prefix = max(candidates, key=lambda candidate: (len(groups[candidate]), -len(candidate)))
+            children = defaultdict(list)
+            direct = []
+            for parts in groups[prefix]:
+                if len(parts) > len(prefix) + 1:
+                    children[parts[len(prefix)]].append(parts)
+                else:
+                    direct.append(parts)
+            split_count = len(groups) - 1 + len(children) + (1 if direct else 0)
+            if not children or split_count > max(target, len(groups)):
+                settled.add(prefix)
+                continue
+            del groups[prefix]
+            if direct:
+                # Files directly inside stay with the directory itself
+                groups[prefix] = direct
+                settled.add(prefix)
+            for name, members in children.items():
+                groups[prefix + (name,)] = members
+        self.groups = set(groups)
+
+    @staticmethod
+    def name(prefix: Tuple[str, ...]) -> str:
+        return '/'.join(prefix) or "(root)"
+
+    def of(self, path: str, is_dir: bool = False) -> str:
+        """Component a file (or a whole directory) belongs to"""
+        parts = tuple(path.split('/')) if path else ()
+        if not is_dir:
+            parts = parts[:-1]
+        for length in range(len(parts), -1, -1):
+            if parts[:length] in self.groups:
+                return self.name(parts[:length])
+        # A directory above every component, e.g. one a Go import names
+        return self.name(parts)
+
+
+def build_import_graph(files: List[Tuple[str, str]], read_blobs, go_module: str = "") -> ImportGraph:
+    """
+    Build the directory-level import graph of one commit.
+
+    Args:
+        files: (path, blob sha) of every source file to analyze
+        read_blobs: Callable taking blob shas and returning {sha: bytes}; only
+            called for blobs whose imports are not cached
+        go_module: Module path from the repository's go.mod, if any
+
+    Returns:
+        ImportGraph whose components are directories, see ComponentMap
+    """
+    started = time.perf_counter()
+    files = [(path, sha, language_of(path)) for path, sha in files if language_of(path)][:IMPORT_GRAPH_MAX_FILES]
+
+    imports_by_path = {}
+    missing = []
+    for path, sha, language in files:
+        cached = import_cache.get(sha, language)
+        if cached is None:
+            missing.append((path, sha, language))
+        else:
+            imports_by_path[path] = cached
+
+    if missing:
+        blobs = read_blobs(sorted({sha for _, sha, _ in missing}))
+        parseable = [(path, sha, language) for path, sha, language in missing
+                     if sha in blobs and len(blobs[sha]) <= IMPORT_GRAPH_MAX_FILE_BYTES]
+        parsed = parse_many([(language, blobs[sha]) for _, sha, language in parseable])
+        for (path, sha, language), imports in zip(parseable, parsed):
+            import_cache.put(sha, language, imports)
+            imports_by_path[path] = imports
+
+    resolver = ImportResolver((path for path, _, _ in files), go_module)
+    for path, imports in imports_by_path.items():
+        for specifier in imports:
+            if specifier.startswith('package:'):
+                resolver.add_java_package(path, specifier[len('package:'):])
+
+    component_map = ComponentMap([path for path, _, _ in files])
+    graph = ImportGraph(components=dict(Counter(component_map.of(path) for path, _, _ in files)))
+    edges = Counter()
+    languages = {path: language for path, _, language in files}
+    for path, imports in imports_by_path.items():
+        source = component_map.of(path)
+        for specifier in imports:
+            if specifier.startswith('package:'):
+                continue
+            target_path = resolver.resolve(path, languages[path], specifier)
+            if target_path is None:
+                graph.imports_unresolved += 1
+                continue
+            graph.imports_resolved += 1
+            target = component_map.of(target_path, is_dir=target_path not in resolver.paths)
+            if target != source:
+                edges[(source, target)] += 1
+    graph.edges = dict(edges)
+    graph.files_parsed = len(imports_by_path)
+    graph.elapsed = time.perf_counter() - started
+    return graph
@@ -0,0 +1,240 @@
+import os
+import math
+import time
+import uuid
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+# Jobs executed at once; each job's clone, LLM and render steps are further
+# bounded by the per-stage limits in service.concurrency
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs waiting for a worker before submissions are rejected with 429
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "32"))
+# Time from submission until a job is abandoned, queueing included
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "300"))
+# How long finished jobs and their results stay retrievable
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "900"))
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class QueueFull(Exception):
+    """The job queue is at capacity; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    job_id: str
+    key: Optional[Hashable]
+    run: Callable[[Callable[[str, dict], None]], Awaitable[Any]]
+    deadline: float  # monotonic time
+    status: str = "queued"  # queued, running, succeeded, failed or cancelled
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    events: List[Tuple[str, dict]] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+    cancel_requested: bool = False
+    _changed: Optional[asyncio.Event] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def emit(self, event: str, data: dict):
+        """Record a progress event and wake up everyone following the job"""
+        self.events.append((event, data))
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def wait_for_event(self, seen: int):
+        """Return once the job has more than `seen` events"""
+        while len(self.events) <= seen:
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            await self._changed.wait()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stage": next((data.get("stage") for event, data in reversed(self.events) if event == "stage"), None),
+            "result": self.result if self.status == "succeeded" else None,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Analyses run by a fixed pool of workers instead of inside HTTP requests.
+
+    Submission returns immediately with a job id; clients poll the job or
+    follow its events. The queue is bounded, so overload is reported to
+    clients (with a retry hint) instead of piling up. An identical job that
+    is still queued or running is returned instead of starting duplicate
+    work, which makes client retries safe.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_SIZE,
+                 deadline_seconds: float = JOB_DEADLINE_SECONDS, result_ttl: float = JOB_RESULT_TTL_SECONDS):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.deadline_seconds = deadline_seconds
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[Hashable, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        # Moving average of job run time, for the Retry-After estimate
+        self._average_seconds = 30.0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _start(self) -> asyncio.Queue:
+        # Created lazily so the queue and workers belong to the serving event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._worker_tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        return self._queue
+
+    def submit(self, run: Callable[[Callable[[str, dict], None]], Awaitable[Any]], key: Optional[Hashable] = None,
+               deadline_seconds: Optional[float] = None) -> Job:
+        """
+        Queue `run(emit)` as a job.
+
+        Args:
+            run: Coroutine function receiving an `emit(event, data)` callback; its return value is the job result
+            key: Identifies identical work; a queued or running job with the same key is returned instead
+            deadline_seconds: Overrides the default deadline, capped by it
+
+        Returns:
+            The new or existing Job
+
+        Raises:
+            QueueFull: If no more jobs can be queued
+        """
+        self._expire()
+        if key is not None and key in self._active:
+            return self._active[key]
+        queue = self._start()
+        if queue.full():
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+
+        seconds = min(deadline_seconds or self.deadline_seconds, self.deadline_seconds)
+        job = Job(job_id=uuid.uuid4().hex, key=key, run=run, deadline=time.monotonic() + seconds)
+        self._jobs[job.job_id] = job
+        if key is not None:
+            self._active[key] = job
+        queue.put_nowait(job)
+        job.emit("status", {"status": "queued", "position": queue.qsize()})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_requested = True
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued; the worker skips it
+            self._finish(job, "cancelled", error="Cancelled before it started")
+        return job
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if not job.finished:
+                    await self._execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Job worker error: %s", e)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: Job):
+        remaining = job.deadline - time.monotonic()
+        if remaining <= 0:
+            self._finish(job, "failed", error="Deadline exceeded while queued")
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        job.emit("status", {"status": "running"})
+        job.task = asyncio.ensure_future(job.run(job.emit))
+        self.running += 1
+        try:
+            result = await asyncio.wait_for(job.task, timeout=remaining)
+            self._finish(job, "succeeded", result=result)
+        except asyncio.TimeoutError:
+            self._finish(job, "failed", error=f"Deadline exceeded after {time.time() - job.created_at:.0f}s")
+        except asyncio.CancelledError:
+            if not job.cancel_requested:
+                # The worker itself is being shut down
+                raise
+            self._finish(job, "cancelled", error="Cancelled")
+        except Exception as e:
+            logger.warning("Job %s failed: %s", job.job_id, e)
+            self._finish(job, "failed", error=str(e))
+        finally:
+            self.running -= 1
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        if job.started_at is not None:
+            elapsed = job.finished_at - job.started_at
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * elapsed
+        if status == "succeeded":
+            self.completed += 1
+        elif status == "failed":
+            self.failed += 1
+        if job.key is not None and self._active.get(job.key) is job:
+            del self._active[job.key]
+        job.emit("status", {"status": status, "error": error, "result": result})
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to be free"""
+        # Some worker finishes a job about every average run time / workers
+        return max(1, math.ceil(self._average_seconds / max(self.workers, 1)))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+job_queue = JobQueue()
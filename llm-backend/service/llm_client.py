@@ -1,13 +1,48 @@
-import os
-from anthropic import Anthropic
 from schema import Message
 from dotenv import load_dotenv
 from service.github_analyzer import get_file_content
+from service.repo_tree import RepoTree
+from service.structure_renderer import render_structure
+from service.llm_gateway import llm_gateway
+from service.analysis_cache import analysis_cache, analysis_key
+from service.history_manager import HistoryState, compact_history
+from typing import List, Optional, Union
 
 load_dotenv()
-anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-def analyze_with_claude(history: list[Message], github_link: str, structure: str, drill_down_module: str = None, file_content: dict = None) -> str:
+NARRATIVE_MODEL = "claude-3-opus-20240229"
+SUMMARY_MODEL = "claude-3-haiku-20240307"
+SUMMARY_PROMPT_VERSION = "1"
+
+async def summarize_conversation(previous_summary: str, messages: List[Message]) -> str:
+    """Extend a conversation summary with turns that no longer fit in the prompt"""
+    transcript = "\n\n".join(f"{msg.role.upper()}: {msg.content}" for msg in messages)
+    cache_key = analysis_key(SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, f"{previous_summary}\n\n{transcript}")
+    cached_summary = await analysis_cache.aget(cache_key)
+    if cached_summary is not None:
+        return cached_summary
+    
+    prompt = f"""Summary of the conversation so far:
+{previous_summary or "(none)"}
+
+Further conversation:
+{transcript}
+
+Rewrite the summary so it also covers the further conversation. Keep the facts about the repository's architecture, the questions the user asked and the conclusions reached. Answer with the summary only, at most 300 words."""
+    response = await llm_gateway.create(
+        model=SUMMARY_MODEL,
+        max_tokens=600,
+        temperature=0,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    summary = response.content[0].text.strip()
+    if summary:
+        await analysis_cache.aput(cache_key, summary)
+    return summary
+
+def build_claude_request(history: list[Message], github_link: str, structure: Union[RepoTree, str], drill_down_module: str = None, file_content: dict = None,
+                         conversation_summary: str = "") -> dict:
+    """Build the Messages API arguments shared by the blocking and streaming calls"""
     # Convert historical messages to Anthropic Messages API format
     messages = []
     
@@ -21,10 +56,11 @@ def analyze_with_claude(history: list[Message], github_link: str, structure: str
     system_content = f"""You are analyzing a GitHub repository at {github_link}."""
     
     # Check if project structure contains error information
-    if structure and structure.startswith("[Error"):
+    project_tree = RepoTree.coerce(structure, github_link)
+    if project_tree.error:
         system_content += f"""
         
-There was an issue accessing the repository: {structure}
+There was an issue accessing the repository: {project_tree.error}
         
 Please inform the user about this issue and offer suggestions for next steps.
 If the repository is private, suggest they provide a public repository link.
@@ -36,9 +72,16 @@ If the repository doesn't exist, suggest they check the URL and try again.
         
 Project Structure:
 ```
-{structure}
+{render_structure(project_tree, focus=drill_down_module).text}
 ```"""
 
+    # Earlier turns that were folded out of `history`
+    if conversation_summary:
+        system_content += f"""
+
+Summary of the earlier conversation:
+{conversation_summary}"""
+
     # If there is file content, add it to the system message
     if file_content:
         for file_path, content in file_content.items():
@@ -83,18 +126,32 @@ Be concise but thorough in your analysis."""
             ]
 
     # Use Messages API with system message as a top-level parameter
-    response = anthropic.messages.create(
-        model="claude-3-opus-20240229",
-        system=system_content,
-        messages=messages,
-        max_tokens=2000,
-        temperature=0.5
-    )
+    return {
+        "model": NARRATIVE_MODEL,
+        "system": system_content,
+        "messages": messages,
+        "max_tokens": 2000,
+        "temperature": 0.5,
+    }
+
+async def analyze_with_claude(history: list[Message], github_link: str, structure: Union[RepoTree, str], drill_down_module: str = None, file_content: dict = None,
+                              history_state: Optional[HistoryState] = None) -> str:
+    history, summary = await compact_history(history, history_state, summarize_conversation)
+    request = build_claude_request(history, github_link, structure, drill_down_module, file_content, summary)
+    response = await llm_gateway.create(**request)
 
     return response.content[0].text
 
+async def stream_with_claude(history: list[Message], github_link: str, structure: Union[RepoTree, str], drill_down_module: str = None, file_content: dict = None,
+                             history_state: Optional[HistoryState] = None):
+    """Same analysis as `analyze_with_claude`, yielding text chunks as Claude produces them"""
+    history, summary = await compact_history(history, history_state, summarize_conversation)
+    request = build_claude_request(history, github_link, structure, drill_down_module, file_content, summary)
+    async for text in llm_gateway.stream_text(**request):
+        yield text
+
 
-# def analyze_with_claude(history: list[Message], github_link: str, structure: str) -> str:
+# async def analyze_with_claude(history: list[Message], github_link: str, structure: str) -> str:
 #     # Mock Claude analysis response
 #     return f"""
 # This GitHub repository at {github_link} appears to be a blockchain-based education system.
@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import random
+import asyncio
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import anthropic
+from anthropic import AsyncAnthropic
+from dotenv import load_dotenv
+
+from service.concurrency import stage_limit
+from service.structure_renderer import estimate_tokens
+from service.log import get_logger
+from service.metrics import LLM_REQUEST_SECONDS, LLM_TOKENS, STAGE_IN_FLIGHT
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+# Point the client at another endpoint, e.g. a proxy or a local fake server in tests
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+# Default per-model limits; LLM_RATE_LIMITS overrides them per model as
+# {"model": [requests per minute, tokens per minute]}
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "50"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "80000"))
+LLM_RATE_LIMITS: Dict[str, list] = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+# Consecutive failed calls that open the circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Rate limits, overload, server errors and network failures are worth retrying;
+# other errors (bad request, authentication) would fail the same way again
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not be reached; callers fall back to their non-LLM path"""
+
+
+class TokenBucket:
+    """
+    Allowance refilled continuously at `per_minute`, up to one minute's worth.
+
+    `delay` tells how long until an amount can be taken. A rate-limit
+    response can `pause` the bucket until the server's retry-after has passed.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(per_minute, 1.0)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` can be taken; 0 if it can be taken now"""
+        now = time.monotonic()
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(self.paused_until - now, (amount - self.available) / self.rate, 0.0)
+
+    def take(self, amount: float):
+        self._refill(time.monotonic())
+        self.available -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.available = min(self.capacity, self.available + amount)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while.
+
+    After `failures` consecutive failures the circuit opens and calls fail
+    fast for `reset_seconds`; then one trial call is let through (half-open)
+    and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._trial_running or self.consecutive_failures >= self.failures:
+            if self.opened_at is None or self._trial_running:
+                logger.warning("LLM circuit opened after %d consecutive failures", self.consecutive_failures)
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def abandon_trial(self):
+        """Let another call be the trial after one that ended without an outcome, e.g. was cancelled"""
+        self._trial_running = False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The server's retry hint (retry-after-ms or retry-after) of a failed call, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def backoff_seconds(attempt: int, hint: Optional[float] = None,
+                    base: float = LLM_BACKOFF_BASE_SECONDS, cap: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's hint"""
+    jittered = random.uniform(0, min(cap, base * 2 ** attempt))
+    return max(jittered, hint or 0.0)
+
+
+def request_tokens(request: dict) -> int:
+    """Rough input plus maximum output tokens of a Messages API request"""
+    text = request.get("system", "") or ""
+    for message in request.get("messages", []):
+        content = message.get("content", "")
+        text += content if isinstance(content, str) else json.dumps(content)
+    return estimate_tokens(text) + int(request.get("max_tokens", 0))
+
+
+class LLMGateway:
+    """
+    The single way out to the Anthropic API.
+
+    Every call is admitted by per-model token buckets (requests and tokens
+    per minute), so bursts queue here instead of turning into 429s. Failed
+    calls are retried with jittered exponential backoff that honors the
+    server's retry-after. Repeated failures open a circuit breaker, after
+    which calls raise `LLMUnavailable` immediately and callers take their
+    heuristic fallback. The SDK's own retries are disabled so only this
+    layer retries.
+    """
+
+    def __init__(self, client: Optional[AsyncAnthropic] = None, max_retries: int = LLM_MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None, backoff_base: float = LLM_BACKOFF_BASE_SECONDS):
+        self.client = client or AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"), base_url=ANTHROPIC_BASE_URL,
+            max_retries=0, timeout=LLM_TIMEOUT_SECONDS,
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self.calls = 0
+        self.retries = 0
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def buckets(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        """(requests, tokens) buckets of a model"""
+        if model not in self._buckets:
+            requests_per_minute, tokens_per_minute = LLM_RATE_LIMITS.get(model, (LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE))
+            self._buckets[model] = (TokenBucket(requests_per_minute), TokenBucket(tokens_per_minute))
+        return self._buckets[model]
+
+    async def _admit(self, model: str, tokens: int):
+        requests_bucket, tokens_bucket = self.buckets(model)
+        while True:
+            wait = max(requests_bucket.delay(1), tokens_bucket.delay(tokens))
+            if wait <= 0:
+                requests_bucket.take(1)
+                tokens_bucket.take(tokens)
+                return
+            await asyncio.sleep(wait)
+
+    def _check_breaker(self) -> bool:
+        """Raise if the circuit is open; returns whether this call is the half-open trial"""
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise LLMUnavailable("LLM temporarily unavailable after repeated failures")
+        return trial
+
+    async def _failed(self, model: str, attempt: int, error: Exception):
+        """Record a failed attempt; returns after the backoff if the call should be retried"""
+        if not is_retryable(error):
+            # The API answered; the request itself is at fault
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        hint = retry_after_seconds(error)
+        if isinstance(error, anthropic.RateLimitError):
+            self.rate_limited += 1
+            # Everyone calling this model waits out the server's limit, not just this call
+            self.buckets(model)[0].pause(hint or backoff_seconds(attempt, base=self.backoff_base))
+        if attempt >= self.max_retries:
+            raise LLMUnavailable(f"LLM call failed after {attempt + 1} attempts: {str(error)}") from error
+        self.retries += 1
+        delay = backoff_seconds(attempt, hint, base=self.backoff_base)
+        logger.warning("LLM call to %s failed (%s), retrying in %.1fs", model, type(error).__name__, delay)
+        await asyncio.sleep(delay)
+
+    async def create(self, **request):
+        """`messages.create` with admission control, retries and the circuit breaker"""
+        model = request["model"]
+        tokens = request_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            trial = self._check_breaker()
+            try:
+                await self._admit(model, tokens)
+                self.calls += 1
+                attempt_started = time.perf_counter()
+                try:
+                    async with stage_limit("llm"):
+                        with STAGE_IN_FLIGHT.track_in_progress(stage="llm"):
+                            response = await self.client.messages.create(**request)
+                except Exception as e:
+                    LLM_REQUEST_SECONDS.observe(time.perf_counter() - attempt_started, model=model, outcome="error")
+                    trial = False
+                    await self._failed(model, attempt, e)
+                    continue
+            except BaseException:
+                if trial:
+                    # Cancelled before its outcome was known; the next call may try instead
+                    self.breaker.abandon_trial()
+                raise
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - attempt_started, model=model, outcome="ok")
+            self.breaker.record_success()
+            self._settle(model, tokens, response)
+            return response
+
+    async def stream_text(self, **request) -> AsyncIterator[str]:
+        """
+        `messages.stream` text chunks with the same protections as `create`.
+
+        A call is only retried if it failed before its first chunk; once text
+        has been yielded a failure is raised to the caller.
+        """
+        model = request["model"]
+        tokens = request_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            trial = self._check_breaker()
+            try:
+                await self._admit(model, tokens)
+                self.calls += 1
+                started = False
+                attempt_started = time.perf_counter()
+                try:
+                    async with stage_limit("llm"):
+                        with STAGE_IN_FLIGHT.track_in_progress(stage="llm"):
+                            async with self.client.messages.stream(**request) as stream:
+                                async for text in stream.text_stream:
+                                    started = True
+                                    yield text
+                                response = await stream.get_final_message()
+                except Exception as e:
+                    LLM_REQUEST_SECONDS.observe(time.perf_counter() - attempt_started, model=model, outcome="error")
+                    trial = False
+                    if started:
+                        self.breaker.record_failure()
+                        raise
+                    await self._failed(model, attempt, e)
+                    continue
+            except BaseException:
+                if trial:
+                    # Cancelled, or the consumer went away, before the outcome was known
+                    self.breaker.abandon_trial()
+                raise
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - attempt_started, model=model, outcome="ok")
+            self.breaker.record_success()
+            self._settle(model, tokens, response)
+            return
+
+    def _settle(self, model: str, estimated: int, response):
+        """Return the unused part of the token estimate once actual usage is known"""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            input_tokens = getattr(usage, "input_tokens", 0) or 0
+            output_tokens = getattr(usage, "output_tokens", 0) or 0
+            LLM_TOKENS.inc(input_tokens, model=model, direction="input")
+            LLM_TOKENS.inc(output_tokens, model=model, direction="output")
+            used = input_tokens + output_tokens
+            if used < estimated:
+                self.buckets(model)[1].give_back(estimated - used)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "rejected": self.rejected,
+            "breaker": self.breaker.state,
+        }
+
+
+llm_gateway = LLMGateway()
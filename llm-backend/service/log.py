@@ -0,0 +1,63 @@
+import os
+import sys
+import atexit
+import queue
+import random
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose debug and info messages are kept; warnings and
+# errors are always logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+_sampled = contextvars.ContextVar("log_sampled", default=True)
+_root = logging.getLogger("codearch")
+_listener = None
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or _sampled.get()
+
+
+def sample_request(rate: float = LOG_SAMPLE_RATE) -> contextvars.Token:
+    """
+    Decide once per request whether its routine messages are logged.
+
+    Sampling whole requests keeps each logged request's trail complete.
+    Tasks started by the request inherit the decision.
+    """
+    return _sampled.set(rate >= 1.0 or random.random() < rate)
+
+
+def reset_sampling(token: contextvars.Token):
+    _sampled.reset(token)
+
+
+def _configure():
+    """
+    Log through a queue drained by a background thread, so request handlers
+    never block on writing to stdout.
+    """
+    global _listener
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = QueueHandler(records)
+    handler.addFilter(_SamplingFilter())
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _listener = QueueListener(records, output)
+    _listener.start()
+    # Flush queued records on shutdown
+    atexit.register(_listener.stop)
+    _root.addHandler(handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger of one module, e.g. `get_logger(__name__)`"""
+    if _listener is None:
+        _configure()
+    return _root.getChild(name)
@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+from typing import Optional
+from service.log import get_logger
+from service.metrics import EVENT_LOOP_LAG_SECONDS
+
+logger = get_logger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+# How often the loop is probed, and the lateness reported as blocking
+LOOP_MONITOR_INTERVAL_SECONDS = float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", "0.1"))
+LOOP_BLOCKED_SECONDS = float(os.getenv("LOOP_BLOCKED_SECONDS", "0.1"))
+# At most one blocking warning per this many seconds
+LOOP_WARNING_INTERVAL_SECONDS = 10.0
+
+
+class LoopMonitor:
+    """
+    Detects blocking calls on the event loop.
+
+    A background task sleeps for `interval` seconds and measures how much
+    later than scheduled it wakes up. Any synchronous work on the loop, such
+    as a git call or a graphviz render outside the stage executors, shows up
+    as lag; lag above `blocked_seconds` counts as a stall and is logged.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL_SECONDS, blocked_seconds: float = LOOP_BLOCKED_SECONDS,
+                 enabled: bool = LOOP_MONITOR_ENABLED):
+        self.interval = interval
+        self.blocked_seconds = blocked_seconds
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._unreported = 0
+        self._last_warning = 0.0
+
+    def ensure_started(self):
+        """Start probing the running event loop, once"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._probe())
+
+    def record(self, lag: float):
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag < self.blocked_seconds:
+            return
+        self.stalls += 1
+        self._unreported += 1
+        now = time.monotonic()
+        if now - self._last_warning >= LOOP_WARNING_INTERVAL_SECONDS:
+            logger.warning("Event loop blocked for %.3fs (%d stalls since the last warning)", lag, self._unreported)
+            self._last_warning = now
+            self._unreported = 0
+
+    async def _probe(self):
+        while True:
+            scheduled = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.perf_counter() - scheduled))
+
+    def stats(self) -> dict:
+        return {"max_lag": self.max_lag, "stalls": self.stalls}
+
+
+loop_monitor = LoopMonitor()
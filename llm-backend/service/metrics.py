@@ -0,0 +1,235 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# A collected sample: (metric name, type, help, [(labels, value)])
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label combination"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, per label combination"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """Count the enclosed block as in flight while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, per label combination"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[tuple, List[int]] = {}
+        self._sums: Dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * len(self.buckets)
+                self._sums[key] = 0.0
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the enclosed block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key in sorted(self._counts):
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, self._counts[key]):
+                    cumulative += count
+                    bucket_labels = dict(labels, le=_format_value(bound))
+                    lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(self._sums[key])}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics exposed on /metrics in the Prometheus text format.
+
+    Hot paths update counters, gauges and histograms directly. Components
+    that already keep their own statistics (caches, queues) register a
+    collector instead, which is only called when the metrics are scraped.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                # One broken collector must not take down the whole scrape
+                lines.append(f"# collector error: {type(e).__name__}")
+                continue
+            for name, kind, help_text, values in samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in values)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "codearch_stage_duration_seconds", "Duration of pipeline stages", ["stage"])
+STAGE_IN_FLIGHT = registry.gauge(
+    "codearch_stage_in_flight", "Operations currently running in each pipeline stage", ["stage"])
+LLM_REQUEST_SECONDS = registry.histogram(
+    "codearch_llm_request_duration_seconds", "Duration of Anthropic API calls", ["model", "outcome"])
+LLM_TOKENS = registry.counter(
+    "codearch_llm_tokens_total", "Tokens reported by the Anthropic API", ["model", "direction"])
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "codearch_http_request_duration_seconds", "Duration of HTTP requests until the response starts", ["method", "route", "status"])
+HTTP_IN_FLIGHT = registry.gauge(
+    "codearch_http_requests_in_flight", "HTTP requests currently being served")
+EVENT_LOOP_LAG_SECONDS = registry.histogram(
+    "codearch_event_loop_lag_seconds", "How late event loop wake-ups run; high values mean blocking calls on the loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+
+def timed(stage: str):
+    """Observe the enclosed block as one run of `stage` in the stage histogram"""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def cache_sample(caches: Dict[str, Tuple[float, float]]) -> List[Sample]:
+    """Collector samples of {cache: (hits, misses)}: lookup counters and the hit ratio"""
+    lookups = []
+    ratios = []
+    for cache, (hits, misses) in sorted(caches.items()):
+        lookups.append(({"cache": cache, "result": "hit"}, hits))
+        lookups.append(({"cache": cache, "result": "miss"}, misses))
+        ratios.append(({"cache": cache}, hits / (hits + misses) if hits + misses else 0.0))
+    return [
+        ("codearch_cache_lookups_total", "counter", "Cache lookups by result", lookups),
+        ("codearch_cache_hit_ratio", "gauge", "Fraction of cache lookups that hit", ratios),
+    ]
+
@@ -0,0 +1,120 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Set
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+PREFETCH_MAX_MODULES = int(os.getenv("PREFETCH_MAX_MODULES", "8"))
+
+
+class Prefetcher:
+    """
+    Background, lower-priority work tied to an analysis session.
+
+    Jobs only start while no interactive request is in flight, at most
+    `concurrency` run at once, and every job of a session can be cancelled
+    together when the session expires. A job that has already started keeps
+    its LLM slot; interactive requests arriving meanwhile simply wait their
+    turn in the normal stage limits.
+    """
+
+    def __init__(self, concurrency: int = PREFETCH_CONCURRENCY, enabled: bool = PREFETCH_ENABLED):
+        self.concurrency = concurrency
+        self.enabled = enabled
+        self._interactive = 0
+        self._idle = None
+        self._semaphore = None
+        self._tasks: Dict[str, Set[asyncio.Task]] = {}
+        self.completed = 0
+        self.cancelled = 0
+
+    def _gates(self):
+        # Created lazily so they belong to the serving event loop
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._idle, self._semaphore
+
+    @asynccontextmanager
+    async def interactive(self):
+        """Mark an interactive request as in flight; prefetch jobs hold back until none are"""
+        idle, _ = self._gates()
+        self._interactive += 1
+        idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive -= 1
+            if self._interactive == 0:
+                idle.set()
+
+    def schedule(self, owner: str, name: str, job: Callable[[], Awaitable], should_run: Callable[[], bool] = lambda: True):
+        """
+        Run `job` in the background on behalf of `owner` (a session id).
+
+        `should_run` is checked again right before the job starts, so work
+        that an interactive request already did, or that belongs to an
+        expired session, is skipped.
+        """
+        if not self.enabled:
+            return
+        task = asyncio.ensure_future(self._run(name, job, should_run))
+        tasks = self._tasks.setdefault(owner, set())
+        tasks.add(task)
+        task.add_done_callback(lambda finished: self._forget(owner, finished))
+
+    async def _run(self, name: str, job, should_run):
+        idle, semaphore = self._gates()
+        async with semaphore:
+            # Yield to interactive requests before starting, and re-check after each wait
+            while not idle.is_set():
+                await idle.wait()
+            if not should_run():
+                return
+            try:
+                await job()
+                self.completed += 1
+                logger.debug("Prefetched %s", name)
+            except Exception as e:
+                logger.warning("Prefetch of %s failed: %s", name, e)
+
+    def _forget(self, owner: str, task: asyncio.Task):
+        tasks = self._tasks.get(owner)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[owner]
+
+    def cancel(self, owner: str):
+        """Cancel every pending or running job of `owner`"""
+        for task in list(self._tasks.pop(owner, ())):
+            if not task.done():
+                # Expiry may be noticed from any thread; cancel on the task's own loop
+                task.get_loop().call_soon_threadsafe(task.cancel)
+                self.cancelled += 1
+
+    def pending(self) -> int:
+        return sum(len(tasks) for tasks in self._tasks.values())
+
+
+def prefetch_candidates(components: List[Dict], limit: int = PREFETCH_MAX_MODULES) -> List[str]:
+    """
+    Component names worth prefetching, most connected first.
+
+    Components other components depend on tend to be the ones users click.
+    """
+    incoming = {component["name"]: 0 for component in components}
+    for component in components:
+        for dependency in component.get("dependencies", []):
+            if dependency in incoming:
+                incoming[dependency] += 1
+    ranked = sorted(components, key=lambda component: -(incoming[component["name"]] + len(component.get("dependencies", []))))
+    return [component["name"] for component in ranked[:limit]]
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,313 @@
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import secrets
+import asyncio
+import tempfile
+import threading
+import contextvars
+from typing import Dict, List, Optional, Tuple
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Required both to profile a request and to fetch profiles; without it profiling stays off
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+# Sampling stops after this long, bounding the size of a profile
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "llm-code-arch-profiles"))
+PROFILE_MAX_ARTIFACTS = int(os.getenv("PROFILE_MAX_ARTIFACTS", "50"))
+
+_PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+_SUFFIX = ".speedscope.json"
+
+# The profile of the request being served, inherited by the tasks it creates
+active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("active_profile", default=None)
+
+Frame = Tuple[str, str, int]
+
+
+def is_valid_profile_id(profile_id: str) -> bool:
+    return bool(_PROFILE_ID_PATTERN.match(profile_id or ""))
+
+
+def _code_key(code) -> Frame:
+    return (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+
+
+def _thread_stack(frame, stop_code=None) -> List[Frame]:
+    """Stack of a thread, root first, starting below `stop_code` if it is on the stack"""
+    stack = []
+    while frame is not None:
+        if frame.f_code is stop_code:
+            break
+        stack.append(_code_key(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(coro) -> List[Frame]:
+    """Logical stack of a suspended coroutine: each coroutine it awaits, down to the pending future"""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        stack.append(_code_key(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    stack.append(("[awaiting]", "", 0))
+    return stack
+
+
+class RequestProfile:
+    """
+    Wall-clock samples of one request, taken by a background thread.
+
+    Every `interval` seconds the thread records a stack per "lane": each task
+    created while serving the request, and each executor thread running a
+    stage for it. A task running on the event loop is sampled from the loop
+    thread's real stack; a suspended task is sampled along its await chain,
+    so time spent waiting on the LLM or a clone shows up where it is awaited.
+    """
+
+    def __init__(self, name: str, interval: float = PROFILE_INTERVAL_SECONDS, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.profile_id = secrets.token_hex(8)
+        self.name = name
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.active = True
+        self.tasks: Dict[asyncio.Task, str] = {}
+        self.threads: Dict[int, str] = {}
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._frames: Dict[Frame, int] = {}
+        self._samples: Dict[str, List[Tuple[List[int], float]]] = {}
+        self._stopped = threading.Event()
+        self._started = time.perf_counter()
+        self._context_token = None
+        self.duration = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"profile-{self.profile_id}", daemon=True)
+
+    def add_task(self, task: asyncio.Task):
+        coro = task.get_coro()
+        self.tasks[task] = f"{getattr(coro, '__qualname__', type(coro).__name__)} ({task.get_name()})"
+
+    def _record(self, lane: str, stack: List[Frame], weight: float):
+        indexes = [self._frames.setdefault(frame, len(self._frames)) for frame in stack]
+        self._samples.setdefault(lane, []).append((indexes, weight))
+
+    def _sample(self, weight: float):
+        frames = sys._current_frames()
+        running = asyncio.current_task(self._loop)
+        for task, lane in list(self.tasks.items()):
+            if task.done():
+                continue
+            coro = task.get_coro()
+            if task is running and self._loop_thread in frames:
+                root = getattr(coro, "cr_frame", None)
+                stack = _thread_stack(frames[self._loop_thread])
+                start = next((i for i, frame in enumerate(stack) if root is not None and frame == _code_key(root.f_code)), 0)
+                stack = stack[start:]
+            else:
+                stack = _await_chain(coro)
+            self._record(lane, stack, weight)
+        for ident, lane in list(self.threads.items()):
+            if ident in frames:
+                stack = _thread_stack(frames[ident], stop_code=_run_profiled.__code__)
+                self._record(lane, stack or [("[native]", "", 0)], weight)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            try:
+                self._sample(now - last)
+            except Exception as e:
+                # Tasks and frames change under the sampler; a torn read only loses one sample
+                logger.debug("Profile sample failed: %s", e)
+            last = now
+            if now - self._started > self.max_seconds:
+                logger.warning("Profile %s stopped sampling after %.0fs", self.profile_id, self.max_seconds)
+                break
+        self._stopped.wait()
+        try:
+            profile_store.put(self.profile_id, self.to_speedscope())
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", self.profile_id, e)
+        # Background tasks started by the request keep it in their context; only its id needs to outlive it
+        self.tasks, self.threads, self._frames, self._samples = {}, {}, {}, {}
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.active = False
+        self.duration = time.perf_counter() - self._started
+        self._stopped.set()
+
+    def to_speedscope(self) -> dict:
+        """The samples in the speedscope file format, one sampled profile per lane"""
+        frames = [None] * len(self._frames)
+        for (name, path, line), index in self._frames.items():
+            frames[index] = {"name": name, "file": path, "line": line}
+        profiles = []
+        for lane, samples in self._samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": lane,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weight for _, weight in samples), 6),
+                "samples": [stack for stack, _ in samples],
+                "weights": [round(weight, 6) for _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.name} ({self.duration:.3f}s)",
+            "exporter": "llm-code-arch",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+def to_collapsed(speedscope: dict) -> str:
+    """Folded stacks (`lane;frame;frame microseconds`) for flamegraph.pl and similar tools"""
+    frames = [frame["name"] for frame in speedscope["shared"]["frames"]]
+    totals: Dict[str, float] = {}
+    for profile in speedscope["profiles"]:
+        lane = profile["name"].replace(";", ":")
+        for stack, weight in zip(profile["samples"], profile["weights"]):
+            key = ";".join([lane] + [frames[index].replace(";", ":") for index in stack])
+            totals[key] = totals.get(key, 0.0) + weight
+    return "".join(f"{key} {max(1, round(seconds * 1e6))}\n" for key, seconds in sorted(totals.items()))
+
+
+class ProfileStore:
+    """Profiles on disk, newest `max_artifacts` kept, shared by the worker processes"""
+
+    def __init__(self, root: str = PROFILE_DIR, max_artifacts: int = PROFILE_MAX_ARTIFACTS):
+        self.root = root
+        self.max_artifacts = max_artifacts
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.root, profile_id + _SUFFIX)
+
+    def put(self, profile_id: str, speedscope: dict):
+        os.makedirs(self.root, exist_ok=True)
+        temporary = self._path(profile_id) + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(speedscope, f, separators=(",", ":"))
+        os.replace(temporary, self._path(profile_id))
+        for entry in self.list()[self.max_artifacts:]:
+            try:
+                os.remove(self._path(entry["profile_id"]))
+            except OSError:
+                pass
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        if not is_valid_profile_id(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> List[dict]:
+        """Stored profiles, newest first"""
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return entries
+        for name in names:
+            profile_id = name[:-len(_SUFFIX)]
+            if not name.endswith(_SUFFIX) or not is_valid_profile_id(profile_id):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append({"profile_id": profile_id, "created": stat.st_mtime, "bytes": stat.st_size})
+        entries.sort(key=lambda entry: entry["created"], reverse=True)
+        return entries
+
+
+class Profiler:
+    """
+    Opt-in profiling of single requests.
+
+    Off unless enabled and given an admin token. While no request is being
+    profiled the only cost is a context variable lookup per executor call;
+    while one is, a task factory tags the tasks it creates.
+    """
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, admin_token: str = PROFILING_ADMIN_TOKEN):
+        self.enabled = enabled and bool(admin_token)
+        self.admin_token = admin_token
+        self._profiles: List[RequestProfile] = []
+        self._previous_factory = None
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and hmac.compare_digest((token or "").encode("utf-8"), self.admin_token.encode("utf-8"))
+
+    def _task_factory(self, loop, coro, context=None):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro) if context is None else self._previous_factory(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        profile = active_profile.get() if context is None else context.get(active_profile)
+        if profile is not None and profile.active:
+            profile.add_task(task)
+        return task
+
+    def start(self, name: str) -> RequestProfile:
+        """Profile the current task and everything it starts, until `stop`; call on the event loop"""
+        profile = RequestProfile(name)
+        loop = asyncio.get_running_loop()
+        if not self._profiles:
+            self._previous_factory = loop.get_task_factory()
+            loop.set_task_factory(self._task_factory)
+        self._profiles.append(profile)
+        profile._context_token = active_profile.set(profile)
+        profile.add_task(asyncio.current_task())
+        profile.start()
+        return profile
+
+    def stop(self, profile: RequestProfile):
+        profile.stop()
+        active_profile.reset(profile._context_token)
+        self._profiles.remove(profile)
+        if not self._profiles:
+            asyncio.get_running_loop().set_task_factory(self._previous_factory)
+            self._previous_factory = None
+        logger.info("Profiled %s in %.3fs as %s", profile.name, profile.duration, profile.profile_id)
+
+
+def _run_profiled(profile: RequestProfile, lane: str, func):
+    ident = threading.get_ident()
+    profile.threads[ident] = lane
+    try:
+        return func()
+    finally:
+        profile.threads.pop(ident, None)
+
+
+def profiled(func, lane: str):
+    """`func` sampled as `lane` while it runs, if the calling request is being profiled"""
+    profile = active_profile.get()
+    if profile is None or not profile.active:
+        return func
+    name = getattr(getattr(func, "func", func), "__qualname__", "call")
+    return lambda: _run_profiled(profile, f"{lane} {name}", func)
+
+
+profile_store = ProfileStore()
+profiler = Profiler()
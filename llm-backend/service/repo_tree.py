@@ -0,0 +1,223 @@
+import os
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+INDENT = '    '
+
+
+class RepoTree:
+    """
+    Compact, array-backed model of a repository's directory structure.
+
+    Nodes are stored in depth-first preorder, so the subtree of node `i` is the
+    contiguous index range `[i + 1, subtree_end[i])`. Node 0 is the repository
+    root. A path index gives O(1) lookup of any file or directory, and every
+    directory carries its recursive file count and extension histogram.
+
+    The indented string the LLM prompts use is rendered from the tree on demand.
+    """
+
+    def __init__(self, github_link: str = "", commit_sha: Optional[str] = None):
+        self.github_link = github_link
+        self.commit_sha = commit_sha
+        self.error: Optional[str] = None
+        self.notice: Optional[str] = None
+        self.truncated = False
+
+        self.names: List[str] = [""]
+        self.paths: List[str] = [""]
+        self.parents = array('i', [-1])
+        self.depths = array('H', [0])
+        self.is_dir = bytearray([1])
+        self.subtree_end = array('i', [1])
+        self.file_counts = array('i', [0])
+        self.ext_histograms: Dict[int, Counter] = {0: Counter()}
+        self.path_index: Dict[str, int] = {"": 0}
+        self._dir_names: Dict[str, List[int]] = {}
+
+        self._open_dirs = [0]
+        self._rendered: Optional[str] = None
+        # Budgeted renderings, keyed by (token budget, focus module)
+        self.render_cache: Dict[tuple, object] = {}
+
+    # Construction
+
+    @classmethod
+    def from_error(cls, message: str, github_link: str = "") -> "RepoTree":
+        """A tree that only carries an error or warning from the analyzer"""
+        tree = cls(github_link)
+        if message.startswith("[Error"):
+            tree.error = message
+        else:
+            tree.notice = message
+        tree.finalize()
+        return tree
+
+    @classmethod
+    def from_walk(cls, entries, github_link: str = "", commit_sha: Optional[str] = None) -> "RepoTree":
+        """Build a tree from preorder (parts, is_dir) entries such as `TreeWalker.walk()`"""
+        tree = cls(github_link, commit_sha)
+        for entry in entries:
+            tree.add(entry.parts, entry.is_dir)
+        tree.finalize()
+        return tree
+
+    @classmethod
+    def from_structure(cls, structure: str, github_link: str = "") -> "RepoTree":
+        """Parse the indented string format produced by `render()`"""
+        stripped = structure.strip()
+        if stripped.startswith("[Error") or stripped.startswith("[Warning"):
+            return cls.from_error(stripped, github_link)
+
+        tree = cls(github_link)
+        lines = [line for line in structure.split("\n") if line.strip()]
+        base_indent = min((len(line) - len(line.lstrip()) for line in lines), default=0)
+        stack: List[str] = []
+        for line in lines:
+            content = line.strip()
+            if content.startswith("[... truncated"):
+                tree.truncated = True
+                continue
+            depth = (len(line) - len(line.lstrip()) - base_indent) // len(INDENT)
+            depth = min(depth, len(stack))
+            del stack[depth:]
+            is_dir = content.endswith('/')
+            name = content.rstrip('/')
+            tree.add(tuple(stack) + (name,), is_dir)
+            if is_dir:
+                stack.append(name)
+        tree.finalize()
+        return tree
+
+    @classmethod
+    def coerce(cls, structure: Union["RepoTree", str, None], github_link: str = "") -> "RepoTree":
+        """Accept either a tree or a legacy structure string"""
+        if isinstance(structure, RepoTree):
+            return structure
+        return cls.from_structure(structure or "", github_link)
+
+    def add(self, parts: Tuple[str, ...], is_dir: bool) -> int:
+        """Append a node; entries must arrive in depth-first preorder"""
+        depth = len(parts)
+        # Close directories that are not ancestors of this entry
+        while len(self._open_dirs) > depth:
+            closed = self._open_dirs.pop()
+            self.subtree_end[closed] = len(self.names)
+        parent = self._open_dirs[-1]
+
+        index = len(self.names)
+        path = '/'.join(parts)
+        self.names.append(parts[-1])
+        self.paths.append(path)
+        self.parents.append(parent)
+        self.depths.append(depth)
+        self.is_dir.append(1 if is_dir else 0)
+        self.subtree_end.append(index + 1)
+        self.file_counts.append(0)
+        self.path_index[path] = index
+        if is_dir:
+            self.ext_histograms[index] = Counter()
+            self._dir_names.setdefault(parts[-1].lower(), []).append(index)
+            self._open_dirs.append(index)
+        return index
+
+    def finalize(self):
+        """Close open directories and aggregate per-directory statistics"""
+        while self._open_dirs:
+            closed = self._open_dirs.pop()
+            self.subtree_end[closed] = len(self.names)
+
+        # Children always follow their parents, so one reverse pass rolls counts up
+        for index in range(len(self.names) - 1, 0, -1):
+            parent = self.parents[index]
+            if self.is_dir[index]:
+                self.file_counts[parent] += self.file_counts[index]
+                self.ext_histograms[parent].update(self.ext_histograms[index])
+            else:
+                self.file_counts[parent] += 1
+                self.ext_histograms[parent][file_extension(self.names[index])] += 1
+
+    # Queries
+
+    def __len__(self) -> int:
+        return len(self.names) - 1
+
+    @property
+    def is_empty(self) -> bool:
+        return len(self.names) == 1
+
+    def find(self, path: str) -> Optional[int]:
+        return self.path_index.get(path.strip('/'))
+
+    def find_module(self, module_name: str) -> Optional[int]:
+        """
+        Locate the directory an LLM component name refers to.
+
+        Tries an exact path, then an exact directory name, then a substring
+        match on directory names; shallower directories win ties.
+        """
+        index = self.find(module_name)
+        if index is not None and self.is_dir[index]:
+            return index
+
+        key = module_name.strip('/').lower()
+        exact = self._dir_names.get(key)
+        if exact:
+            return min(exact, key=lambda i: self.depths[i])
+
+        candidates = [i for name, indexes in self._dir_names.items() if key and key in name for i in indexes]
+        if candidates:
+            return min(candidates, key=lambda i: (self.depths[i], i))
+        return None
+
+    def children(self, index: int = 0) -> Iterator[int]:
+        child = index + 1
+        end = self.subtree_end[index]
+        while child < end:
+            yield child
+            child = self.subtree_end[child]
+
+    def iter_subtree(self, index: int = 0) -> range:
+        return range(index + 1, self.subtree_end[index])
+
+    def files_under(self, index: int = 0) -> Iterator[int]:
+        return (i for i in self.iter_subtree(index) if not self.is_dir[i])
+
+    def file_count(self, index: int = 0) -> int:
+        return self.file_counts[index]
+
+    def extension_histogram(self, index: int = 0) -> Counter:
+        return self.ext_histograms.get(index, Counter())
+
+    def relative_path(self, index: int, ancestor: int) -> str:
+        base = self.paths[ancestor]
+        return self.paths[index][len(base) + 1:] if base else self.paths[index]
+
+    # Rendering
+
+    def render(self) -> str:
+        """Render the indented string format used in LLM prompts"""
+        if self._rendered is None:
+            self._rendered = self._render()
+        return self._rendered
+
+    def _render(self) -> str:
+        if self.error:
+            return self.error
+        if self.is_empty and self.notice:
+            return self.notice
+        lines = []
+        for index in range(1, len(self.names)):
+            suffix = '/' if self.is_dir[index] else ''
+            lines.append(f"{INDENT * (self.depths[index] - 1)}{self.names[index]}{suffix}")
+        if self.truncated:
+            lines.append(f"[... truncated: listing stopped after {len(self)} entries ...]")
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+def file_extension(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
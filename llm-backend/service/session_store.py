@@ -0,0 +1,171 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from service.repo_tree import RepoTree
+from service.history_manager import HistoryState
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 ** 2)))
+# Idle sessions are also dropped by a periodic sweep, not only when a request comes in
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))
+
+
+def tree_bytes(tree: RepoTree) -> int:
+    """Rough memory of a repository tree"""
+    return sum(len(path) for path in tree.paths) + 64 * len(tree.names)
+
+
+@dataclass
+class AnalysisSession:
+    """Everything computed for one repository exploration, reused across requests"""
+    session_id: str
+    github_link: str
+    commit_sha: Optional[str]
+    tree: RepoTree
+    overview_text: str = ""
+    overview_components: List[Dict] = field(default_factory=list)
+    # Rendered diagrams by module name; the overview is stored under None
+    diagrams: Dict[Optional[str], str] = field(default_factory=dict)
+    module_components: Dict[str, List[Dict]] = field(default_factory=dict)
+    # Rolling summary of follow-up turns that no longer fit in the prompt
+    history: HistoryState = field(default_factory=HistoryState)
+    created_at: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+
+    def approx_bytes(self) -> int:
+        """Rough memory of the session's own results; its tree may be shared and is counted by the store"""
+        diagram_bytes = sum(len(svg) for svg in self.diagrams.values())
+        return diagram_bytes + len(self.overview_text) + len(self.history.summary)
+
+
+class SessionStore:
+    """
+    In-memory analysis sessions with idle expiry and a memory cap.
+
+    Sessions idle for longer than `idle_seconds` are dropped, and the least
+    recently used ones are dropped whenever the estimated total size exceeds
+    `max_bytes`. Expiry listeners are told about every dropped session.
+
+    The total is kept as a running sum: a session's size is measured when it
+    is created and when `update` is called after its results change, and a
+    tree shared by several sessions is counted once.
+    """
+
+    def __init__(self, idle_seconds: float = SESSION_IDLE_SECONDS, max_bytes: int = SESSION_MAX_BYTES):
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, AnalysisSession]" = OrderedDict()
+        self._expiry_listeners: List[Callable[[AnalysisSession], None]] = []
+        self._sizes: Dict[str, int] = {}
+        # id(tree) -> [sessions using it, its size]
+        self._trees: Dict[int, List[int]] = {}
+        self._total_bytes = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def on_expire(self, listener: Callable[[AnalysisSession], None]):
+        self._expiry_listeners.append(listener)
+
+    def create(self, github_link: str, tree: RepoTree) -> AnalysisSession:
+        session = AnalysisSession(
+            session_id=uuid.uuid4().hex,
+            github_link=github_link,
+            commit_sha=tree.commit_sha,
+            tree=tree,
+        )
+        size = session.approx_bytes()
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sizes[session.session_id] = size
+            self._total_bytes += size
+            tree_ref = self._trees.get(id(tree))
+            if tree_ref is None:
+                tree_ref = self._trees[id(tree)] = [0, tree_bytes(tree)]
+                self._total_bytes += tree_ref[1]
+            tree_ref[0] += 1
+        self.enforce_limits()
+        return session
+
+    def update(self, session: AnalysisSession):
+        """Measure a session again after its diagrams, texts or history summary changed"""
+        size = session.approx_bytes()
+        with self._lock:
+            if session.session_id not in self._sessions:
+                return
+            self._total_bytes += size - self._sizes[session.session_id]
+            self._sizes[session.session_id] = size
+        self.enforce_limits()
+
+    def _forget_locked(self, session: AnalysisSession):
+        self._total_bytes -= self._sizes.pop(session.session_id, 0)
+        tree_ref = self._trees.get(id(session.tree))
+        if tree_ref is not None:
+            tree_ref[0] -= 1
+            if tree_ref[0] == 0:
+                del self._trees[id(session.tree)]
+                self._total_bytes -= tree_ref[1]
+
+    def get(self, session_id: Optional[str], github_link: Optional[str] = None) -> Optional[AnalysisSession]:
+        """Return a live session, optionally only if it belongs to `github_link`"""
+        if not session_id:
+            return None
+        self.enforce_limits()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or (github_link and session.github_link != github_link):
+                return None
+            session.last_access = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def enforce_limits(self):
+        """Drop idle sessions, then least recently used ones until under the memory cap"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if now - session.last_access <= self.idle_seconds:
+                    break
+                expired.append(self._sessions.pop(session_id))
+                self._forget_locked(session)
+
+            while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+                _, session = self._sessions.popitem(last=False)
+                self._forget_locked(session)
+                expired.append(session)
+
+        for session in expired:
+            logger.info("Expiring analysis session %s for %s", session.session_id, session.github_link)
+            for listener in self._expiry_listeners:
+                listener(session)
+
+    def ensure_sweeping(self, interval: float = SESSION_SWEEP_SECONDS):
+        """Start dropping idle sessions periodically on the running event loop, once"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.ensure_future(self._sweep(interval))
+
+    async def _sweep(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.enforce_limits()
+
+    def __contains__(self, session_id: str) -> bool:
+        """Whether the session is still alive, without counting as an access"""
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+session_store = SessionStore()
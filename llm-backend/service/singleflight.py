@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that would do identical work.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task. Each waiter is shielded, so a waiter
+    that is cancelled (e.g. its client disconnected) stops waiting without
+    cancelling the shared work for everyone else. Once the task finishes the
+    key is released, so later calls start fresh work (and hit the caches).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda finished: self._release(key, finished))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def cancel(self, key: Hashable):
+        """Cancel the shared work for `key`, e.g. once nobody can want its result"""
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
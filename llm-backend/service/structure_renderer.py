@@ -0,0 +1,262 @@
+import os
+import heapq
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+
+from service.repo_tree import RepoTree, INDENT, file_extension
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+# Target size of the structure section of a prompt
+STRUCTURE_TOKEN_BUDGET = int(os.getenv("STRUCTURE_TOKEN_BUDGET", "6000"))
+# Rough average for file listings; deliberately conservative
+CHARS_PER_TOKEN = 4
+
+# Files that say little about architecture; dropped before any directory is collapsed
+LOW_SIGNAL_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp', '.bmp', '.tiff',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot',
+    '.mp3', '.mp4', '.wav', '.ogg', '.webm', '.mov',
+    '.zip', '.tar', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.jar', '.whl',
+    '.map', '.pyc', '.class', '.o', '.so', '.dll', '.dylib', '.exe', '.bin', '.dat',
+    '.pdf', '.snap', '.lock',
+}
+LOW_SIGNAL_NAMES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'cargo.lock',
+    'composer.lock', 'gemfile.lock', 'go.sum', '.ds_store',
+}
+
+
+@dataclass
+class RenderedStructure:
+    """A structure listing sized for a prompt, with a report of what was left out"""
+    text: str
+    estimated_tokens: int
+    total_entries: int
+    shown_entries: int
+    collapsed_dirs: int = 0
+    omitted_low_signal: int = 0
+
+    @property
+    def elided_entries(self) -> int:
+        return self.total_entries - self.shown_entries
+
+    @property
+    def is_summarized(self) -> bool:
+        return self.elided_entries > 0
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_low_signal(name: str) -> bool:
+    lowered = name.lower()
+    return (lowered in LOW_SIGNAL_NAMES or file_extension(lowered) in LOW_SIGNAL_EXTENSIONS
+            or lowered.endswith('.min.js') or lowered.endswith('.min.css'))
+
+
+def _format_histogram(histogram, limit: int = 3, separator: str = ' ') -> str:
+    top = [(ext or 'no ext', count) for ext, count in histogram.most_common(limit)]
+    return ', '.join(f"{count}{separator}{ext}" for ext, count in top)
+
+
+def render_structure(tree: RepoTree, token_budget: int = STRUCTURE_TOKEN_BUDGET,
+                     focus: Optional[str] = None) -> RenderedStructure:
+    """
+    Render a repository tree for an LLM prompt within a token budget.
+
+    Small trees are rendered verbatim. Larger ones first drop low-signal files
+    (images, fonts, lockfiles, ...) into per-directory counts, then expand
+    directories best-first -- shallow before deep, small before large -- and
+    leave the rest collapsed as one-line summaries such as
+    `tests/ (812 files: 790 .py)`. When `focus` names a module, its ancestors
+    are always expanded and its subtree is expanded before anything else.
+
+    Results are memoized on the tree, which is immutable per commit.
+    """
+    cache_key = (token_budget, focus)
+    cached = tree.render_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    full_text = tree.render()
+    if tree.error or len(full_text) <= token_budget * CHARS_PER_TOKEN:
+        result = RenderedStructure(full_text, estimate_tokens(full_text), len(tree), len(tree))
+    else:
+        focus_index = tree.find_module(focus) if focus else None
+        result = _StructureSummarizer(tree, token_budget * CHARS_PER_TOKEN, focus_index).render()
+
+    tree.render_cache[cache_key] = result
+    return result
+
+
+class _StructureSummarizer:
+    def __init__(self, tree: RepoTree, budget_chars: int, focus_index: Optional[int]):
+        self.tree = tree
+        self.budget = budget_chars
+        self.focus_index = focus_index
+        self.expanded = bytearray(len(tree.names))
+        # Maximum number of regular files listed in an over-full forced directory
+        self.file_caps = {}
+
+    # Line costs
+
+    def _indent(self, index: int) -> int:
+        return len(INDENT) * (self.tree.depths[index] - 1)
+
+    def _summary_suffix(self, index: int) -> str:
+        count = self.tree.file_count(index)
+        if not count:
+            return " (empty)"
+        noun = "file" if count == 1 else "files"
+        return f" ({count} {noun}: {_format_histogram(self.tree.extension_histogram(index))})"
+
+    def _line_cost(self, index: int, collapsed: bool) -> int:
+        cost = self._indent(index) + len(self.tree.names[index]) + 1
+        if self.tree.is_dir[index]:
+            cost += 1
+            if collapsed:
+                cost += len(self._summary_suffix(index))
+        return cost
+
+    def _omitted_line(self, depth: int, histogram, count: int) -> str:
+        return f"{INDENT * depth}... {count} low-signal files omitted ({_format_histogram(histogram, separator=' x ')})"
+
+    def _children_split(self, index: int):
+        dirs, files, low_signal = [], [], []
+        for child in self.tree.children(index):
+            if self.tree.is_dir[child]:
+                dirs.append(child)
+            elif is_low_signal(self.tree.names[child]):
+                low_signal.append(child)
+            else:
+                files.append(child)
+        return dirs, files, low_signal
+
+    def _histogram(self, indexes: List[int]) -> Counter:
+        return Counter(file_extension(self.tree.names[i]) or self.tree.names[i].lower() for i in indexes)
+
+    def _expand_cost(self, index: int) -> int:
+        dirs, files, low_signal = self._children_split(index)
+        cost = sum(self._line_cost(c, collapsed=True) for c in dirs)
+        cost += sum(self._line_cost(c, collapsed=False) for c in files)
+        if low_signal:
+            cost += len(self._omitted_line(self.tree.depths[index], self._histogram(low_signal), len(low_signal))) + 1
+        if index:
+            # The directory's own line loses its summary
+            cost -= len(self._summary_suffix(index))
+        return cost
+
+    # Planning
+
+    def _in_focus(self, index: int) -> bool:
+        focus = self.focus_index
+        return focus is not None and focus <= index < self.tree.subtree_end[focus]
+
+    def _plan(self):
+        tree = self.tree
+        forced = [0]
+        if self.focus_index is not None:
+            ancestor = self.focus_index
+            chain = []
+            while ancestor > 0:
+                chain.append(ancestor)
+                ancestor = tree.parents[ancestor]
+            forced += reversed(chain)
+
+        used = 0
+        frontier = []
+
+        def push_children(index):
+            for child in tree.children(index):
+                if tree.is_dir[child] and not self.expanded[child]:
+                    rank = 0 if self._in_focus(child) else 1
+                    heapq.heappush(frontier, (rank, tree.depths[child], self._expand_cost(child), child))
+
+        for index in forced:
+            cost = self._expand_cost(index)
+            remaining = self.budget - used
+            if cost > remaining:
+                self._cap_files(index, remaining)
+                cost = min(cost, max(remaining, 0))
+            self.expanded[index] = 1
+            used += cost
+
+        for index in forced:
+            push_children(index)
+
+        while frontier:
+            _, _, cost, index = heapq.heappop(frontier)
+            if self.expanded[index] or used + cost > self.budget:
+                continue
+            self.expanded[index] = 1
+            used += cost
+            push_children(index)
+
+    def _cap_files(self, index: int, remaining: int):
+        """List only as many files of a forced directory as the budget allows"""
+        dirs, files, _ = self._children_split(index)
+        remaining -= sum(self._line_cost(c, collapsed=True) for c in dirs) + 80
+        shown = 0
+        for child in files:
+            remaining -= self._line_cost(child, collapsed=False)
+            if remaining < 0:
+                break
+            shown += 1
+        self.file_caps[index] = shown
+
+    # Rendering
+
+    def render(self) -> RenderedStructure:
+        self._plan()
+        lines: List[str] = []
+        stats = {"shown": 0, "collapsed": 0, "low_signal": 0}
+        self._render_dir(0, lines, stats)
+
+        total = len(self.tree)
+        elided = total - stats["shown"]
+        lines.append(f"[Structure summarized to fit the prompt budget: {stats['shown']} of {total} entries listed, "
+                     f"{stats['collapsed']} directories collapsed, {stats['low_signal']} low-signal files omitted]")
+        text = '\n'.join(lines)
+        logger.debug("Summarized project structure: %d of %d entries elided, ~%d tokens", elided, total, estimate_tokens(text))
+        return RenderedStructure(
+            text=text,
+            estimated_tokens=estimate_tokens(text),
+            total_entries=total,
+            shown_entries=stats["shown"],
+            collapsed_dirs=stats["collapsed"],
+            omitted_low_signal=stats["low_signal"],
+        )
+
+    def _render_dir(self, index: int, lines: List[str], stats: dict):
+        tree = self.tree
+        depth = tree.depths[index]
+        dirs, files, low_signal = self._children_split(index)
+        cap = self.file_caps.get(index)
+        shown_files = set(files if cap is None else files[:cap])
+
+        for child in tree.children(index):
+            prefix = INDENT * (tree.depths[child] - 1)
+            if tree.is_dir[child]:
+                stats["shown"] += 1
+                if self.expanded[child]:
+                    lines.append(f"{prefix}{tree.names[child]}/")
+                    self._render_dir(child, lines, stats)
+                else:
+                    lines.append(f"{prefix}{tree.names[child]}/{self._summary_suffix(child)}")
+                    stats["collapsed"] += 1
+            elif child in shown_files:
+                stats["shown"] += 1
+                lines.append(f"{prefix}{tree.names[child]}")
+
+        if cap is not None and cap < len(files):
+            hidden = files[cap:]
+            histogram = self._histogram(hidden)
+            noun = "file" if len(hidden) == 1 else "files"
+            lines.append(f"{INDENT * depth}... {len(hidden)} more {noun} ({_format_histogram(histogram, separator=' x ')})")
+        if low_signal:
+            stats["low_signal"] += len(low_signal)
+            lines.append(self._omitted_line(depth, self._histogram(low_signal), len(low_signal)))
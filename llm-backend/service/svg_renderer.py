@@ -0,0 +1,139 @@
+import os
+import hashlib
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from service.concurrency import run_in_stage
+from service.singleflight import SingleFlight
+from service.metrics import timed
+
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", "20"))
+RENDER_CACHE_ENTRIES = int(os.getenv("RENDER_CACHE_ENTRIES", "256"))
+# Graphs with more nodes than this are laid out with the large-graph engine
+RENDER_LARGE_GRAPH_NODES = int(os.getenv("RENDER_LARGE_GRAPH_NODES", "60"))
+RENDER_ENGINE = os.getenv("RENDER_ENGINE", "dot")
+RENDER_LARGE_GRAPH_ENGINE = os.getenv("RENDER_LARGE_GRAPH_ENGINE", "sfdp")
+
+
+class RenderError(Exception):
+    """A graphviz layout failed or could not be started"""
+
+
+class RenderTimeout(RenderError):
+    """A graphviz layout ran longer than the render timeout"""
+
+
+def choose_engine(node_count: int) -> str:
+    """`dot` gives the clearest layered layout, but is superlinear on large graphs"""
+    return RENDER_LARGE_GRAPH_ENGINE if node_count > RENDER_LARGE_GRAPH_NODES else RENDER_ENGINE
+
+
+def _run_engine(engine: str, source: str, timeout: float) -> str:
+    """Lay out `source` with one graphviz process; the process is killed on timeout"""
+    try:
+        with timed("render"):
+            completed = subprocess.run(
+                [engine, "-Tsvg"],
+                input=source.encode("utf-8"),
+                capture_output=True,
+                timeout=timeout,
+            )
+    except subprocess.TimeoutExpired:
+        raise RenderTimeout(f"Graphviz {engine} layout timed out after {timeout:g}s")
+    except FileNotFoundError:
+        raise RenderError(f"Graphviz {engine} executable not found; make sure Graphviz is installed and on PATH")
+    if completed.returncode != 0:
+        detail = completed.stderr.decode("utf-8", errors="replace").strip()
+        raise RenderError(f"Graphviz {engine} exited with status {completed.returncode}: {detail}")
+    return completed.stdout.decode("utf-8")
+
+
+class SvgRenderer:
+    """
+    Renders DOT source to SVG through a bounded set of graphviz processes.
+
+    Results are cached by the hash of (engine, source), so an identical
+    diagram is laid out once. Concurrent renders of the same source share
+    one process, at most RENDER_CONCURRENCY processes run at a time, and each
+    is killed after `timeout` seconds so a pathological graph cannot hold a
+    worker indefinitely.
+    """
+
+    def __init__(self, timeout: float = RENDER_TIMEOUT_SECONDS, cache_entries: int = RENDER_CACHE_ENTRIES):
+        self.timeout = timeout
+        self.cache_entries = cache_entries
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+    @staticmethod
+    def key(engine: str, source: str) -> str:
+        return hashlib.sha256(f"{engine}\0{source}".encode("utf-8")).hexdigest()
+
+    def cached(self, engine: str, source: str) -> Optional[str]:
+        key = self.key(engine, source)
+        with self._lock:
+            svg = self._cache.get(key)
+            if svg is not None:
+                self._cache.move_to_end(key)
+            return svg
+
+    async def render(self, source: str, node_count: int = 0, engine: Optional[str] = None) -> str:
+        """
+        Render DOT `source` to an SVG string.
+
+        Args:
+            source: DOT source, e.g. `graphviz.Digraph().source`
+            node_count: Number of nodes, used to pick the layout engine
+            engine: Explicit layout engine, overriding the size-based choice
+
+        Returns:
+            The SVG document
+
+        Raises:
+            RenderError: If the layout fails or times out
+        """
+        engine = engine or choose_engine(node_count)
+        svg = self.cached(engine, source)
+        if svg is not None:
+            with self._lock:
+                self.hits += 1
+            return svg
+
+        with self._lock:
+            self.misses += 1
+        key = self.key(engine, source)
+        return await self._flights.do(key, lambda: self._render_and_store(key, engine, source))
+
+    async def _render_and_store(self, key: str, engine: str, source: str) -> str:
+        try:
+            svg = await run_in_stage("render", _run_engine, engine, source, self.timeout)
+        except RenderTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        with self._lock:
+            self._cache[key] = svg
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return svg
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "timeouts": self.timeouts,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+svg_renderer = SvgRenderer()
@@ -0,0 +1,236 @@
+import os
+import re
+import ast
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from service.import_graph import language_of, map_in_pool, BlobCache, IMPORT_GRAPH_MAX_FILES, IMPORT_GRAPH_MAX_FILE_BYTES
+from service.log import get_logger
+
+logger = get_logger(__name__)
+
+SYMBOL_INDEX_ENABLED = os.getenv("SYMBOL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+# "llm" gives the LLM the module's real symbols and falls back to the symbol
+# diagram; "symbols" always draws the symbol diagram without an LLM call
+MODULE_DIAGRAM_MODE = os.getenv("MODULE_DIAGRAM_MODE", "llm")
+# Bump when an extractor changes, so cached symbols from the old extractor are not reused
+EXTRACTOR_VERSION = "1"
+MAX_USES_PER_SYMBOL = 50
+
+_IDENTIFIER_CALL = re.compile(r'(?:\bnew\s+)?\b([A-Za-z_$][\w$]*)\s*[(<{]')
+_JS_DEFINITIONS = [
+    (re.compile(r'^(?:export\s+(?:default\s+)?)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)', re.MULTILINE), 'function'),
+    (re.compile(r'^(?:export\s+(?:default\s+)?)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)', re.MULTILINE), 'class'),
+    (re.compile(r'^(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>)', re.MULTILINE), 'function'),
+    (re.compile(r'^(?:export\s+)?(?:interface|type|enum)\s+([A-Za-z_$][\w$]*)', re.MULTILINE), 'type'),
+]
+_GO_DEFINITIONS = [
+    (re.compile(r'^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)', re.MULTILINE), 'function'),
+    (re.compile(r'^type\s+([A-Za-z_]\w*)\s+(?:struct|interface)\b', re.MULTILINE), 'type'),
+]
+_JAVA_DEFINITIONS = [
+    (re.compile(r'^\s*(?:(?:public|protected|private|abstract|final|static|sealed)\s+)*(?:class|interface|enum|record)\s+([A-Za-z_]\w*)', re.MULTILINE), 'class'),
+]
+
+
+def _symbol(name: str, kind: str, line: int, doc: str = "", uses=(), methods=()) -> dict:
+    return {"name": name, "kind": kind, "line": line, "doc": doc,
+            "uses": sorted(set(uses) - {name})[:MAX_USES_PER_SYMBOL], "methods": list(methods)}
+
+
+def _python_symbols(text: str) -> List[dict]:
+    try:
+        module = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+    symbols = []
+    for node in module.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind, methods = 'function', []
+        elif isinstance(node, ast.ClassDef):
+            kind = 'class'
+            methods = [child.name for child in node.body if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        else:
+            continue
+        uses = set()
+        for child in ast.walk(node):
+            if isinstance(child, ast.Call):
+                if isinstance(child.func, ast.Name):
+                    uses.add(child.func.id)
+                elif isinstance(child.func, ast.Attribute):
+                    uses.add(child.func.attr)
+            elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
+                uses.add(child.id)
+        doc = (ast.get_docstring(node) or "").strip().split("\n")[0][:120]
+        symbols.append(_symbol(node.name, kind, node.lineno, doc, uses, methods))
+    return symbols
+
+
+def _regex_symbols(text: str, definitions) -> List[dict]:
+    """Definitions found by pattern; each one's body runs to the next definition"""
+    found = sorted(
+        (match.start(), match.group(1), kind)
+        for pattern, kind in definitions
+        for match in pattern.finditer(text)
+    )
+    symbols = []
+    for position, (start, name, kind) in enumerate(found):
+        end = found[position + 1][0] if position + 1 < len(found) else len(text)
+        body = text[start:end]
+        uses = set(_IDENTIFIER_CALL.findall(body))
+        symbols.append(_symbol(name, kind, text.count("\n", 0, start) + 1, "", uses))
+    return symbols
+
+
+def extract_symbols(language: str, text: str) -> List[dict]:
+    """
+    Top-level classes, functions and types of one source file.
+
+    Each symbol lists the names it calls or references (`uses`); the index
+    later keeps only those that are symbols of the same module.
+    """
+    if language == 'python':
+        return _python_symbols(text)
+    if language == 'js':
+        return _regex_symbols(text, _JS_DEFINITIONS)
+    if language == 'go':
+        return _regex_symbols(text, _GO_DEFINITIONS)
+    if language == 'java':
+        return _regex_symbols(text, _JAVA_DEFINITIONS)
+    return []
+
+
+def _extract_batch(batch: List[Tuple[str, bytes]]) -> List[List[dict]]:
+    """Process-pool entry point: extract symbols of (language, raw bytes) pairs"""
+    return [extract_symbols(language, data.decode('utf-8', errors='replace')) for language, data in batch]
+
+
+# Extracted symbols by blob hash
+symbol_cache = BlobCache(EXTRACTOR_VERSION)
+
+
+class SymbolIndex:
+    """
+    Symbols of one commit by file path, queryable by module path.
+
+    Usage edges are resolved per query: a symbol depends on another if it
+    uses its name and both live under the queried module.
+    """
+
+    def __init__(self, files: Dict[str, List[dict]]):
+        self.files = files
+
+    def symbols_under(self, module_path: str) -> List[Tuple[str, dict]]:
+        prefix = module_path.strip('/')
+        return [
+            (path, symbol)
+            for path, symbols in sorted(self.files.items())
+            if not prefix or path == prefix or path.startswith(prefix + '/')
+            for symbol in symbols
+        ]
+
+    def module_components(self, module_path: str, limit: int = 12) -> List[Dict]:
+        """
+        The module's most connected symbols, as diagram components.
+
+        Returns the same shape as the LLM component analysis: name,
+        description, dependencies and dependency_details.
+        """
+        entries = self.symbols_under(module_path)
+        if not entries:
+            return []
+        prefix = module_path.strip('/')
+        by_name = defaultdict(list)
+        for path, symbol in entries:
+            by_name[symbol["name"]].append(path)
+
+        def label(path: str, symbol: dict) -> str:
+            # Qualify names defined in more than one file
+            if len(by_name[symbol["name"]]) > 1:
+                return f"{os.path.basename(path)}:{symbol['name']}"
+            return symbol["name"]
+
+        edges = defaultdict(set)
+        degree = defaultdict(int)
+        for path, symbol in entries:
+            source = label(path, symbol)
+            for used in symbol["uses"]:
+                for target_path in by_name.get(used, ()):
+                    target = label(target_path, {"name": used})
+                    if target != source and target not in edges[source]:
+                        edges[source].add(target)
+                        degree[source] += 1
+                        degree[target] += 1
+
+        ranked = sorted(entries, key=lambda entry: (-degree[label(*entry)], entry[1]["kind"] != 'class', entry[0], entry[1]["line"]))
+        kept = {label(*entry): entry for entry in ranked[:limit]}
+        components = []
+        for name, (path, symbol) in kept.items():
+            relative = path[len(prefix):].lstrip('/') if prefix else path
+            description = symbol["doc"] or f"{symbol['kind']} in {relative}"
+            components.append({
+                "name": name,
+                "description": description,
+                "dependencies": sorted(target for target in edges[name] if target in kept),
+                "dependency_details": {},
+            })
+        return components
+
+    def describe(self, module_path: str, limit: int = 80) -> str:
+        """Symbols of a module as prompt text, one per line"""
+        lines = []
+        for path, symbol in self.symbols_under(module_path)[:limit]:
+            line = f"{path}:{symbol['line']} {symbol['kind']} {symbol['name']}"
+            if symbol["methods"]:
+                line += f" (methods: {', '.join(symbol['methods'][:8])})"
+            if symbol["doc"]:
+                line += f" - {symbol['doc']}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {"files": self.files}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SymbolIndex":
+        return cls(data["files"])
+
+
+def build_symbol_index(files: List[Tuple[str, str]], read_blobs) -> SymbolIndex:
+    """
+    Build the symbol index of one commit.
+
+    Args:
+        files: (path, blob sha) of every source file to index
+        read_blobs: Callable taking blob shas and returning {sha: bytes}; only
+            called for blobs whose symbols are not cached
+
+    Returns:
+        SymbolIndex over all indexed files
+    """
+    started = time.perf_counter()
+    files = [(path, sha, language_of(path)) for path, sha in files if language_of(path)][:IMPORT_GRAPH_MAX_FILES]
+
+    symbols_by_path = {}
+    missing = []
+    for path, sha, language in files:
+        cached = symbol_cache.get(sha, language)
+        if cached is None:
+            missing.append((path, sha, language))
+        else:
+            symbols_by_path[path] = cached
+
+    if missing:
+        blobs = read_blobs(sorted({sha for _, sha, _ in missing}))
+        extractable = [(path, sha, language) for path, sha, language in missing
+                       if sha in blobs and len(blobs[sha]) <= IMPORT_GRAPH_MAX_FILE_BYTES]
+        extracted = map_in_pool(_extract_batch, [(language, blobs[sha]) for _, sha, language in extractable])
+        for (path, sha, language), symbols in zip(extractable, extracted):
+            symbol_cache.put(sha, language, symbols)
+            symbols_by_path[path] = symbols
+
+    index = SymbolIndex({path: symbols for path, symbols in symbols_by_path.items() if symbols})
+    logger.info("Symbol index: %d symbols in %d files in %.2fs",
+                sum(len(s) for s in index.files.values()), len(index.files), time.perf_counter() - started)
+    return index
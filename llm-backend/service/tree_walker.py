@@ -0,0 +1,217 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+# Directories/files to ignore, in .gitignore syntax
+DEFAULT_IGNORE_RULES = [
+    '.git', '__pycache__', 'node_modules', '.vscode', '.idea',
+    '.DS_Store', '.env', 'venv', 'env', '.pytest_cache'
+]
+
+# Extra rules from the environment, comma-separated, also in .gitignore syntax
+EXTRA_IGNORE_RULES = [rule.strip() for rule in os.getenv("STRUCTURE_IGNORE", "").split(",") if rule.strip()]
+# Honor the repository's own .gitignore files (off by default: a clone only
+# contains tracked files, and tracked files matching .gitignore were committed on purpose)
+RESPECT_GITIGNORE = os.getenv("STRUCTURE_RESPECT_GITIGNORE", "false").lower() in ("1", "true", "yes")
+# Maximum number of entries emitted before the listing is cut off
+MAX_STRUCTURE_ENTRIES = int(os.getenv("STRUCTURE_MAX_ENTRIES", "20000"))
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a .gitignore glob into a regular expression body"""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+@dataclass
+class IgnoreRule:
+    regex: "re.Pattern"
+    negated: bool
+    dir_only: bool
+    anchored: bool
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["IgnoreRule"]:
+        line = line.rstrip('\n')
+        if not line.strip() or line.startswith('#'):
+            return None
+        if not line.endswith('\\ '):
+            line = line.rstrip()
+
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\!') or line.startswith('\\#'):
+            line = line[1:]
+
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+
+        # A slash anywhere but the end anchors the pattern to the .gitignore's directory
+        anchored = '/' in line
+        line = line.lstrip('/')
+        return cls(re.compile(f'^{_translate_glob(line)}$'), negated, dir_only, anchored)
+
+    def matches(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        return bool(self.regex.match(rel_path if self.anchored else name))
+
+
+class IgnoreRules:
+    """
+    An ordered list of .gitignore-style rules scoped to one directory.
+
+    Like git, the last matching rule wins, and a `!` rule re-includes a path
+    an earlier rule excluded.
+    """
+
+    def __init__(self, lines: List[str], base: Tuple[str, ...] = ()):
+        self.base = base
+        self.rules = [rule for rule in (IgnoreRule.parse(line) for line in lines) if rule]
+
+    def match(self, parts: Tuple[str, ...], is_dir: bool) -> Optional[bool]:
+        """Return True/False if a rule decides the path, None if no rule matches"""
+        rel_path = '/'.join(parts[len(self.base):])
+        decision = None
+        for rule in self.rules:
+            if rule.matches(rel_path, parts[-1], is_dir):
+                decision = not rule.negated
+        return decision
+
+
+def default_ignore_rules() -> IgnoreRules:
+    return IgnoreRules(DEFAULT_IGNORE_RULES + EXTRA_IGNORE_RULES)
+
+
+class FileSystemSource:
+    """Directory listings from a checked-out working tree"""
+
+    def __init__(self, root_path: str):
+        self.root = root_path
+
+    def children(self, handle) -> List[Tuple[str, bool, object]]:
+        with os.scandir(handle) as entries:
+            return [(entry.name, entry.is_dir(follow_symlinks=False), entry.path) for entry in entries]
+
+    def read_text(self, handle) -> str:
+        with open(handle, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+
+
+class GitTreeSource:
+    """
+    Directory listings from git tree objects.
+
+    Only tree objects are read, so this works on a blobless clone without
+    fetching file contents (except .gitignore files when those are honored).
+    """
+
+    def __init__(self, tree):
+        self.root = tree
+
+    def children(self, handle) -> List[Tuple[str, bool, object]]:
+        if getattr(handle, 'type', None) != 'tree':
+            # Submodules show up as empty directories, like in a checkout
+            return []
+        return [(item.name, item.type != 'blob', item) for item in handle]
+
+    def read_text(self, handle) -> str:
+        return handle.data_stream.read().decode('utf-8', errors='replace')
+
+
+@dataclass
+class WalkEntry:
+    parts: Tuple[str, ...]
+    is_dir: bool
+
+
+class TreeWalker:
+    """
+    Depth-first walk of a repository in sorted order.
+
+    Ignored directories are pruned before they are listed, entries are
+    streamed one directory at a time instead of collected up front, and the
+    walk stops after `max_entries` entries, setting `truncated`.
+    """
+
+    def __init__(self, source, rules: Optional[IgnoreRules] = None,
+                 respect_gitignore: bool = RESPECT_GITIGNORE, max_entries: int = MAX_STRUCTURE_ENTRIES):
+        self.source = source
+        self.rules = rules if rules is not None else default_ignore_rules()
+        self.respect_gitignore = respect_gitignore
+        self.max_entries = max_entries
+        self.truncated = False
+        self.emitted = 0
+
+    def _is_ignored(self, parts: Tuple[str, ...], is_dir: bool, scoped_rules: List[IgnoreRules]) -> bool:
+        ignored = False
+        # Deeper .gitignore files take precedence over shallower ones and the defaults
+        for rules in [self.rules] + scoped_rules:
+            decision = rules.match(parts, is_dir)
+            if decision is not None:
+                ignored = decision
+        return ignored
+
+    def walk(self) -> Iterator[WalkEntry]:
+        self.truncated = False
+        self.emitted = 0
+        yield from self._walk_dir(self.source.root, (), [])
+
+    def _walk_dir(self, handle, parent_parts: Tuple[str, ...], scoped_rules: List[IgnoreRules]) -> Iterator[WalkEntry]:
+        children = sorted(self.source.children(handle), key=lambda child: child[0])
+
+        if self.respect_gitignore:
+            for name, is_dir, child_handle in children:
+                if name == '.gitignore' and not is_dir:
+                    lines = self.source.read_text(child_handle).splitlines()
+                    scoped_rules = scoped_rules + [IgnoreRules(lines, parent_parts)]
+                    break
+
+        for name, is_dir, child_handle in children:
+            parts = parent_parts + (name,)
+            if self._is_ignored(parts, is_dir, scoped_rules):
+                continue
+            if self.emitted >= self.max_entries:
+                self.truncated = True
+                return
+            self.emitted += 1
+            yield WalkEntry(parts, is_dir)
+            if is_dir:
+                yield from self._walk_dir(child_handle, parts, scoped_rules)
+                if self.truncated:
+                    return
@@ -0,0 +1,59 @@
+"""Test the analysis cache's disk level: persistence, expiry and trimming to the low-water mark"""
+import os
+import time
+import asyncio
+from service.analysis_cache import AnalysisCache, ANALYSIS_CACHE_TRIM_FRACTION
+
+def entry_size(cache: AnalysisCache) -> int:
+    return cache.stats()["disk_bytes"]
+
+def test_disk_level_survives_a_restart(tmp_path):
+    cache = AnalysisCache(root=str(tmp_path), memory_entries=1)
+    cache.put("a" * 64, [{"name": "api"}])
+    cache.put("b" * 64, [{"name": "core"}])
+    # "a" fell out of memory and is read back from disk
+    assert cache.get("a" * 64) == [{"name": "api"}]
+    assert cache.stats()["disk_hits"] == 1
+
+    restarted = AnalysisCache(root=str(tmp_path))
+    assert restarted.stats()["disk_bytes"] == cache.stats()["disk_bytes"] > 0
+    assert restarted.get("b" * 64) == [{"name": "core"}]
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = AnalysisCache(root=str(tmp_path), ttl_seconds=0.05, memory_entries=0)
+    cache.put("c" * 64, "value")
+    time.sleep(0.1)
+    assert cache.get("c" * 64) is None
+    assert cache.stats()["disk_bytes"] == 0
+
+def test_trim_to_low_water_mark_least_recently_used_first(tmp_path):
+    probe = AnalysisCache(root=str(tmp_path / "probe"))
+    probe.put("0" * 64, "x" * 100)
+    size = entry_size(probe)
+
+    # Room for ten entries; their sizes differ by a few bytes
+    budget = 10 * size + size // 2
+    cache = AnalysisCache(root=str(tmp_path / "cache"), memory_entries=0, max_bytes=budget)
+    keys = [f"{i:064x}" for i in range(10)]
+    now = time.time()
+    for age, key in enumerate(keys):
+        cache.put(key, "x" * 100)
+        # Distinct modification times, oldest first
+        os.utime(cache._path(key), (now - 100 + age, now - 100 + age))
+    assert all(os.path.exists(cache._path(key)) for key in keys)
+
+    cache.put("f" * 64, "x" * 100)
+    # Over budget: the oldest entries go until the cache is below the low-water mark
+    assert entry_size(cache) <= budget * ANALYSIS_CACHE_TRIM_FRACTION
+    assert cache.get(keys[0]) is None and cache.get(keys[1]) is None
+    assert cache.get(keys[-1]) == "x" * 100 and cache.get("f" * 64) == "x" * 100
+
+def test_async_access_from_coroutines(tmp_path):
+    cache = AnalysisCache(root=str(tmp_path), memory_entries=0)
+
+    async def round_trip():
+        await cache.aput("d" * 64, {"text": "overview"})
+        return await cache.aget("d" * 64), await cache.aget("e" * 64)
+
+    assert asyncio.run(round_trip()) == ({"text": "overview"}, None)
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["misses"] == 1
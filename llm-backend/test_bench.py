@@ -0,0 +1,47 @@
+"""Test the synthetic repositories and fake LLM client of the offline benchmarks"""
+import json
+import random
+import asyncio
+import subprocess
+from bench.synthetic_repo import RepoShape, ensure_repo, parse_shape
+from bench.fake_llm import FakeAnthropic
+from bench.load import LoadRepo, VirtualUser, lag_between, parse_mix
+
+def test_synthetic_repo_is_deterministic(tmp_path):
+    shape = parse_shape("tiny:files=60,depth=3,fanout=2,vendored=0.5")
+    assert shape == RepoShape("tiny", 60, depth=3, fanout=2, vendored=0.5)
+    heads = []
+    for root in (tmp_path / "a", tmp_path / "b"):
+        path = ensure_repo(shape, str(root))
+        files = subprocess.run(["git", "ls-tree", "-r", "--name-only", "HEAD"], cwd=path,
+                               capture_output=True, text=True, check=True).stdout.split()
+        assert len(files) == 61 and "README.md" in files
+        assert any(name.startswith(("node_modules/", "vendor/", "third_party/")) for name in files)
+        heads.append(subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True).stdout)
+    assert heads[0] == heads[1]
+
+def test_fake_llm_answers_component_prompts():
+    client = FakeAnthropic(latency=0)
+    request = {
+        "model": "m",
+        "system": "The output must be valid JSON in this format:",
+        "messages": [{"role": "user", "content": "Project structure:\n```\napi/\n    routes.py\ncore/\nREADME.md\n```"}],
+    }
+    response = asyncio.run(client.messages.create(**request))
+    components = json.loads(response.content[0].text.strip("`\njson"))
+    assert [c["name"] for c in components] == ["api", "core"]
+    assert components[0]["dependencies"] == ["core"]
+    assert response.usage.output_tokens > 0 and client.calls == 1
+
+def test_virtual_user_keeps_its_session():
+    user = VirtualUser([LoadRepo("file:///r", ["api", "core"], ["api/a.py"])], parse_mix("followup=1"), random.Random(0))
+    kind, path, body = user.next_request()
+    assert (kind, path) == ("initial", "/analyze")
+    user.answered(kind, body, 200, b'{"session_id": "s1", "text": "overview"}')
+    kind, _, body = user.next_request()
+    assert kind == "followup" and body["session_id"] == "s1" and len(body["history"]) == 1
+    before = {"buckets": {"0.05": 10, "+Inf": 10}, "codearch_event_loop_lag_seconds_count": 10}
+    after = {"buckets": {"0.05": 110, "0.25": 200, "+Inf": 200}, "codearch_event_loop_lag_seconds_count": 200,
+             "codearch_event_loop_stalls_total": 0}
+    lag = lag_between(before, after, blocked_seconds=0.1)
+    assert lag["probes"] == 190 and lag["p99_at_most"] == "0.25" and lag["blocked"]
@@ -0,0 +1,44 @@
+"""Test clone cache sizing: adopted clones measured in the background, blobless growth from packs only"""
+import os
+from service.clone_cache import CloneCache, CachedClone
+
+def fake_clone(root, repo_dir: str, commit_sha: str, pack_bytes: int, other_bytes: int) -> str:
+    path = os.path.join(root, repo_dir, commit_sha)
+    os.makedirs(os.path.join(path, ".git", "objects", "pack"))
+    with open(os.path.join(path, ".git", "llm-code-arch-url"), "w") as f:
+        f.write(f"https://github.com/o/{repo_dir}")
+    with open(os.path.join(path, ".git", "llm-code-arch-mode"), "w") as f:
+        f.write("blobless")
+    with open(os.path.join(path, ".git", "objects", "pack", "pack-1.pack"), "wb") as f:
+        f.write(b"p" * pack_bytes)
+    with open(os.path.join(path, ".git", "index"), "wb") as f:
+        f.write(b"i" * other_bytes)
+    return path
+
+def test_adopted_clones_measured_on_cleanup_thread(tmp_path):
+    fake_clone(tmp_path, "old", "a" * 40, pack_bytes=4000, other_bytes=1000)
+    fake_clone(tmp_path, "new", "b" * 40, pack_bytes=4000, other_bytes=1000)
+    os.utime(os.path.join(tmp_path, "old", "a" * 40), (1, 1))
+    cache = CloneCache(root=str(tmp_path), max_bytes=8000, mode="blobless")
+    cache._cleanup_queue.join()
+    # Both sizes are known once measured; the older clone went over budget
+    assert cache.stats()["clones"] == 1
+    assert cache.stats()["total_bytes"] > 5000
+    (entry,) = cache._entries.values()
+    assert entry.commit_sha == "b" * 40
+    assert entry.pack_bytes == 4000
+
+def test_blobless_release_counts_new_packs(tmp_path):
+    cache = CloneCache(root=str(tmp_path), mode="blobless")
+    path = fake_clone(tmp_path / "clones", "repo", "c" * 40, pack_bytes=100, other_bytes=50)
+    entry = CachedClone("https://github.com/o/repo", "c" * 40, path, mode="blobless", size_bytes=150, pack_bytes=100)
+    cache._entries[(entry.github_link, entry.commit_sha)] = entry
+    cache._total_bytes = 150
+    cache._get_or_clone = lambda github_link: entry
+    entry.pins = 1
+
+    with cache.acquire(entry.github_link):
+        with open(os.path.join(path, ".git", "objects", "pack", "pack-2.pack"), "wb") as f:
+            f.write(b"p" * 30)
+    assert (entry.size_bytes, entry.pack_bytes, entry.pins) == (180, 130, 0)
+    assert cache.stats()["total_bytes"] == 180
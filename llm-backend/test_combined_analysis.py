@@ -0,0 +1,53 @@
+"""Test the single-call overview: schema validation, consistent components and caching"""
+import asyncio
+from types import SimpleNamespace
+from service.repo_tree import RepoTree
+from service.llm_gateway import llm_gateway
+from service.analysis_cache import AnalysisCache
+import service.graph_builder
+from service.graph_builder import analyze_overview_with_llm, OVERVIEW_TOOL
+
+STRUCTURE = """api/
+    routes.py
+core/
+    models.py
+README.md"""
+
+class ToolClient:
+    def __init__(self, tool_input):
+        self.tool_input = tool_input
+        self.requests = []
+        self.messages = self
+
+    async def create(self, **request):
+        self.requests.append(request)
+        block = SimpleNamespace(type="tool_use", id="toolu_1", name=OVERVIEW_TOOL, input=self.tool_input)
+        return SimpleNamespace(content=[block], usage=SimpleNamespace(input_tokens=10, output_tokens=10))
+
+def test_combined_overview(tmp_path, monkeypatch):
+    tree = RepoTree.from_structure(STRUCTURE)
+    client = ToolClient({"narrative": "An API over a core.", "components": [
+        {"name": "api", "description": "HTTP routes", "dependencies": ["core", "db", "api"],
+         "dependency_details": {"core": "calls", "db": "queries"}},
+        {"name": "core", "description": "Domain models"},
+        {"name": "core", "description": "Duplicate"},
+    ]})
+    monkeypatch.setattr(llm_gateway, "client", client)
+    cache = AnalysisCache(root=str(tmp_path))
+    monkeypatch.setattr(service.graph_builder, "analysis_cache", cache)
+    text, components = asyncio.run(analyze_overview_with_llm("https://github.com/o/combined", tree))
+    assert text == "An API over a core."
+    # Dependencies outside the answer's own components are dropped
+    assert components == [
+        {"name": "api", "description": "HTTP routes", "dependencies": ["core"], "dependency_details": {"core": "calls"}},
+        {"name": "core", "description": "Domain models", "dependencies": [], "dependency_details": {}},
+    ]
+    request = client.requests[0]
+    assert request["tool_choice"] == {"type": "tool", "name": OVERVIEW_TOOL} and "api/" in request["system"]
+    # The same structure is answered from the cache
+    assert asyncio.run(analyze_overview_with_llm("https://github.com/o/combined", tree)) == (text, components)
+    assert len(client.requests) == 1
+
+    cache.clear()
+    client.tool_input = {"narrative": "Only text", "components": [{"name": "api"}]}
+    assert asyncio.run(analyze_overview_with_llm("https://github.com/o/combined", tree)) == ("Only text", None)
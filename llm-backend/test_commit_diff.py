@@ -0,0 +1,14 @@
+"""Test commit manifests, module fingerprints and diffs"""
+from service.commit_diff import CommitManifest, diff_manifests
+
+def test_diff_and_fingerprints():
+    old = CommitManifest({"app/api/routes.py": "a1", "app/core/engine.py": "b1", "web/index.js": "c1"})
+    new = CommitManifest({"app/api/routes.py": "a1", "app/core/engine.py": "b2", "app/core/util.py": "d1"})
+    diff = diff_manifests(old, new)
+    assert (diff.added, diff.removed, diff.changed) == (["app/core/util.py"], ["web/index.js"], ["app/core/engine.py"])
+    assert diff.directories_removed == ["web"] and diff.layout_changed
+    assert diff.touched_modules(["app/api", "app/core", "web"]) == ["app/core", "web"]
+    # Untouched modules keep their fingerprint across commits
+    assert old.fingerprint("app/api") == new.fingerprint("app/api")
+    assert old.fingerprint("app/core") != new.fingerprint("app/core")
+    assert not diff_manifests(new, CommitManifest(dict(new.files))).paths
@@ -0,0 +1,93 @@
+"""Test the overview diagram's fallbacks when the LLM returns no components, and overview reuse across commits"""
+import asyncio
+from types import SimpleNamespace
+import service.graph_builder as graph_builder
+from service.analysis_cache import AnalysisCache
+from service.commit_diff import CommitManifest
+from service.llm_gateway import llm_gateway
+from service.import_graph import ImportGraph
+from service.repo_tree import RepoTree
+
+STRUCTURE = """api/
+    routes.py
+core/
+    models.py
+README.md"""
+
+def no_llm_components(monkeypatch, import_graph, rendered_svg):
+    async def analyze_project_with_llm(*args):
+        # What the caller sees when the breaker is open or the JSON did not parse
+        return []
+
+    rendered = {}
+
+    async def render(source, node_count):
+        rendered.update(source=source, node_count=node_count)
+        return rendered_svg
+
+    monkeypatch.setattr(graph_builder, "analyze_project_with_llm", analyze_project_with_llm)
+    monkeypatch.setattr(graph_builder, "get_import_graph", lambda tree: import_graph)
+    monkeypatch.setattr(graph_builder.svg_renderer, "render", render)
+    return rendered
+
+def generate():
+    return asyncio.run(graph_builder.generate_architecture_svg("https://github.com/o/repo", RepoTree.from_structure(STRUCTURE)))
+
+def test_falls_back_to_import_graph(monkeypatch):
+    graph = ImportGraph(components={"api": 1, "core": 1}, edges={("api", "core"): 3})
+    rendered = no_llm_components(monkeypatch, graph, "<svg>import graph</svg>")
+    assert generate() == "<svg>import graph</svg>"
+    assert rendered["node_count"] == 2 and "api -> core" in rendered["source"]
+
+def test_falls_back_to_structure(monkeypatch):
+    rendered = no_llm_components(monkeypatch, ImportGraph(), "<svg>structure</svg>")
+    assert generate() == "<svg>structure</svg>"
+    assert rendered["node_count"] >= 2
+
+def test_invalid_render_gives_default_svg(monkeypatch):
+    graph = ImportGraph(components={"api": 1, "core": 1}, edges={("api", "core"): 3})
+    no_llm_components(monkeypatch, graph, "not an svg")
+    svg = generate()
+    assert svg.startswith("<?xml") and "No major components identified" in svg
+
+class TextClient:
+    def __init__(self, text):
+        self.text = text
+        self.requests = []
+        self.messages = self
+
+    async def create(self, **request):
+        self.requests.append(request)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.text)],
+                               usage=SimpleNamespace(input_tokens=10, output_tokens=10))
+
+def previous_overview(monkeypatch, tmp_path, client):
+    cache = AnalysisCache(root=str(tmp_path))
+    monkeypatch.setattr(graph_builder, "analysis_cache", cache)
+    monkeypatch.setattr(llm_gateway, "client", client)
+    old = CommitManifest({"api/routes.py": "a1", "core/models.py": "b1"})
+    monkeypatch.setattr(graph_builder, "load_commit_manifest", lambda sha: old)
+    previous = RepoTree.from_structure(STRUCTURE)
+    previous.commit_sha = "1" * 40
+    components = [{"name": "api", "description": "HTTP routes", "dependencies": ["core"]},
+                  {"name": "core", "description": "Domain models", "dependencies": []}]
+    asyncio.run(graph_builder.remember_overview("https://github.com/o/repo", previous, None, components))
+    tree = RepoTree.from_structure(STRUCTURE)
+    tree.commit_sha = "2" * 40
+    return tree
+
+def test_changed_components_are_described_again(monkeypatch, tmp_path):
+    client = TextClient('{"core": "Domain models and billing rules"}')
+    tree = previous_overview(monkeypatch, tmp_path, client)
+    manifest = CommitManifest({"api/routes.py": "a1", "core/models.py": "b2"})
+    components = asyncio.run(graph_builder.reusable_overview("https://github.com/o/repo", tree, manifest, None))
+    assert [component["description"] for component in components] == ["HTTP routes", "Domain models and billing rules"]
+    assert components[0]["dependencies"] == ["core"]
+    # Only the changed component is sent
+    prompt = client.requests[0]["messages"][0]["content"]
+    assert "Component: core" in prompt and "Component: api" not in prompt
+
+def test_failed_refresh_analyzes_again(monkeypatch, tmp_path):
+    tree = previous_overview(monkeypatch, tmp_path, TextClient("not json"))
+    manifest = CommitManifest({"api/routes.py": "a1", "core/models.py": "b2"})
+    assert asyncio.run(graph_builder.reusable_overview("https://github.com/o/repo", tree, manifest, None)) is None
@@ -0,0 +1,67 @@
+"""Test conversation compaction: verbatim tail within budget, incremental folding, rewritten histories"""
+import asyncio
+from schema import Message
+from service.history_manager import HistoryState, compact_history, message_tokens
+
+def conversation(turns: int, size: int = 200):
+    return [Message(role="user" if i % 2 == 0 else "assistant", content=f"{i}:" + "x" * size) for i in range(turns)]
+
+class Summarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, previous: str, messages):
+        self.calls.append((previous, [msg.content.split(":")[0] for msg in messages]))
+        return f"{previous}+{len(messages)}"
+
+def compact(history, state, summarize, budget):
+    return asyncio.run(compact_history(history, state, summarize, budget=budget))
+
+def test_short_history_is_sent_verbatim():
+    summarize = Summarizer()
+    history = conversation(4)
+    kept, summary = compact(history, HistoryState(), summarize, budget=10_000)
+    assert kept == history and summary == ""
+    assert summarize.calls == []
+
+def test_long_history_folds_into_summary():
+    summarize = Summarizer()
+    history = conversation(20)
+    budget = 6 * message_tokens(history[0])
+    state = HistoryState()
+    kept, summary = compact(history, state, summarize, budget=budget)
+    assert len(summarize.calls) == 1
+    assert sum(message_tokens(msg) for msg in kept) <= budget
+    assert kept[0].role == "user" and kept[-1] == history[-1]
+    assert state.covered == len(history) - len(kept)
+    assert summary == state.summary == f"+{state.covered}"
+
+def test_folding_is_incremental():
+    summarize = Summarizer()
+    history = conversation(20)
+    budget = 6 * message_tokens(history[0])
+    state = HistoryState()
+    compact(history, state, summarize, budget=budget)
+    covered = state.covered
+
+    # A couple more turns fit in the slack left by the last fold
+    compact(history + conversation(2), state, summarize, budget=budget)
+    assert len(summarize.calls) == 1
+
+    longer = history + conversation(10)
+    compact(longer, state, summarize, budget=budget)
+    previous, folded = summarize.calls[-1]
+    assert previous == f"+{covered}"
+    # Only turns that left the verbatim window since the last fold are sent
+    assert folded == [msg.content.split(":")[0] for msg in longer[covered:state.covered]]
+
+def test_rewritten_history_starts_over():
+    summarize = Summarizer()
+    history = conversation(20)
+    budget = 6 * message_tokens(history[0])
+    state = HistoryState()
+    compact(history, state, summarize, budget=budget)
+
+    rewritten = [Message(role="user", content="different")] + history[1:]
+    compact(rewritten, state, summarize, budget=budget)
+    assert summarize.calls[-1][0] == ""
@@ -0,0 +1,41 @@
+"""Test static import extraction and the directory dependency graph"""
+from service.import_graph import parse_imports, build_import_graph
+
+SOURCES = {
+    "app/api/routes.py": "from app.core import engine\nfrom ..db.models import User\nimport os\n",
+    "app/core/engine.py": "def run():\n    from . import helpers\n",
+    "app/core/helpers.py": "",
+    "app/db/models.py": "import sqlalchemy\n",
+    "web/src/components/Button.tsx": "import React from 'react';\nimport { fmt } from '../lib/format';\n",
+    "web/src/lib/format.ts": "export const fmt = 1;\n",
+    "svc/cmd/main.go": 'package main\nimport (\n  "fmt"\n  "example.com/svc/pkg/store"\n)\n',
+    "svc/pkg/store/store.go": "package store\n",
+    "jv/com/x/main/M.java": "package com.x.main;\nimport com.x.util.U;\nimport java.util.List;\n",
+    "jv/com/x/util/U.java": "package com.x.util;\npublic class U {}\n",
+}
+
+def test_parse_imports():
+    assert parse_imports("python", SOURCES["app/api/routes.py"]) == ["app.core.engine", "..db.models.User", "os"]
+    assert parse_imports("python", SOURCES["app/core/engine.py"]) == [".helpers"]
+    assert parse_imports("js", "const a = require('./a');\nexport * from \"../b\";\nimport('c')") == ["./a", "../b", "c"]
+    assert parse_imports("go", SOURCES["svc/cmd/main.go"]) == ["fmt", "example.com/svc/pkg/store"]
+    assert parse_imports("java", SOURCES["jv/com/x/main/M.java"]) == ["package:com.x.main", "com.x.util.U", "java.util.List"]
+
+def test_directory_graph():
+    files = [(path, f"sha-{path}") for path in SOURCES]
+    blobs = {f"sha-{path}": text.encode() for path, text in SOURCES.items()}
+    graph = build_import_graph(files, lambda shas: {sha: blobs[sha] for sha in shas})
+    assert set(graph.edges) == {
+        ("app/api", "app/core"),
+        ("app/api", "app/db"),
+        ("web/src/components", "web/src/lib"),
+        ("svc/cmd", "svc/pkg/store"),
+        ("jv/com/x/main", "jv/com/x/util"),
+    }
+    assert graph.components["app/core"] == 2
+    # Third-party and standard library imports stay unresolved
+    assert graph.imports_unresolved == 5
+
+    # Parsed imports are cached by blob hash, so nothing is read again
+    again = build_import_graph(files, lambda shas: {} if not shas else 1 / 0)
+    assert again.edges == graph.edges
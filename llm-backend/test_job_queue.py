@@ -0,0 +1,111 @@
+"""Test the job queue: deduplication, backpressure, cancellation and deadlines"""
+import asyncio
+import pytest
+from service.job_queue import JobQueue, QueueFull
+
+async def settle(*jobs):
+    while not all(job.finished for job in jobs):
+        await asyncio.sleep(0.01)
+
+def test_job_runs_and_reports_events():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=4)
+
+        async def run(emit):
+            emit("stage", {"stage": "cloned"})
+            return {"text": "done"}
+
+        job = queue.submit(run)
+        await settle(job)
+        return queue, job
+
+    queue, job = asyncio.run(scenario())
+    assert job.to_dict()["status"] == "succeeded"
+    assert job.to_dict()["result"] == {"text": "done"}
+    assert [event for event, _ in job.events] == ["status", "status", "stage", "status"]
+    assert queue.stats()["completed"] == 1
+
+def test_identical_jobs_are_deduplicated():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=4)
+
+        async def run(emit):
+            await asyncio.sleep(0.02)
+
+        first = queue.submit(run, key="same")
+        second = queue.submit(run, key="same")
+        await settle(first)
+        third = queue.submit(run, key="same")
+        queue.cancel(third.job_id)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first is second
+    # A finished job no longer absorbs new submissions
+    assert third is not first
+
+def test_full_queue_rejects_with_retry_hint():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=2)
+        release = asyncio.Event()
+
+        async def run(emit):
+            await release.wait()
+
+        jobs = [queue.submit(run)]
+        await asyncio.sleep(0.01)  # the worker takes the first job off the queue
+        jobs += [queue.submit(run), queue.submit(run)]
+        with pytest.raises(QueueFull) as rejected:
+            queue.submit(run)
+        release.set()
+        await settle(*jobs)
+        return queue, rejected.value
+
+    queue, rejected = asyncio.run(scenario())
+    assert rejected.retry_after >= 1
+    assert queue.stats()["rejected"] == 1
+    assert queue.stats()["completed"] == 3
+
+def test_cancel_running_and_queued_jobs():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=4)
+        started = []
+
+        async def run(emit):
+            started.append(1)
+            await asyncio.sleep(10)
+
+        running = queue.submit(run, key="running")
+        queued = queue.submit(run, key="queued")
+        await asyncio.sleep(0.01)
+        queue.cancel(queued.job_id)
+        queue.cancel(running.job_id)
+        await settle(running, queued)
+        await asyncio.sleep(0.01)
+        # The cancelled key is free again
+        again = queue.submit(run, key="running")
+        queue.cancel(again.job_id)
+        return running, queued, again, started
+
+    running, queued, again, started = asyncio.run(scenario())
+    assert running.status == queued.status == "cancelled"
+    assert queued.error == "Cancelled before it started"
+    assert again is not running
+    # Only the first job ever started
+    assert len(started) == 1
+
+def test_deadline_fails_slow_jobs():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=4, deadline_seconds=0.05)
+
+        async def run(emit):
+            await asyncio.sleep(10)
+
+        job = queue.submit(run)
+        await settle(job)
+        return queue, job
+
+    queue, job = asyncio.run(scenario())
+    assert job.status == "failed"
+    assert job.error.startswith("Deadline exceeded")
+    assert queue.stats()["failed"] == 1
@@ -0,0 +1,113 @@
+"""Test the LLM gateway's retries and circuit breaker against a local fake Messages API"""
+import json
+import asyncio
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from anthropic import AsyncAnthropic, BadRequestError
+from service.llm_gateway import LLMGateway, CircuitBreaker, LLMUnavailable, TokenBucket
+
+MESSAGE = {
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "fake",
+    "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn", "stop_sequence": None,
+    "usage": {"input_tokens": 3, "output_tokens": 1},
+}
+
+class FakeServer:
+    """Answers POST /v1/messages with scripted (status, headers) responses, then 200"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["content-length"]))
+                fake.requests += 1
+                status, headers = fake.script.pop(0) if fake.script else (200, {})
+                body = json.dumps(MESSAGE if status == 200 else {"type": "error", "error": {"type": "error", "message": "fake"}}).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def gateway(self, **kwargs) -> LLMGateway:
+        client = AsyncAnthropic(api_key="test", base_url=f"http://127.0.0.1:{self.server.server_port}", max_retries=0)
+        return LLMGateway(client=client, backoff_base=0.01, **kwargs)
+
+def call(gateway):
+    return asyncio.run(gateway.create(model="fake", max_tokens=10, messages=[{"role": "user", "content": "hi"}]))
+
+def test_retries_honor_retry_after():
+    fake = FakeServer([(429, {"retry-after-ms": "50"}), (529, {})])
+    gateway = fake.gateway()
+    assert call(gateway).content[0].text == "ok"
+    assert fake.requests == 3 and gateway.retries == 2 and gateway.rate_limited == 1
+
+    # Client errors are not retried
+    fake.script = [(400, {})]
+    with pytest.raises(BadRequestError):
+        call(gateway)
+    assert fake.requests == 4
+
+def test_circuit_breaker_fails_fast():
+    fake = FakeServer([(503, {})] * 4)
+    gateway = fake.gateway(max_retries=1, breaker=CircuitBreaker(failures=3, reset_seconds=60))
+    with pytest.raises(LLMUnavailable):
+        call(gateway)
+    with pytest.raises(LLMUnavailable):
+        call(gateway)
+    # The third failure opened the circuit, so the fourth attempt never reached the server
+    assert fake.requests == 3 and gateway.breaker.state == "open"
+
+class HangingClient:
+    """Messages API that never answers while `hang` is set, then answers like the fake server"""
+
+    def __init__(self):
+        self.hang = True
+        self.messages = self
+
+    async def create(self, **request):
+        if self.hang:
+            await asyncio.sleep(60)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text="ok")], usage=SimpleNamespace(input_tokens=3, output_tokens=1))
+
+def test_cancelled_trial_does_not_lock_the_breaker():
+    client = HangingClient()
+    gateway = LLMGateway(client=client, backoff_base=0.01, breaker=CircuitBreaker(failures=1, reset_seconds=0.01))
+    gateway.breaker.record_failure()
+
+    async def cancel_trial():
+        await asyncio.sleep(0.02)
+        trial = asyncio.ensure_future(gateway.create(model="fake", max_tokens=10, messages=[{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(0.02)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(cancel_trial())
+    # The cancelled trial settled nothing, so the next call becomes the trial
+    assert gateway.breaker.state == "half-open"
+    client.hang = False
+    assert call(gateway).content[0].text == "ok"
+    assert gateway.breaker.state == "closed"
+
+def test_token_bucket():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.delay(60) == 0
+    bucket.take(60)
+    assert 0.9 < bucket.delay(1) <= 1.0
+    bucket.give_back(30)
+    assert bucket.delay(30) == 0
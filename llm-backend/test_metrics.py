@@ -0,0 +1,37 @@
+"""Test the Prometheus text rendering of the metrics registry"""
+import time
+import asyncio
+from service.metrics import Registry, cache_sample
+from service.loop_monitor import LoopMonitor
+
+def test_histogram_and_collectors():
+    registry = Registry()
+    latency = registry.histogram("stage_seconds", "Stage latency", ["stage"], buckets=(0.1, 1))
+    latency.observe(0.05, stage="clone")
+    latency.observe(0.5, stage="clone")
+    registry.counter("tokens_total", "Tokens", ["direction"]).inc(7, direction='in"put')
+    registry.collector(lambda: cache_sample({"render": (3, 1)}))
+    registry.collector(lambda: 1 / 0)
+    lines = registry.render().splitlines()
+    # Buckets are cumulative and end with +Inf
+    assert 'stage_seconds_bucket{stage="clone",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="clone",le="1"} 2' in lines
+    assert 'stage_seconds_bucket{stage="clone",le="+Inf"} 2' in lines
+    assert 'stage_seconds_count{stage="clone"} 2' in lines
+    assert 'tokens_total{direction="in\\"put"} 7' in lines
+    assert 'codearch_cache_hit_ratio{cache="render"} 0.75' in lines
+    # A failing collector does not break the scrape
+    assert "# collector error: ZeroDivisionError" in lines
+
+def test_loop_monitor_counts_stalls():
+    monitor = LoopMonitor(interval=0.01, blocked_seconds=0.1, enabled=True)
+
+    async def block():
+        monitor.ensure_started()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        monitor._task.cancel()
+
+    asyncio.run(block())
+    assert monitor.stalls == 1 and monitor.max_lag >= 0.15
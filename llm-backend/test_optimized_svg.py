@@ -3,6 +3,7 @@
 Test optimized SVG generation for large repositories
 """
 import sys
+import asyncio
 from service.github_analyzer import get_project_structure
 from service.graph_builder import generate_architecture_svg
 
@@ -27,7 +28,7 @@ def main():
     
     # Generate SVG
     print("Generating optimized architecture diagram...")
-    svg = generate_architecture_svg(github_link, structure)
+    svg = asyncio.run(generate_architecture_svg(github_link, structure))
     
     # Save SVG to file
     filename = f"optimized_{github_link.split('/')[-1]}.svg"
@@ -0,0 +1,163 @@
+"""Test drill-down prefetching: shared per commit, held back by interactive requests, cancelled on expiry"""
+import json
+import asyncio
+import main
+from service.repo_tree import RepoTree
+from service.prefetch import Prefetcher, prefetch_candidates
+from service.session_store import SessionStore
+from service.singleflight import SingleFlight
+from service.analysis_cache import AnalysisCache
+
+COMPONENTS = [
+    {"name": "api", "dependencies": ["core"]},
+    {"name": "core", "dependencies": []},
+    {"name": "cli", "dependencies": ["core"]},
+]
+
+def isolate(monkeypatch, tmp_path, build_architecture_diagram):
+    monkeypatch.setattr(main, "prefetcher", Prefetcher(concurrency=2, enabled=True))
+    monkeypatch.setattr(main, "flights", SingleFlight())
+    monkeypatch.setattr(main, "analysis_cache", AnalysisCache(root=str(tmp_path)))
+    store = SessionStore(idle_seconds=60, max_bytes=10 ** 6)
+    store.on_expire(main.cancel_session_work)
+    monkeypatch.setattr(main, "session_store", store)
+    monkeypatch.setattr(main, "build_architecture_diagram", build_architecture_diagram)
+    return store
+
+def make_tree() -> RepoTree:
+    tree = RepoTree.from_structure("api/\n    routes.py\ncore/\n    models.py\n")
+    tree.commit_sha = "a" * 40
+    return tree
+
+def test_candidates_most_connected_first():
+    assert prefetch_candidates(COMPONENTS) == ["core", "api", "cli"]
+    assert prefetch_candidates(COMPONENTS, limit=1) == ["core"]
+
+def test_sessions_of_one_commit_share_prefetches(monkeypatch, tmp_path):
+    builds = []
+
+    async def build_architecture_diagram(github_link, project_tree, module=None, on_components=None, **kwargs):
+        builds.append(module)
+        await asyncio.sleep(0.02)
+        on_components([{"name": f"{module}.part"}])
+        return f"<svg>{module}</svg>"
+
+    store = isolate(monkeypatch, tmp_path, build_architecture_diagram)
+
+    async def scenario():
+        tree = make_tree()
+        sessions = [store.create("https://github.com/o/r", tree) for _ in range(2)]
+        for session in sessions:
+            main.remember_analysis(session, None, "overview", "<svg/>", COMPONENTS)
+        while main.prefetcher.pending():
+            await asyncio.sleep(0.01)
+        # A later session of the same commit is served from the cache
+        late = store.create("https://github.com/o/r", tree)
+        return sessions, await main.session_analysis(late, [], "api")
+
+    sessions, late_result = asyncio.run(scenario())
+    assert sorted(builds) == ["api", "cli", "core"]
+    for session in sessions:
+        assert session.diagrams["core"] == "<svg>core</svg>"
+        assert session.module_components["core"] == [{"name": "core.part"}]
+    assert late_result[1] == "<svg>api</svg>"
+
+def test_prefetch_waits_for_interactive_requests(monkeypatch, tmp_path):
+    builds = []
+
+    async def build_architecture_diagram(github_link, project_tree, module=None, on_components=None, **kwargs):
+        builds.append(module)
+        return "<svg/>"
+
+    store = isolate(monkeypatch, tmp_path, build_architecture_diagram)
+
+    async def scenario():
+        session = store.create("https://github.com/o/r", make_tree())
+        async with main.prefetcher.interactive():
+            main.remember_analysis(session, None, "overview", "<svg/>", COMPONENTS[:1])
+            await asyncio.sleep(0.05)
+            held_back = list(builds)
+        while main.prefetcher.pending():
+            await asyncio.sleep(0.01)
+        return held_back
+
+    assert asyncio.run(scenario()) == []
+    assert builds == ["api"]
+
+def test_expired_session_cancels_its_prefetches(monkeypatch, tmp_path):
+    async def build_architecture_diagram(github_link, project_tree, module=None, on_components=None, **kwargs):
+        await asyncio.sleep(10)
+
+    store = isolate(monkeypatch, tmp_path, build_architecture_diagram)
+
+    async def scenario():
+        session = store.create("https://github.com/o/r", make_tree())
+        main.remember_analysis(session, None, "overview", "<svg/>", COMPONENTS)
+        await asyncio.sleep(0.02)
+        store.idle_seconds = 0
+        store.enforce_limits()
+        await asyncio.sleep(0.02)
+        return session
+
+    session = asyncio.run(scenario())
+    assert main.prefetcher.pending() == 0
+    assert main.prefetcher.cancelled == 3
+    assert "api" not in session.diagrams
+
+def test_session_expiring_mid_drill_down_still_answers(monkeypatch, tmp_path):
+
+    async def build_architecture_diagram(github_link, project_tree, module=None, on_components=None, **kwargs):
+        await asyncio.sleep(0.05)
+        on_components([{"name": f"{module}.part"}])
+        return f"<svg>{module}</svg>"
+
+    store = isolate(monkeypatch, tmp_path, build_architecture_diagram)
+
+    async def scenario():
+        session = store.create("https://github.com/o/r", make_tree())
+        main.remember_analysis(session, None, "overview", "<svg/>", COMPONENTS[:1])
+        request = main.AnalyzeRequest(github_link="https://github.com/o/r", history=[], session_id=session.session_id,
+                                      drill_down_module="api")
+        drill_down = asyncio.ensure_future(main.analyze(request))
+        await asyncio.sleep(0.01)
+        # Evicted by other sessions' growth while the drill-down runs
+        store.max_bytes = 0
+        store.create("https://github.com/o/other", make_tree())
+        assert session.session_id not in store
+        return json.loads((await drill_down).body)
+
+    body = asyncio.run(scenario())
+    assert body["svg"] == "<svg>api</svg>"
+
+def test_streamed_drill_down_reuses_prefetched_diagram(monkeypatch, tmp_path):
+    builds = []
+
+    async def build_architecture_diagram(github_link, project_tree, module=None, on_components=None, **kwargs):
+        builds.append(module)
+        on_components([{"name": f"{module}.part"}])
+        return f"<svg>{module}</svg>"
+
+    async def stream_with_claude(*args, **kwargs):
+        yield "text"
+
+    store = isolate(monkeypatch, tmp_path, build_architecture_diagram)
+    monkeypatch.setattr(main, "stream_with_claude", stream_with_claude)
+
+    async def scenario():
+        tree = make_tree()
+        prefetched = store.create("https://github.com/o/r", tree)
+        main.remember_analysis(prefetched, None, "overview", "<svg/>", COMPONENTS[:1])
+        while main.prefetcher.pending():
+            await asyncio.sleep(0.01)
+        session = store.create("https://github.com/o/r", tree)
+        request = main.AnalyzeRequest(github_link="https://github.com/o/r", history=[], session_id=session.session_id,
+                                      drill_down_module="api")
+        events = []
+        result = await main.analysis_pipeline(request, True, lambda event, data: events.append((event, data)))
+        return session, events, result
+
+    session, events, result = asyncio.run(scenario())
+    assert builds == ["api"]
+    assert ("stage", {"stage": "components_ready", "count": 1}) in events
+    assert session.diagrams["api"] == "<svg>api</svg>"
+    assert result["session_id"] == session.session_id
@@ -0,0 +1,37 @@
+"""Test the request profiler's task and executor sampling and its artifact formats"""
+import time
+import asyncio
+import service.profiler
+from service.concurrency import run_in_stage
+from service.profiler import Profiler, ProfileStore, to_collapsed
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def test_profile_covers_tasks_and_stage_threads(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path), max_artifacts=1)
+    monkeypatch.setattr(service.profiler, "profile_store", store)
+    profiler = Profiler(enabled=True, admin_token="secret")
+    assert profiler.authorized("secret") and not profiler.authorized("wrong") and not Profiler(True, "").enabled
+
+    async def handler():
+        async def child():
+            await asyncio.sleep(0.05)
+        profile = profiler.start("POST /analyze")
+        await asyncio.gather(child(), run_in_stage("clone", spin, 0.05))
+        profiler.stop(profile)
+        assert asyncio.get_running_loop().get_task_factory() is None
+        return profile
+
+    profile = asyncio.run(handler())
+    profile._thread.join(5)
+    speedscope = store.get(profile.profile_id)
+    lanes = {lane["name"]: lane for lane in speedscope["profiles"]}
+    # Tasks started by the request get their own lane, sampled while they await
+    assert any("handler.<locals>.child (" in name for name in lanes)
+    assert "thread clone spin" in lanes
+    folded = to_collapsed(speedscope)
+    assert "thread clone spin;spin " in folded and "child;sleep;[awaiting] " in folded
+    assert [entry["profile_id"] for entry in store.list()] == [profile.profile_id]
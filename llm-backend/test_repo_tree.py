@@ -0,0 +1,32 @@
+"""Test the indexed repository tree model"""
+from service.repo_tree import RepoTree
+from service.graph_builder import extract_module_files
+
+STRUCTURE = """README.md
+llm-backend/
+    main.py
+    service/
+        graph_builder.py
+        llm_client.py
+llm-frontend/
+    src/
+        page.js"""
+
+def test_round_trip_and_index():
+    tree = RepoTree.from_structure(STRUCTURE)
+    assert tree.render() == STRUCTURE
+    service = tree.find("llm-backend/service")
+    assert tree.file_count(service) == 2
+    assert tree.file_count(0) == 5
+    assert tree.extension_histogram(tree.find("llm-backend"))[".py"] == 3
+    assert [tree.names[i] for i in tree.children(0)] == ["README.md", "llm-backend", "llm-frontend"]
+
+def test_module_lookup():
+    tree = RepoTree.from_structure(STRUCTURE)
+    assert extract_module_files(tree, "service") == ["graph_builder.py", "llm_client.py"]
+    assert extract_module_files(tree, "frontend") == ["src/page.js"]
+    assert extract_module_files(tree, "missing") == []
+
+def test_error_tree():
+    tree = RepoTree.coerce("[Error: Repository not found or not accessible: x]")
+    assert tree.error and tree.render() == tree.error
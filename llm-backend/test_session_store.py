@@ -0,0 +1,61 @@
+"""Test the session store's size accounting, eviction and idle sweep"""
+import time
+import asyncio
+from service.repo_tree import RepoTree
+from service.session_store import SessionStore, tree_bytes
+
+def make_tree(name: str = "repo") -> RepoTree:
+    return RepoTree.from_structure(f"{name}/\n  src/\n    main.py\n  README.md\n")
+
+def test_shared_tree_counted_once():
+    tree = make_tree()
+    store = SessionStore(idle_seconds=60, max_bytes=10 ** 6)
+    first = store.create("https://github.com/a/b", tree)
+    store.create("https://github.com/a/b", tree)
+    assert store._total_bytes == tree_bytes(tree)
+
+    first.diagrams[None] = "<svg/>"
+    store.update(first)
+    assert store._total_bytes == tree_bytes(tree) + len("<svg/>")
+
+def test_least_recently_used_evicted_over_budget():
+    store = SessionStore(idle_seconds=60, max_bytes=tree_bytes(make_tree()) + 150)
+    expired = []
+    store.on_expire(lambda session: expired.append(session.session_id))
+    first = store.create("https://github.com/a/b", make_tree())
+    second = store.create("https://github.com/a/b", first.tree)
+    store.get(first.session_id)
+
+    second.overview_text = "x" * 100
+    store.update(second)
+    assert len(store) == 2
+    first.overview_text = "x" * 100
+    store.update(first)
+    # second was used least recently
+    assert expired == [second.session_id]
+    assert store._total_bytes == tree_bytes(first.tree) + 100
+
+def test_idle_sessions_swept_without_requests():
+    async def scenario():
+        store = SessionStore(idle_seconds=0.05, max_bytes=10 ** 6)
+        expired = []
+        store.on_expire(lambda session: expired.append(session.session_id))
+        session = store.create("https://github.com/a/b", make_tree())
+        store.ensure_sweeping(interval=0.02)
+        await asyncio.sleep(0.2)
+        store._sweeper.cancel()
+        return store, session, expired
+
+    store, session, expired = asyncio.run(scenario())
+    assert expired == [session.session_id]
+    assert len(store) == 0
+    assert store._total_bytes == 0
+
+def test_get_refreshes_idle_timer():
+    store = SessionStore(idle_seconds=0.1, max_bytes=10 ** 6)
+    session = store.create("https://github.com/a/b", make_tree())
+    time.sleep(0.06)
+    assert store.get(session.session_id) is session
+    time.sleep(0.06)
+    assert session.session_id in store
+    assert store.get(session.session_id, github_link="https://github.com/c/d") is None
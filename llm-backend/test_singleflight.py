@@ -0,0 +1,86 @@
+"""Test request coalescing: shared results, waiter cancellation, and one session per coalesced analysis"""
+import json
+import asyncio
+import pytest
+import main
+from schema import AnalyzeRequest
+from service.repo_tree import RepoTree
+from service.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(3)))
+        return flights, calls, results
+
+    flights, calls, results = asyncio.run(scenario())
+    assert results == ["result"] * 3
+    assert len(calls) == 1
+    assert (flights.started, flights.coalesced, flights.in_flight()) == (1, 2, 0)
+
+def test_cancelled_waiter_leaves_shared_work_running():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leaving = asyncio.ensure_future(flights.do("key", work))
+        staying = asyncio.ensure_future(flights.do("key", work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        return leaving, await staying
+
+    leaving, result = asyncio.run(scenario())
+    assert leaving.cancelled()
+    assert result == "result"
+
+def test_cancel_stops_shared_work_for_every_waiter():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(10)
+
+        waiters = [asyncio.ensure_future(flights.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        flights.cancel("key")
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        return flights, results
+
+    flights, results = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert flights.in_flight() == 0
+
+def test_coalesced_initial_analyses_share_one_session(monkeypatch):
+    tree = RepoTree.from_structure("api/\n    routes.py\n")
+    runs = []
+
+    async def load_project_tree(github_link, on_cloned=None):
+        return tree, None
+
+    async def run_analysis(*args):
+        runs.append(args)
+        await asyncio.sleep(0.05)
+        return "An API.", "<svg/>", []
+
+    monkeypatch.setattr(main, "load_project_tree", load_project_tree)
+    monkeypatch.setattr(main, "run_analysis", run_analysis)
+    sessions_before = len(main.session_store)
+
+    async def scenario():
+        request = AnalyzeRequest(github_link="https://github.com/o/coalesced", history=[])
+        return await asyncio.gather(*(main.analyze(request) for _ in range(3)))
+
+    bodies = [json.loads(response.body) for response in asyncio.run(scenario())]
+    assert len(runs) == 1
+    assert len({body["session_id"] for body in bodies}) == 1
+    assert len(main.session_store) == sessions_before + 1
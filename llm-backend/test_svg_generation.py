@@ -1,4 +1,5 @@
 """Test SVG Generation Functionality"""
+import asyncio
 from service.graph_builder import generate_architecture_svg, create_default_svg, create_error_svg
 
 def test_svg_generation():
@@ -26,7 +27,7 @@ def test_svg_generation():
     tests/
         test_main.py
     """
-    generated_svg = generate_architecture_svg("https://github.com/test/repo", simple_structure)
+    generated_svg = asyncio.run(generate_architecture_svg("https://github.com/test/repo", simple_structure))
     print(f"Generated SVG length: {len(generated_svg)}")
     print(f"Generated SVG preview: {generated_svg[:100]}...")
     
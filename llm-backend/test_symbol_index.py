@@ -0,0 +1,30 @@
+"""Test symbol extraction and symbol-based module components"""
+from service.symbol_index import extract_symbols, build_symbol_index
+
+SOURCES = {
+    "pkg/store.py": 'class Store:\n    """Keeps rows"""\n    def get(self):\n        return load()\n\ndef load():\n    return Row()\n',
+    "pkg/row.py": "class Row:\n    pass\n",
+    "other/cli.py": "def main():\n    Store()\n",
+    "web/api.ts": "export class Client {}\nexport const fetchAll = async () => new Client();\n",
+}
+
+def test_extract_symbols():
+    symbols = extract_symbols("python", SOURCES["pkg/store.py"])
+    assert [(s["name"], s["kind"], s["line"]) for s in symbols] == [("Store", "class", 1), ("load", "function", 6)]
+    assert symbols[0]["doc"] == "Keeps rows" and symbols[0]["methods"] == ["get"]
+    assert "load" in symbols[0]["uses"]
+    js = extract_symbols("js", SOURCES["web/api.ts"])
+    assert [(s["name"], s["kind"]) for s in js] == [("Client", "class"), ("fetchAll", "function")]
+    assert "Client" in js[1]["uses"]
+
+def test_module_components():
+    files = [(path, f"sha-{path}") for path in SOURCES]
+    blobs = {f"sha-{path}": text.encode() for path, text in SOURCES.items()}
+    index = build_symbol_index(files, lambda shas: {sha: blobs[sha] for sha in shas})
+    components = {c["name"]: c for c in index.module_components("pkg")}
+    # Only symbols under the module are drawn, with edges between them
+    assert set(components) == {"Store", "load", "Row"}
+    assert components["Store"]["dependencies"] == ["load"]
+    assert components["load"]["dependencies"] == ["Row"]
+    assert components["Store"]["description"] == "Keeps rows"
+    assert "pkg/store.py:6 function load" in index.describe("pkg")
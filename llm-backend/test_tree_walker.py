@@ -0,0 +1,33 @@
+"""Test the pruning directory walker"""
+from service.tree_walker import TreeWalker, FileSystemSource, IgnoreRules
+
+def _make_tree(root, paths):
+    for rel in paths:
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+
+def _walk(root, **kwargs):
+    walker = TreeWalker(FileSystemSource(str(root)), **kwargs)
+    return ['/'.join(e.parts) + ('/' if e.is_dir else '') for e in walker.walk()], walker
+
+def test_prunes_default_ignores_in_sorted_order(tmp_path):
+    _make_tree(tmp_path, ["b.py", "a/z.py", "a/node_modules/pkg/index.js", "venv/lib/x.py", ".env"])
+    entries, walker = _walk(tmp_path)
+    assert entries == ["a/", "a/z.py", "b.py"]
+    assert not walker.truncated
+
+def test_gitignore_semantics(tmp_path):
+    _make_tree(tmp_path, ["docs/build/out.html", "docs/index.md", "logs/a.log", "logs/keep.log", "src/build/main.py"])
+    (tmp_path / ".gitignore").write_text("/docs/build/\n*.log\n!keep.log\n")
+    entries, _ = _walk(tmp_path, rules=IgnoreRules([]), respect_gitignore=True)
+    assert "docs/build/" not in entries
+    assert "src/build/main.py" in entries  # anchored pattern only applies at the root
+    assert "logs/a.log" not in entries
+    assert "logs/keep.log" in entries
+
+def test_truncation(tmp_path):
+    _make_tree(tmp_path, [f"f{i}.txt" for i in range(10)])
+    entries, walker = _walk(tmp_path, max_entries=3)
+    assert len(entries) == 3
+    assert walker.truncated
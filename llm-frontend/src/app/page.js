@@ -3,7 +3,14 @@
 import { useState, useEffect, useRef, useCallback, useTransition } from 'react';
 import { v4 as uuidv4 } from 'uuid';
 import SvgDisplay from './components/SvgDisplay';
-import { isValidSvg } from './utils';
+import { isValidSvg, streamAnalyze } from './utils';
+
+// Progress labels for stage events from /analyze/stream
+const STAGE_LABELS = {
+  cloned: 'Reading repository...',
+  structure_ready: 'Analyzing...',
+  components_ready: 'Drawing diagram...',
+};
 
 export default function HomePage() {
   const [githubLink, setGithubLink] = useState('');
@@ -17,6 +24,7 @@ export default function HomePage() {
   });
   const [isPending, startTransition] = useTransition();
   const [apiError, setApiError] = useState(null);
+  const [streamStage, setStreamStage] = useState(null);
   
   // Architecture diagram state
   const [architectureSvg, setArchitectureSvg] = useState(null);
@@ -27,6 +35,8 @@ export default function HomePage() {
   const [currentModule, setCurrentModule] = useState(null);
   const [navigationPath, setNavigationPath] = useState([]);
   const [repoLink, setRepoLink] = useState('');
+  // Server-side analysis session, reused by drill-downs and follow-ups
+  const [analysisSessionId, setAnalysisSessionId] = useState(null);
   
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -52,6 +62,7 @@ export default function HomePage() {
     setCurrentModule(null);
     setNavigationPath([]);
     setRepoLink('');
+    setAnalysisSessionId(null);
   };
 
   // Function to handle drilling down into a module
@@ -81,7 +92,8 @@ export default function HomePage() {
         history: [],
         force_initial: false,
         drill_down_module: moduleName,
-        current_path: newPath
+        current_path: newPath,
+        session_id: analysisSessionId
       };
       
       const res = await fetch('http://localhost:8000/analyze', {
@@ -95,6 +107,9 @@ export default function HomePage() {
       }
       
       const data = await res.json();
+      if (data.session_id) {
+        setAnalysisSessionId(data.session_id);
+      }
       
       // Update architecture diagram with module-specific content
       if (data.svg && data.svg.trim() !== '') {
@@ -110,7 +125,7 @@ export default function HomePage() {
         const drillDownMsg = {
           role: 'assistant',
           content: data.text || `Showing detailed view of ${moduleName} module.`,
-          svg: data.svg || '',
+          svgHandle: data.svg_handle || null,
         };
         
         startTransition(() => {
@@ -140,7 +155,7 @@ export default function HomePage() {
         setLoading(false);
       }
     }
-  }, [repoLink, navigationPath, currentSessionId, startTransition]);
+  }, [repoLink, navigationPath, currentSessionId, analysisSessionId, startTransition]);
 
   // Function to go back to overview
   const handleBackToOverview = useCallback(async () => {
@@ -166,8 +181,9 @@ export default function HomePage() {
       const payload = {
         github_link: repoLink,
         history: [],
-        force_initial: true, // Force regeneration of overview
-        current_path: []
+        force_initial: true, // Served from the analysis session when it is still alive
+        current_path: [],
+        session_id: analysisSessionId
       };
       
       const res = await fetch('http://localhost:8000/analyze', {
@@ -181,6 +197,9 @@ export default function HomePage() {
       }
       
       const data = await res.json();
+      if (data.session_id) {
+        setAnalysisSessionId(data.session_id);
+      }
       
       // Update architecture diagram with overview content
       if (data.svg && data.svg.trim() !== '') {
@@ -197,7 +216,7 @@ export default function HomePage() {
         setLoading(false);
       }
     }
-  }, [repoLink, startTransition]);
+  }, [repoLink, analysisSessionId, startTransition]);
 
   const handleSend = useCallback(async () => {
     setApiError(null);
@@ -256,65 +275,87 @@ export default function HomePage() {
       }
       
       const currentSession = chatSessions.find(s => s.id === sessionId);
-      const history = currentSession ? [...currentSession.messages, newMessage] : [newMessage];
+      // Diagrams travel as handles; the server keeps the markup
+      const history = (currentSession ? [...currentSession.messages, newMessage] : [newMessage])
+        .map(({ role, content, svgHandle }) => ({ role, content, svg_handle: svgHandle || null }));
       
       // Add flag to force initial request
       const payload = { 
         github_link: linkToSend, 
         history,
         // Force as initial request when hasInitialRepo is false
-        force_initial: isInitialRequest
+        force_initial: isInitialRequest,
+        session_id: analysisSessionId
       };
       
-      const res = await fetch('http://localhost:8000/analyze', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(payload),
+      // Show the assistant reply as it streams in
+      const updateAssistantMsg = (update) => {
+        startTransition(() => {
+          setChatSessions(prev => prev.map(s => {
+            if (s.id !== sessionId || s.messages.length === 0) return s;
+            const messages = [...s.messages];
+            messages[messages.length - 1] = update(messages[messages.length - 1]);
+            return { ...s, messages };
+          }));
+        });
+      };
+      
+      let streamedText = '';
+      let receivedSvg = '';
+      startTransition(() => {
+        setChatSessions(prev => prev.map(s => s.id === sessionId
+          ? { ...s, messages: [...s.messages, { role: 'assistant', content: '', svgHandle: null }] }
+          : s));
+      });
+      
+      const data = await streamAnalyze('http://localhost:8000/analyze/stream', payload, {
+        onStage: (stage) => {
+          if (processingStateRef.current.requestNumber === requestNumber) {
+            setStreamStage(stage.stage);
+          }
+        },
+        onText: (delta) => {
+          if (processingStateRef.current.requestNumber !== requestNumber) return;
+          streamedText += delta;
+          const content = streamedText;
+          updateAssistantMsg(msg => ({ ...msg, content }));
+        },
+        onSvg: (svg, handle) => {
+          if (processingStateRef.current.requestNumber !== requestNumber) return;
+          receivedSvg = svg || '';
+          // Drop the diagram in as soon as it is rendered, even if text is still streaming
+          if (receivedSvg.trim() !== '') {
+            if (isValidSvg(receivedSvg)) {
+              setArchitectureSvg(receivedSvg);
+              setHasInitialRepo(true);
+            } else {
+              setApiError('Invalid architecture diagram data. Please refresh the page or try a different repository link.');
+            }
+          }
+          updateAssistantMsg(msg => ({ ...msg, svgHandle: handle || null }));
+        },
+        onError: (error) => {
+          if (processingStateRef.current.requestNumber === requestNumber) {
+            setApiError(`Analysis step failed (${error.stage}): ${error.detail}`);
+          }
+        },
       });
       
       if (processingStateRef.current.requestNumber !== requestNumber) {
         return;
       }
       
-      if (!res.ok) {
-        throw new Error(`HTTP error! status: ${res.status}`);
-      }
-      
-      const data = await res.json();
-      
-      // Update architecture diagram state with clearer conditions
-      if (data.svg && data.svg.trim() !== '') {
-        // Validate SVG before updating state
-        if (isValidSvg(data.svg)) {
-          setArchitectureSvg(data.svg);
-          setHasInitialRepo(true);
-        } else {
-          setApiError('Invalid architecture diagram data. Please refresh the page or try a different repository link.');
-        }
-      } else if (isInitialRequest) {
+      if (isInitialRequest && receivedSvg.trim() === '') {
         // If initial request but no SVG received, show error
         setApiError('Failed to generate architecture diagram. Please try another repository link.');
       }
       
-      const assistantMsg = {
-        role: 'assistant',
-        content: data.text || 'No response received.',
-        svg: data.svg || '',
-      };
+      if (data && data.session_id) {
+        setAnalysisSessionId(data.session_id);
+      }
       
-      startTransition(() => {
-        setChatSessions(prev => {
-          const updated = [...prev];
-          const index = updated.findIndex(s => s.id === sessionId);
-          if (index !== -1) {
-            updated[index] = {
-              ...updated[index],
-              messages: [...updated[index].messages, assistantMsg]
-            };
-          }
-          return updated;
-        });
-      });
+      const finalText = (data && data.text) || streamedText || 'No response received.';
+      updateAssistantMsg(msg => ({ ...msg, content: finalText }));
       
     } catch (err) {
       setApiError(`Request failed: ${err.message}. Please check the backend is running.`);
@@ -322,9 +363,10 @@ export default function HomePage() {
       if (processingStateRef.current.requestNumber === requestNumber) {
         processingStateRef.current.isSending = false;
         setLoading(false);
+        setStreamStage(null);
       }
     }
-  }, [githubLink, chatSessions, currentSessionId, hasInitialRepo, startTransition]);
+  }, [githubLink, chatSessions, currentSessionId, hasInitialRepo, analysisSessionId, startTransition]);
 
   // Make drillDown function globally available
   useEffect(() => {
@@ -474,9 +516,10 @@ export default function HomePage() {
                   {msg.content}
                 </p>
                 {/* Don't display SVG for subsequent messages */}
-                {idx === 1 && msg.svg && msg.svg.trim() !== '' && !hasInitialRepo && (
-                  <SvgDisplay 
-                    svgContent={msg.svg} 
+                {idx === 1 && msg.svgHandle && !hasInitialRepo && (
+                  <img
+                    src={`http://localhost:8000/diagrams/${msg.svgHandle}`}
+                    alt="Architecture diagram"
                     className="mt-4 border rounded bg-white p-2"
                   />
                 )}
@@ -506,7 +549,7 @@ export default function HomePage() {
               disabled={loading || processingStateRef.current.isSending || isPending}
               className="px-4 py-2 bg-blue-600 text-white rounded hover:bg-blue-700 disabled:opacity-50"
             >
-              {loading || isPending ? 'Analyzing...' : 'Send'}
+              {loading || isPending ? (STAGE_LABELS[streamStage] || 'Analyzing...') : 'Send'}
             </button>
           </div>
         </div>
@@ -72,4 +72,61 @@ export function extractRepoName(url) {
     console.error('Error extracting repo name:', e);
     return '';
   }
-} 
\ No newline at end of file
+} 
+/**
+ * 调用流式分析接口，按Server-Sent Events逐个分发事件
+ * @param {string} url - 流式接口地址
+ * @param {object} payload - 请求体
+ * @param {object} handlers - 事件回调 { onStage, onText, onSvg, onError }
+ * @returns {Promise<object|null>} - done 事件的数据
+ */
+export async function streamAnalyze(url, payload, handlers = {}) {
+  const res = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(payload),
+  });
+
+  if (!res.ok || !res.body) {
+    throw new Error(`HTTP error! status: ${res.status}`);
+  }
+
+  let result = null;
+  const dispatch = (block) => {
+    let event = 'message';
+    const dataLines = [];
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) {
+        event = line.slice(6).trim();
+      } else if (line.startsWith('data:')) {
+        dataLines.push(line.slice(5).trimStart());
+      }
+    }
+    if (dataLines.length === 0) return;
+
+    const data = JSON.parse(dataLines.join('\n'));
+    if (event === 'stage') handlers.onStage?.(data);
+    else if (event === 'text') handlers.onText?.(data.delta);
+    else if (event === 'svg') handlers.onSvg?.(data.svg, data.handle);
+    else if (event === 'error') handlers.onError?.(data);
+    else if (event === 'done') result = data;
+  };
+
+  // 事件之间以空行分隔，数据块可能在任意位置被切断
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      dispatch(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+    }
+  }
+  if (buffer.trim()) dispatch(buffer);
+
+  return result;
+}